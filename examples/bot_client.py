@@ -2,24 +2,202 @@
 """
 Vibeshot Bot API Client Example
 调用 /api/bot/upload 上传图片和 /api/bot/prompts 创建提示词的示例
+
+- 所有请求复用同一个 requests.Session（连接池），不再每次新建连接
+- 上传使用流式 multipart，文件边读边发，不整体读入内存
+- 批量上传在线程池中并发执行（并发数有上限），临时错误自动重试
+- 每个文件返回耗时、重试次数等信息
 """
 
-import requests
-from typing import Optional
+import mimetypes
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 与 /api/bot/upload 的限制一致
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+
+# 这些状态码视为临时错误，重试
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class StreamingMultipart:
+    """
+    单文件 multipart/form-data 请求体
+
+    只在内存中保留 part 头尾，文件内容在发送时按块读取。
+    实现了 __len__，requests 会据此设置 Content-Length（不使用 chunked 编码）。
+    """
+
+    def __init__(self, path: Path, field: str = 'file', content_type: Optional[str] = None):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={self.boundary}'
+        file_type = content_type or mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        filename = path.name.replace('"', '%22')
+        self._head = (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: {file_type}\r\n\r\n'
+        ).encode('utf-8')
+        self._tail = f'\r\n--{self.boundary}--\r\n'.encode('utf-8')
+        self._file = open(path, 'rb')
+        self._size = os.fstat(self._file.fileno()).st_size
+        self._parts = [self._head, self._file, self._tail]
+
+    def __len__(self) -> int:
+        return len(self._head) + self._size + len(self._tail)
+
+    def read(self, size: int = -1) -> bytes:
+        chunks = []
+        while self._parts and (size < 0 or size > 0):
+            part = self._parts[0]
+            if isinstance(part, bytes):
+                take = part if size < 0 else part[:size]
+                rest = part[len(take):]
+                if rest:
+                    self._parts[0] = rest
+                else:
+                    self._parts.pop(0)
+            else:
+                take = part.read(size)
+                if not take or (size > 0 and len(take) < size):
+                    self._parts.pop(0)
+            chunks.append(take)
+            if size > 0:
+                size -= len(take)
+        return b''.join(chunks)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+@dataclass
+class UploadResult:
+    file_path: str
+    success: bool
+    image_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    error: Optional[str] = None
+    status_code: Optional[int] = None
+    attempts: int = 0
+    size: int = 0
+    latency_ms: float = 0.0  # 含重试等待在内的总耗时
 
 
 class VibeshotBotClient:
-    def __init__(self, base_url: str, api_key: str):
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        max_workers: int = 4,
+        max_retries: int = 3,
+        timeout: float = 60,
+    ):
         """
         初始化客户端
 
         Args:
             base_url: API 基础地址，如 http://localhost:3000
             api_key: Bot API Key
+            max_workers: 批量上传的最大并发数，同时也是连接池大小
+            max_retries: 临时错误（连接失败、超时、429、5xx）的最大重试次数
+            timeout: 单次请求超时（秒）
         """
         self.base_url = base_url.rstrip('/')
         self.api_key = api_key
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.headers['x-api-key'] = api_key
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _backoff(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        """指数退避；服务端返回 Retry-After 时以其为准"""
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), 60.0)
+        return min(2.0 ** attempt, 30.0)
+
+    def upload_image_with_stats(self, file_path: str) -> UploadResult:
+        """
+        上传单张图片，失败不抛异常
+
+        Args:
+            file_path: 图片文件路径
+
+        Returns:
+            UploadResult（包含 image_url / thumbnail_url、耗时、重试次数）
+        """
+        path = Path(file_path)
+        start = time.perf_counter()
+        result = UploadResult(file_path=file_path, success=False)
+
+        if not path.is_file():
+            result.error = f'File not found: {file_path}'
+            return result
+        result.size = path.stat().st_size
+        if result.size > MAX_UPLOAD_BYTES:
+            result.error = 'File size cannot exceed 10MB'
+            return result
+
+        for attempt in range(self.max_retries + 1):
+            result.attempts = attempt + 1
+            response = None
+            try:
+                # 每次重试重新打开文件，请求体从头开始发送
+                with StreamingMultipart(path) as body:
+                    response = self.session.post(
+                        f'{self.base_url}/api/bot/upload',
+                        data=body,
+                        headers={'Content-Type': body.content_type},
+                        timeout=self.timeout,
+                    )
+                result.status_code = response.status_code
+                if response.status_code not in RETRY_STATUS:
+                    data = response.json()
+                    result.success = bool(data.get('success'))
+                    result.image_url = data.get('image_url')
+                    result.thumbnail_url = data.get('thumbnail_url')
+                    result.error = None if result.success else data.get('error', f'HTTP {response.status_code}')
+                    break
+                result.error = f'HTTP {response.status_code}'
+            except (requests.ConnectionError, requests.Timeout) as e:
+                result.error = f'{type(e).__name__}: {e}'
+            except ValueError as e:
+                result.error = f'Invalid response: {e}'
+                break
+
+            if attempt < self.max_retries:
+                time.sleep(self._backoff(attempt, response))
+
+        result.latency_ms = (time.perf_counter() - start) * 1000
+        return result
 
     def upload_image(self, file_path: str) -> dict:
         """
@@ -35,19 +213,32 @@ class VibeshotBotClient:
                 "thumbnail_url": "https://..."
             }
         """
-        path = Path(file_path)
-        if not path.exists():
+        if not Path(file_path).exists():
             raise FileNotFoundError(f'File not found: {file_path}')
 
-        with open(path, 'rb') as f:
-            files = {'file': (path.name, f, 'image/jpeg')}
-            response = requests.post(
-                f'{self.base_url}/api/bot/upload',
-                files=files,
-                headers={'x-api-key': self.api_key},
-            )
+        result = self.upload_image_with_stats(file_path)
+        if result.success:
+            return {
+                'success': True,
+                'image_url': result.image_url,
+                'thumbnail_url': result.thumbnail_url,
+            }
+        return {'success': False, 'error': result.error}
 
-        return response.json()
+    def upload_many(self, file_paths: list[str]) -> list[UploadResult]:
+        """
+        并发上传多张图片（并发数不超过 max_workers）
+
+        Args:
+            file_paths: 图片文件路径列表
+
+        Returns:
+            与 file_paths 顺序一致的 UploadResult 列表（包含失败项）
+        """
+        if len(file_paths) <= 1:
+            return [self.upload_image_with_stats(path) for path in file_paths]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(file_paths))) as executor:
+            return list(executor.map(self.upload_image_with_stats, file_paths))
 
     def upload_images(self, file_paths: list[str]) -> list[dict]:
         """
@@ -60,15 +251,14 @@ class VibeshotBotClient:
             上传结果列表，每个元素包含 image_url 和 thumbnail_url
         """
         results = []
-        for path in file_paths:
-            result = self.upload_image(path)
-            if result.get('success'):
+        for result in self.upload_many(file_paths):
+            if result.success:
                 results.append({
-                    'image_url': result['image_url'],
-                    'thumbnail_url': result['thumbnail_url'],
+                    'image_url': result.image_url,
+                    'thumbnail_url': result.thumbnail_url,
                 })
             else:
-                print(f'Failed to upload {path}: {result.get("error")}')
+                print(f'Failed to upload {result.file_path}: {result.error}')
         return results
 
     def create_prompt(
@@ -128,16 +318,21 @@ class VibeshotBotClient:
         if tag_ids:
             payload['tag_ids'] = tag_ids
 
-        response = requests.post(
-            f'{self.base_url}/api/bot/prompts',
-            json=payload,
-            headers={
-                'Content-Type': 'application/json',
-                'x-api-key': self.api_key,
-            },
-        )
-
-        return response.json()
+        # 服务端按 prompt_text 去重，重复提交不会产生重复记录，可以安全重试
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                response = self.session.post(
+                    f'{self.base_url}/api/bot/prompts',
+                    json=payload,
+                    timeout=self.timeout,
+                )
+                if response.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                    return response.json()
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+            time.sleep(self._backoff(attempt, response))
 
 
 # ============ 使用示例 ============
@@ -146,39 +341,42 @@ if __name__ == '__main__':
     BASE_URL = 'http://localhost:3000'  # 或你的部署地址
     API_KEY = 'your-bot-api-key'  # 替换为实际的 API Key
 
-    # 创建客户端
-    client = VibeshotBotClient(BASE_URL, API_KEY)
+    # 创建客户端（with 结束时关闭连接池）
+    with VibeshotBotClient(BASE_URL, API_KEY, max_workers=4) as client:
+
+        # -------- 方式 1: 先上传图片，再创建提示词 --------
+        # 并发上传本地图片，查看每个文件的耗时
+        results = client.upload_many([
+            '/path/to/image1.jpg',
+            '/path/to/image2.jpg',
+        ])
+        for r in results:
+            status = 'ok' if r.success else f'failed ({r.error})'
+            print(f'{r.file_path}: {status}, {r.latency_ms:.0f} ms, {r.attempts} attempt(s)')
+        uploaded = [r for r in results if r.success]
 
-    # -------- 方式 1: 先上传图片，再创建提示词 --------
-    # 上传本地图片
-    uploaded = client.upload_images([
-        '/path/to/image1.jpg',
-        '/path/to/image2.jpg',
-    ])
-    print('Uploaded images:', uploaded)
+        # 使用上传后的 URL 创建提示词
+        if uploaded:
+            result = client.create_prompt(
+                title='赛博朋克女孩',
+                prompt_text='cyberpunk girl, neon lights, futuristic city, rain, highly detailed, 8k',
+                negative_prompt='low quality, blurry, deformed',
+                image_urls=[r.image_url for r in uploaded],
+                author_name='Bot',
+                source='wechat',
+                model='Midjourney v6',
+            )
+            print('Created prompt:', result)
 
-    # 使用上传后的 URL 创建提示词
-    if uploaded:
+        # -------- 方式 2: 直接传入网络图片 URL --------
+        # API 会自动下载并处理
         result = client.create_prompt(
             title='赛博朋克女孩',
             prompt_text='cyberpunk girl, neon lights, futuristic city, rain, highly detailed, 8k',
-            negative_prompt='low quality, blurry, deformed',
-            image_urls=[img['image_url'] for img in uploaded],
+            image_urls=[
+                'https://example.com/image1.jpg',
+                'https://example.com/image2.jpg',
+            ],
             author_name='Bot',
-            source='wechat',
-            model='Midjourney v6',
         )
-        print('Created prompt:', result)
-
-    # -------- 方式 2: 直接传入网络图片 URL --------
-    # API 会自动下载并处理
-    result = client.create_prompt(
-        title='赛博朋克女孩',
-        prompt_text='cyberpunk girl, neon lights, futuristic city, rain, highly detailed, 8k',
-        image_urls=[
-            'https://example.com/image1.jpg',
-            'https://example.com/image2.jpg',
-        ],
-        author_name='Bot',
-    )
-    print('Response:', result)
+        print('Response:', result)
@@ -1,3 +1,9 @@
-from .analyzer import create_analyzer, PromptAnalysis
+from .analyzer import create_analyzer, create_async_analyzer, PromptAnalysis, is_ambiguous
+from .cache import AnalysisCache, CachedAnalyzer
+from .prefilter import PromptPreFilter
+from .pool import AnalyzerPool, AsyncAnalyzerPool
 
-__all__ = ['create_analyzer', 'PromptAnalysis']
+__all__ = [
+    'create_analyzer', 'create_async_analyzer', 'PromptAnalysis', 'is_ambiguous',
+    'AnalysisCache', 'CachedAnalyzer', 'PromptPreFilter', 'AnalyzerPool', 'AsyncAnalyzerPool',
+]
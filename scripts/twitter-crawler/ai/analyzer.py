@@ -1,11 +1,16 @@
-from typing import Optional
+from typing import Dict, List, Optional
 from dataclasses import dataclass
+import hashlib
 import json
+import logging
 
 import sys
 sys.path.append('..')
 from config import Config
 from crawler import Tweet
+from crawler.cassette import sdk_http_client, sdk_async_http_client
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -37,6 +42,9 @@ SYSTEM_PROMPT = """你是一个专业的 AI 图像生成提示词分析专家。
 
 请分析以下推文并返回 JSON 格式结果。"""
 
+# 系统提示词版本，修改 SYSTEM_PROMPT 后旧的分析缓存自动失效
+SYSTEM_PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.encode('utf-8')).hexdigest()[:12]
+
 
 def get_user_prompt(tweet: Tweet) -> str:
     return f"""请分析这条推文:
@@ -60,16 +68,44 @@ def get_user_prompt(tweet: Tweet) -> str:
 只返回 JSON，不要其他内容。"""
 
 
-def parse_response(result_text: str) -> PromptAnalysis:
-    """解析 AI 响应"""
+def get_batch_user_prompt(tweets: List[Tweet]) -> str:
+    """把多条推文打包进一次请求"""
+    blocks = [
+        f"[{index}]\n推文内容:\n{tweet.text}\n\n推文包含 {len(tweet.image_urls)} 张图片。"
+        for index, tweet in enumerate(tweets)
+    ]
+    joined = '\n\n---\n\n'.join(blocks)
+    return f"""请分别分析以下 {len(tweets)} 条推文，每条以 [编号] 开头:
+
+{joined}
+
+请返回一个 JSON 数组，每条推文对应一个元素，格式如下:
+[
+  {{
+    "index": 编号,
+    "is_relevant": true/false,
+    "confidence": 0.0-1.0,
+    "reason": "判断理由",
+    "extracted_prompt": "提取的正向提示词 (如果相关)",
+    "extracted_negative_prompt": "提取的负向提示词 (如果有)",
+    "suggested_title": "建议的标题 (中文，简短)",
+    "suggested_model": "推测使用的模型 (如 midjourney-v6, flux-1.1-pro 等)"
+  }}
+]
+
+只返回 JSON 数组，不要其他内容。"""
+
+
+def _strip_code_fence(result_text: str) -> str:
     result_text = result_text.strip()
     if result_text.startswith('```'):
         result_text = result_text.split('```')[1]
         if result_text.startswith('json'):
             result_text = result_text[4:]
+    return result_text
 
-    result = json.loads(result_text)
 
+def _to_analysis(result: dict) -> PromptAnalysis:
     return PromptAnalysis(
         is_relevant=result.get('is_relevant', False),
         confidence=result.get('confidence', 0.0),
@@ -81,86 +117,289 @@ def parse_response(result_text: str) -> PromptAnalysis:
     )
 
 
-class ClaudeAnalyzer:
+def parse_response(result_text: str) -> PromptAnalysis:
+    """解析 AI 响应"""
+    result = json.loads(_strip_code_fence(result_text))
+    return _to_analysis(result)
+
+
+def parse_batch_response(result_text: str, count: int) -> Dict[int, PromptAnalysis]:
+    """解析批量响应，返回 {编号: PromptAnalysis}，缺失或格式错误的条目不包含在内"""
+    try:
+        results = json.loads(_strip_code_fence(result_text))
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(results, list):
+        return {}
+
+    analyses = {}
+    for result in results:
+        if not isinstance(result, dict):
+            continue
+        index = result.get('index')
+        if not isinstance(index, int) or not 0 <= index < count or index in analyses:
+            continue
+        if not isinstance(result.get('is_relevant'), bool) or \
+                not isinstance(result.get('confidence'), (int, float)):
+            continue
+        analyses[index] = _to_analysis(result)
+    return analyses
+
+
+# LLM 判断相关但没有提取到 prompt 时，原文至少要包含其中一个关键词
+_PROMPT_HINTS = ('--', 'prompt', 'negative', 'artstation', 'detailed')
+
+
+def is_ambiguous(analysis: PromptAnalysis, tweet: Tweet) -> bool:
+    """额外检查：没有提取到 prompt，且原文也不像 prompt"""
+    if analysis.extracted_prompt:
+        return False
+    text = tweet.text.lower()
+    return not any(hint in text for hint in _PROMPT_HINTS)
+
+
+def _failed_analysis(e: Exception) -> PromptAnalysis:
+    return PromptAnalysis(
+        is_relevant=False,
+        confidence=0.0,
+        reason=f"分析失败: {str(e)}"
+    )
+
+
+def _batch_max_tokens(count: int) -> int:
+    return min(8192, 512 * count + 256)
+
+
+class BatchAnalysisMixin:
+    """
+    analyze_tweets: 每 Config.ANALYZE_BATCH_SIZE 条推文合并为一次请求，
+    SYSTEM_PROMPT 只发送一次；缺失或格式错误的条目回退为单条分析
+    """
+
+    def analyze_tweets(self, tweets: List[Tweet]) -> List[PromptAnalysis]:
+        results: List[PromptAnalysis] = []
+        batch_size = max(1, Config.ANALYZE_BATCH_SIZE)
+        for start in range(0, len(tweets), batch_size):
+            batch = tweets[start:start + batch_size]
+            if len(batch) == 1:
+                results.append(self.analyze_tweet(batch[0]))
+                continue
+
+            try:
+                text = self._complete(get_batch_user_prompt(batch), _batch_max_tokens(len(batch)))
+                parsed = parse_batch_response(text, len(batch))
+            except Exception as e:
+                logger.warning("%s batch analysis error: %s", self.provider, e)
+                parsed = {}
+
+            for index, tweet in enumerate(batch):
+                results.append(parsed[index] if index in parsed else self.analyze_tweet(tweet))
+        return results
+
+    def close(self):
+        """关闭 SDK 客户端的连接池"""
+        self.client.close()
+
+
+class AsyncBatchAnalysisMixin:
+    """BatchAnalysisMixin 的 asyncio 版本"""
+
+    async def analyze_tweets(self, tweets: List[Tweet]) -> List[PromptAnalysis]:
+        results: List[PromptAnalysis] = []
+        batch_size = max(1, Config.ANALYZE_BATCH_SIZE)
+        for start in range(0, len(tweets), batch_size):
+            batch = tweets[start:start + batch_size]
+            if len(batch) == 1:
+                results.append(await self.analyze_tweet(batch[0]))
+                continue
+
+            try:
+                text = await self._complete(get_batch_user_prompt(batch), _batch_max_tokens(len(batch)))
+                parsed = parse_batch_response(text, len(batch))
+            except Exception as e:
+                logger.warning("%s batch analysis error: %s", self.provider, e)
+                parsed = {}
+
+            for index, tweet in enumerate(batch):
+                results.append(parsed[index] if index in parsed else await self.analyze_tweet(tweet))
+        return results
+
+    async def aclose(self):
+        """关闭 SDK 客户端的连接池"""
+        await self.client.close()
+
+
+class ClaudeAnalyzer(BatchAnalysisMixin):
     """Claude API 分析器"""
 
+    provider = 'claude'
+
     def __init__(self):
-        from anthropic import Anthropic
-        self.client = Anthropic(api_key=Config.CLAUDE_API_KEY)
+        import anthropic
+        self.client = anthropic.Anthropic(
+            api_key=Config.CLAUDE_API_KEY, base_url=Config.CLAUDE_BASE_URL, http_client=sdk_http_client(anthropic)
+        )
+        self.model = Config.CLAUDE_MODEL
+
+    def _complete(self, user_prompt: str, max_tokens: int = 1024) -> str:
+        response = self.client.messages.create(
+            model=self.model,
+            max_tokens=max_tokens,
+            messages=[
+                {"role": "user", "content": user_prompt}
+            ],
+            system=SYSTEM_PROMPT
+        )
+        return response.content[0].text
 
     def analyze_tweet(self, tweet: Tweet) -> PromptAnalysis:
         try:
-            response = self.client.messages.create(
-                model=Config.CLAUDE_MODEL,
-                max_tokens=1024,
-                messages=[
-                    {"role": "user", "content": get_user_prompt(tweet)}
-                ],
-                system=SYSTEM_PROMPT
-            )
-            return parse_response(response.content[0].text)
+            return parse_response(self._complete(get_user_prompt(tweet)))
         except Exception as e:
-            if Config.DEBUG:
-                print(f"Claude analysis error: {e}")
-            return PromptAnalysis(
-                is_relevant=False,
-                confidence=0.0,
-                reason=f"分析失败: {str(e)}"
-            )
+            logger.warning("%s analysis error: %s", self.provider, e)
+            return _failed_analysis(e)
 
 
-class OpenAICompatibleAnalyzer:
+class OpenAICompatibleAnalyzer(BatchAnalysisMixin):
     """OpenAI 兼容 API 分析器 (支持 OpenAI, DeepSeek, Qwen)"""
 
-    def __init__(self, api_key: str, base_url: Optional[str], model: str):
-        from openai import OpenAI
-        self.client = OpenAI(api_key=api_key, base_url=base_url)
+    def __init__(self, api_key: str, base_url: Optional[str], model: str, provider: str = 'openai'):
+        import openai
+        self.client = openai.OpenAI(api_key=api_key, base_url=base_url, http_client=sdk_http_client(openai))
         self.model = model
+        self.provider = provider
+
+    def _complete(self, user_prompt: str, max_tokens: int = 1024) -> str:
+        response = self.client.chat.completions.create(
+            model=self.model,
+            max_tokens=max_tokens,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": user_prompt}
+            ]
+        )
+        return response.choices[0].message.content
 
     def analyze_tweet(self, tweet: Tweet) -> PromptAnalysis:
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                max_tokens=1024,
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": get_user_prompt(tweet)}
-                ]
-            )
-            return parse_response(response.choices[0].message.content)
+            return parse_response(self._complete(get_user_prompt(tweet)))
         except Exception as e:
-            if Config.DEBUG:
-                print(f"OpenAI compatible analysis error: {e}")
-            return PromptAnalysis(
-                is_relevant=False,
-                confidence=0.0,
-                reason=f"分析失败: {str(e)}"
-            )
+            logger.warning("%s analysis error: %s", self.provider, e)
+            return _failed_analysis(e)
 
 
-def create_analyzer():
-    """根据配置创建对应的分析器"""
-    provider = Config.AI_PROVIDER
+class AsyncClaudeAnalyzer(AsyncBatchAnalysisMixin):
+    """Claude API 异步分析器"""
 
-    if provider == 'claude':
-        return ClaudeAnalyzer()
-    elif provider == 'deepseek':
-        return OpenAICompatibleAnalyzer(
+    provider = 'claude'
+
+    def __init__(self):
+        import anthropic
+        self.client = anthropic.AsyncAnthropic(
+            api_key=Config.CLAUDE_API_KEY, base_url=Config.CLAUDE_BASE_URL, http_client=sdk_async_http_client(anthropic)
+        )
+        self.model = Config.CLAUDE_MODEL
+
+    async def _complete(self, user_prompt: str, max_tokens: int = 1024) -> str:
+        response = await self.client.messages.create(
+            model=self.model,
+            max_tokens=max_tokens,
+            messages=[
+                {"role": "user", "content": user_prompt}
+            ],
+            system=SYSTEM_PROMPT
+        )
+        return response.content[0].text
+
+    async def analyze_tweet(self, tweet: Tweet) -> PromptAnalysis:
+        try:
+            return parse_response(await self._complete(get_user_prompt(tweet)))
+        except Exception as e:
+            logger.warning("%s analysis error: %s", self.provider, e)
+            return _failed_analysis(e)
+
+
+class AsyncOpenAICompatibleAnalyzer(AsyncBatchAnalysisMixin):
+    """OpenAI 兼容 API 异步分析器 (支持 OpenAI, DeepSeek, Qwen)"""
+
+    def __init__(self, api_key: str, base_url: Optional[str], model: str, provider: str = 'openai'):
+        import openai
+        self.client = openai.AsyncOpenAI(
+            api_key=api_key, base_url=base_url, http_client=sdk_async_http_client(openai)
+        )
+        self.model = model
+        self.provider = provider
+
+    async def _complete(self, user_prompt: str, max_tokens: int = 1024) -> str:
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            max_tokens=max_tokens,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": user_prompt}
+            ]
+        )
+        return response.choices[0].message.content
+
+    async def analyze_tweet(self, tweet: Tweet) -> PromptAnalysis:
+        try:
+            return parse_response(await self._complete(get_user_prompt(tweet)))
+        except Exception as e:
+            logger.warning("%s analysis error: %s", self.provider, e)
+            return _failed_analysis(e)
+
+
+def _openai_compatible_settings(provider: str) -> dict:
+    """返回 OpenAI 兼容 provider 的连接参数"""
+    if provider == 'deepseek':
+        return dict(
             api_key=Config.DEEPSEEK_API_KEY,
             base_url=Config.DEEPSEEK_BASE_URL,
-            model=Config.DEEPSEEK_MODEL
+            model=Config.DEEPSEEK_MODEL,
+            provider=provider
         )
     elif provider == 'openai':
-        return OpenAICompatibleAnalyzer(
+        return dict(
             api_key=Config.OPENAI_API_KEY,
-            base_url=None,
-            model=Config.OPENAI_MODEL
+            base_url=Config.OPENAI_BASE_URL,
+            model=Config.OPENAI_MODEL,
+            provider=provider
         )
     elif provider == 'qwen':
-        return OpenAICompatibleAnalyzer(
+        return dict(
             api_key=Config.QWEN_API_KEY,
             base_url=Config.QWEN_BASE_URL,
-            model=Config.QWEN_MODEL
+            model=Config.QWEN_MODEL,
+            provider=provider
         )
+    raise ValueError(f"Unknown AI provider: {provider}")
+
+
+def create_analyzer(use_cache: bool = Config.ANALYSIS_CACHE_ENABLED):
+    """根据配置创建对应的分析器（默认带结果缓存）"""
+    provider = Config.AI_PROVIDER
+
+    if provider == 'claude':
+        analyzer = ClaudeAnalyzer()
     else:
-        raise ValueError(f"Unknown AI provider: {provider}")
+        analyzer = OpenAICompatibleAnalyzer(**_openai_compatible_settings(provider))
+
+    if use_cache:
+        from .cache import AnalysisCache, CachedAnalyzer
+        return CachedAnalyzer(analyzer, AnalysisCache())
+    return analyzer
+
+
+def create_async_analyzer(use_cache: bool = Config.ANALYSIS_CACHE_ENABLED):
+    """根据配置创建对应的异步分析器（默认带结果缓存）"""
+    provider = Config.AI_PROVIDER
+
+    if provider == 'claude':
+        analyzer = AsyncClaudeAnalyzer()
+    else:
+        analyzer = AsyncOpenAICompatibleAnalyzer(**_openai_compatible_settings(provider))
+
+    if use_cache:
+        from .cache import AnalysisCache, AsyncCachedAnalyzer
+        return AsyncCachedAnalyzer(analyzer, AnalysisCache())
+    return analyzer
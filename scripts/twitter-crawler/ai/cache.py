@@ -0,0 +1,204 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from dataclasses import asdict
+from typing import Dict, List, Optional
+
+import sys
+sys.path.append('..')
+from config import Config
+from crawler import Tweet
+from crawler.cache_db import open_cache_db
+from .analyzer import PromptAnalysis, SYSTEM_PROMPT_VERSION
+
+logger = logging.getLogger(__name__)
+
+
+def analysis_cache_key(tweet: Tweet, provider: str, model: str) -> str:
+    """缓存 key: 推文文本、图片数、provider、模型和系统提示词版本的哈希"""
+    material = json.dumps(
+        [tweet.text, len(tweet.image_urls), provider, model, SYSTEM_PROMPT_VERSION],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def is_failed_analysis(analysis: PromptAnalysis) -> bool:
+    return analysis.reason.startswith('分析失败')
+
+
+class AnalysisCache:
+    """
+    PromptAnalysis 结果缓存 (SQLite，按内容寻址)
+
+    同样的推文内容在同一 provider/模型/提示词版本下只需调用一次 LLM，
+    history.py --load-raw 回放和 backfill 重跑都不会重复付费。
+    超过 max_entries 时按最近使用时间淘汰 (LRU)。
+    命中时的 last_used 更新先缓冲在内存中，与 CrawlLedger 一样定期批量提交。
+    """
+
+    def __init__(
+        self,
+        path: str = Config.ANALYSIS_CACHE_PATH,
+        max_entries: int = Config.ANALYSIS_CACHE_MAX_ENTRIES,
+        flush_every: int = 200
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.flush_every = flush_every
+        self.hits = 0
+        self.misses = 0
+        # key -> 最近一次命中时间，尚未写入 last_used
+        self._touched: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+        self._conn = open_cache_db(path)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS analyses ('
+            ' key TEXT PRIMARY KEY,'
+            ' result TEXT NOT NULL,'
+            ' last_used REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_analyses_last_used ON analyses (last_used)')
+        self._conn.commit()
+        self._size = self._conn.execute('SELECT COUNT(*) FROM analyses').fetchone()[0]
+
+    def get(self, key: str) -> Optional[PromptAnalysis]:
+        with self._lock:
+            row = self._conn.execute('SELECT result FROM analyses WHERE key = ?', (key,)).fetchone()
+            if not row:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched[key] = time.time()
+            if len(self._touched) >= self.flush_every:
+                self._flush_locked()
+                self._conn.commit()
+        return PromptAnalysis(**json.loads(row[0]))
+
+    def set(self, key: str, analysis: PromptAnalysis):
+        result = json.dumps(asdict(analysis), ensure_ascii=False)
+        with self._lock:
+            now = time.time()
+            cursor = self._conn.execute(
+                'UPDATE analyses SET result = ?, last_used = ? WHERE key = ?',
+                (result, now, key)
+            )
+            self._touched.pop(key, None)
+            if cursor.rowcount == 0:
+                self._conn.execute(
+                    'INSERT INTO analyses (key, result, last_used) VALUES (?, ?, ?)',
+                    (key, result, now)
+                )
+                self._size += 1
+            if self._size > self.max_entries:
+                self._evict_locked()
+            self._conn.commit()
+
+    def _flush_locked(self):
+        if not self._touched:
+            return
+        self._conn.executemany(
+            'UPDATE analyses SET last_used = ? WHERE key = ?',
+            [(used, key) for key, used in self._touched.items()]
+        )
+        self._touched.clear()
+
+    def _evict_locked(self):
+        # 先写入缓冲的命中时间，避免淘汰刚命中的条目
+        self._flush_locked()
+        # 一次多淘汰 10%，避免每次写入都触发淘汰
+        target = int(self.max_entries * 0.9)
+        excess = self._size - target
+        self._conn.execute(
+            'DELETE FROM analyses WHERE key IN '
+            '(SELECT key FROM analyses ORDER BY last_used ASC LIMIT ?)',
+            (excess,)
+        )
+        self._size = target
+        logger.debug(f"Analysis cache evicted {excess} entries")
+
+    def __len__(self) -> int:
+        return self._size
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self._conn.commit()
+            self._conn.close()
+
+
+class CachedAnalyzer:
+    """在 create_analyzer() 返回的分析器前加一层结果缓存"""
+
+    def __init__(self, analyzer, cache: AnalysisCache):
+        self.analyzer = analyzer
+        self.cache = cache
+        self.provider = analyzer.provider
+        self.model = analyzer.model
+
+    def analyze_tweet(self, tweet: Tweet) -> PromptAnalysis:
+        key = analysis_cache_key(tweet, self.provider, self.model)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        analysis = self.analyzer.analyze_tweet(tweet)
+        # 调用失败的结果不缓存，下次重试
+        if not is_failed_analysis(analysis):
+            self.cache.set(key, analysis)
+        return analysis
+
+    def _lookup(self, tweets: List[Tweet]):
+        keys = [analysis_cache_key(t, self.provider, self.model) for t in tweets]
+        results: List[Optional[PromptAnalysis]] = [self.cache.get(k) for k in keys]
+        missing = [i for i, r in enumerate(results) if r is None]
+        return keys, results, missing
+
+    def _store(self, keys, results, missing, analyses):
+        for i, analysis in zip(missing, analyses):
+            results[i] = analysis
+            if not is_failed_analysis(analysis):
+                self.cache.set(keys[i], analysis)
+        return results
+
+    def analyze_tweets(self, tweets: List[Tweet]) -> List[PromptAnalysis]:
+        """批量分析，只把未命中缓存的推文交给底层分析器"""
+        keys, results, missing = self._lookup(tweets)
+        analyses = self.analyzer.analyze_tweets([tweets[i] for i in missing]) if missing else []
+        return self._store(keys, results, missing, analyses)
+
+    def close(self):
+        self.analyzer.close()
+        self.cache.close()
+
+
+class AsyncCachedAnalyzer(CachedAnalyzer):
+    """CachedAnalyzer 的 asyncio 版本"""
+
+    async def analyze_tweet(self, tweet: Tweet) -> PromptAnalysis:
+        key = analysis_cache_key(tweet, self.provider, self.model)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        analysis = await self.analyzer.analyze_tweet(tweet)
+        if not is_failed_analysis(analysis):
+            self.cache.set(key, analysis)
+        return analysis
+
+    async def analyze_tweets(self, tweets: List[Tweet]) -> List[PromptAnalysis]:
+        keys, results, missing = self._lookup(tweets)
+        analyses = await self.analyzer.analyze_tweets([tweets[i] for i in missing]) if missing else []
+        return self._store(keys, results, missing, analyses)
+
+    async def aclose(self):
+        await self.analyzer.aclose()
+        self.cache.close()
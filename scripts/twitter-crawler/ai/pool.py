@@ -0,0 +1,113 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import sys
+sys.path.append('..')
+from config import Config
+from crawler import Tweet
+from .analyzer import PromptAnalysis
+
+# 每个 provider 一个信号量，同一进程内的所有 AnalyzerPool 共享并发上限
+_provider_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+_semaphores_lock = threading.Lock()
+
+
+def provider_semaphore(provider: str) -> threading.BoundedSemaphore:
+    with _semaphores_lock:
+        if provider not in _provider_semaphores:
+            limit = Config.ANALYZER_CONCURRENCY.get(provider, 1)
+            _provider_semaphores[provider] = threading.BoundedSemaphore(max(1, limit))
+        return _provider_semaphores[provider]
+
+
+class AnalyzerPool:
+    """
+    在线程池中并发执行 AI 分析，包装 create_analyzer() 返回的对象
+
+    推文按 Config.ANALYZE_BATCH_SIZE 切块后并行提交，同一 provider 的在途请求数
+    受 Config.ANALYZER_CONCURRENCY 限制。analyze_tweets 的返回顺序与输入一致，
+    调用方的 latest_tweet_id 与统计逻辑不受影响。
+    """
+
+    def __init__(self, analyzer, max_workers: int = None):
+        self.analyzer = analyzer
+        self.semaphore = provider_semaphore(analyzer.provider)
+        limit = Config.ANALYZER_CONCURRENCY.get(analyzer.provider, 1)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or max(1, limit),
+            thread_name_prefix=f'analyzer-{analyzer.provider}'
+        )
+
+    def __getattr__(self, name):
+        # provider / model / cache 等属性透传给被包装的分析器
+        return getattr(self.analyzer, name)
+
+    def _analyze_batch(self, batch: List[Tweet]) -> List[PromptAnalysis]:
+        with self.semaphore:
+            return self.analyzer.analyze_tweets(batch)
+
+    def analyze_tweet(self, tweet: Tweet) -> PromptAnalysis:
+        with self.semaphore:
+            return self.analyzer.analyze_tweet(tweet)
+
+    def analyze_tweets(self, tweets: List[Tweet]) -> List[PromptAnalysis]:
+        batch_size = max(1, Config.ANALYZE_BATCH_SIZE)
+        batches = [tweets[i:i + batch_size] for i in range(0, len(tweets), batch_size)]
+        if len(batches) <= 1:
+            return self._analyze_batch(tweets) if tweets else []
+
+        # executor.map 按提交顺序返回结果
+        results: List[PromptAnalysis] = []
+        for batch_results in self._executor.map(self._analyze_batch, batches):
+            results.extend(batch_results)
+        return results
+
+    def close(self):
+        """关闭线程池，并关闭被包装分析器的 SDK 客户端和结果缓存"""
+        self._executor.shutdown(wait=True)
+        self.analyzer.close()
+
+
+class AsyncAnalyzerPool:
+    """
+    AnalyzerPool 的 asyncio 版本，包装 create_async_analyzer() 返回的对象
+
+    推文按 Config.ANALYZE_BATCH_SIZE 切块后并发分析；同一 provider 的在途请求数受
+    Config.ANALYZER_CONCURRENCY 限制，与同时处理的创作者数 (CRAWL_CONCURRENCY) 无关。
+    信号量绑定到创建时的事件循环，每次 asyncio.run 各自创建一个 pool。
+    """
+
+    def __init__(self, analyzer):
+        self.analyzer = analyzer
+        limit = Config.ANALYZER_CONCURRENCY.get(analyzer.provider, 1)
+        self.semaphore = asyncio.Semaphore(max(1, limit))
+
+    def __getattr__(self, name):
+        # provider / model / cache 等属性透传给被包装的分析器
+        return getattr(self.analyzer, name)
+
+    async def _analyze_batch(self, batch: List[Tweet]) -> List[PromptAnalysis]:
+        async with self.semaphore:
+            return await self.analyzer.analyze_tweets(batch)
+
+    async def analyze_tweet(self, tweet: Tweet) -> PromptAnalysis:
+        async with self.semaphore:
+            return await self.analyzer.analyze_tweet(tweet)
+
+    async def analyze_tweets(self, tweets: List[Tweet]) -> List[PromptAnalysis]:
+        batch_size = max(1, Config.ANALYZE_BATCH_SIZE)
+        batches = [tweets[i:i + batch_size] for i in range(0, len(tweets), batch_size)]
+        if len(batches) <= 1:
+            return await self._analyze_batch(tweets) if tweets else []
+
+        # gather 按传入顺序返回结果
+        results: List[PromptAnalysis] = []
+        for batch_results in await asyncio.gather(*(self._analyze_batch(batch) for batch in batches)):
+            results.extend(batch_results)
+        return results
+
+    async def aclose(self):
+        """关闭被包装分析器的 SDK 客户端和结果缓存"""
+        await self.analyzer.aclose()
@@ -0,0 +1,89 @@
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import List
+
+import sys
+sys.path.append('..')
+from config import Config
+from crawler import Tweet
+
+
+@dataclass
+class PreFilterResult:
+    passed: bool
+    score: int
+    signals: List[str] = field(default_factory=list)
+
+
+# (信号名, 正则, 分值)，与 SYSTEM_PROMPT 中的判断标准对应
+_SIGNALS = [
+    # 模型参数: --ar 16:9, --v 6, --niji, --style raw ...
+    ('mj_params', re.compile(
+        r'(?<![\w-])--(?:ar|aspect|v|version|niji|style|s|stylize|chaos|c|q|quality|seed|no|'
+        r'weird|w|tile|iw|cref|sref|cw|sw|p|raw)\b', re.I), 3),
+    # 权重语法: (word:1.2)
+    ('weights', re.compile(r'\([^():\n]{1,80}:\s*\d+(?:\.\d+)?\s*\)'), 3),
+    # 负向提示词标签
+    ('negative_prompt', re.compile(r'negative\s*prompt|undesired\s*content|反向提示词|负面提示词', re.I), 3),
+    # SD 生成参数
+    ('gen_params', re.compile(r'\b(?:steps|cfg\s*scale|sampler|seed|denoising\s*strength)\s*:', re.I), 2),
+    # 明确提到 prompt
+    ('prompt_keyword', re.compile(r'\bprompts?\b|提示词|咒语|プロンプト', re.I), 2),
+    # AI 模型/工具名
+    ('model_name', re.compile(
+        r'midjourney|\bniji\b|dall[\s·-]?e|stable\s*diffusion|\bsdxl\b|\bsd\s?(?:1\.5|3)\b|\bflux\b|'
+        r'comfyui|novelai|leonardo|ideogram|firefly|imagen|\bkling\b|runway|seedream|'
+        r'gpt[\s-]?4o|nano\s*banana|\bkrea\b|recraft|hunyuan|kolors|\blora\b', re.I), 2),
+    # [word] / {word} 强调语法
+    ('brackets', re.compile(r'\{[^{}\n]{1,60}\}|\[[^\[\]\n]{1,60}\]'), 1),
+    # 常见风格/画质描述词
+    ('style_terms', re.compile(
+        r'artstation|octane\s*render|unreal\s*engine|\b[48]k\b|highly\s*detailed|masterpiece|'
+        r'best\s*quality|cinematic\s*lighting|photorealistic|hyper\s*realistic|\bbokeh\b|'
+        r'depth\s*of\s*field|volumetric', re.I), 1),
+]
+
+_URL = re.compile(r'https?://\S+')
+_LATIN_CHUNK = re.compile(r'[A-Za-z][A-Za-z\s\'-]{2,}')
+
+
+class PromptPreFilter:
+    """
+    AI 分析前的启发式预筛
+
+    用预编译正则给推文打分，得分低于阈值的推文明显不含提示词，直接跳过 LLM 调用。
+    规则偏保守：只要出现任何提示词特征就交给 LLM 判断。
+    """
+
+    def __init__(self, min_score: int = Config.PREFILTER_MIN_SCORE):
+        self.min_score = min_score
+        self.checked = 0
+        self.rejected = 0  # 即节省的 LLM 调用次数
+        self._lock = threading.Lock()
+
+    def evaluate(self, tweet: Tweet) -> PreFilterResult:
+        text = _URL.sub(' ', tweet.text)
+        score = 0
+        signals = []
+
+        for name, pattern, weight in _SIGNALS:
+            if pattern.search(text):
+                score += weight
+                signals.append(name)
+
+        # 逗号分隔的英文描述串 (a girl, long hair, cinematic, ...) 是典型的提示词形态
+        chunks = [c for c in re.split(r'[,，]', text) if _LATIN_CHUNK.search(c)]
+        if len(chunks) >= 6:
+            score += 2
+            signals.append('comma_list')
+
+        return PreFilterResult(passed=score >= self.min_score, score=score, signals=signals)
+
+    def should_analyze(self, tweet: Tweet) -> bool:
+        result = self.evaluate(tweet)
+        with self._lock:
+            self.checked += 1
+            if not result.passed:
+                self.rejected += 1
+        return result.passed
@@ -1,3 +1,4 @@
-from .client import BotApiClient
+from .client import BotApiClient, AsyncBotApiClient
+from .dedupe import DuplicateFilter
 
-__all__ = ['BotApiClient']
+__all__ = ['BotApiClient', 'AsyncBotApiClient', 'DuplicateFilter']
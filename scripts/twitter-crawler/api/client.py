@@ -1,4 +1,5 @@
 import httpx
+import logging
 from typing import List, Optional
 from dataclasses import dataclass
 
@@ -7,6 +8,10 @@ from tenacity import retry, stop_after_attempt, wait_exponential
 import sys
 sys.path.append('..')
 from config import Config
+from .status import CreatorStatusBuffer
+from crawler.cassette import cassette_transport, async_cassette_transport
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -27,35 +32,174 @@ class CreatePromptResult:
     failed_urls: Optional[List[str]] = None
     error: Optional[str] = None
 
+    @property
+    def stored(self) -> bool:
+        """提示词已在库中：本次创建，或因同文本已存在而跳过（previously_failed 等跳过并未入库）"""
+        return self.success or (self.skipped and self.reason == 'duplicate')
+
+
+class CreatorStatusError(Exception):
+    """批量状态更新中部分创作者写入失败（已放回缓冲区，下次 flush 重试）"""
+
+
+def _failed_status_updates(response: httpx.Response, updates: List[dict]) -> List[dict]:
+    """批量 PATCH 部分失败时服务端仍返回 200，按响应中的 failed 列表找出未写入的更新"""
+    try:
+        failed = response.json().get('failed') or []
+    except (ValueError, AttributeError):
+        return []
+    failed_ids = {item.get('creator_id') for item in failed if isinstance(item, dict)}
+    return [update for update in updates if update['creator_id'] in failed_ids]
+
+
+def _status_error(failed: List[dict]) -> CreatorStatusError:
+    return CreatorStatusError(
+        f"{len(failed)} creator status updates failed: {', '.join(u['creator_id'] for u in failed)}"
+    )
+
+
+def _client_options() -> dict:
+    return dict(
+        timeout=60,  # 上传可能较慢
+        follow_redirects=True,  # 跟随重定向
+        headers={
+            'x-api-key': Config.BOT_API_KEY,
+            'Content-Type': 'application/json'
+        }
+    )
+
+
+def parse_creators(data: dict) -> List[Creator]:
+    return [
+        Creator(
+            id=c['id'],
+            username=c['username'],
+            display_name=c.get('display_name'),
+            last_tweet_id=c.get('last_tweet_id')
+        )
+        for c in data.get('creators', [])
+    ]
+
+
+def build_prompt_payload(
+    title: str,
+    prompt_text: str,
+    image_urls: List[str],
+    author_name: str,
+    negative_prompt: Optional[str] = None,
+    model: Optional[str] = None,
+    description: Optional[str] = None,
+) -> dict:
+    """构建 /api/bot/prompts 请求体"""
+    payload = {
+        'title': title,
+        'prompt_text': prompt_text,
+        'image_urls': image_urls,
+        'author_name': author_name,
+        'source': 'twitter',
+        'is_published': True,
+        'is_featured': False,
+    }
+
+    if negative_prompt:
+        payload['negative_prompt'] = negative_prompt
+    if model:
+        payload['model'] = model
+    if description:
+        payload['description'] = description
+    return payload
+
+
+def prompt_result_from_data(status_code: int, data: dict) -> Optional[CreatePromptResult]:
+    """按状态码解析单条创建结果（单条接口响应体或批量接口的 results 元素）"""
+    # 处理 200 响应 (可能是跳过重复)
+    if status_code == 200:
+        if data.get('skipped'):
+            return CreatePromptResult(
+                success=False,
+                skipped=True,
+                reason=data.get('reason', 'duplicate'),
+            )
+        return CreatePromptResult(
+            success=data.get('success', False),
+            prompt_id=(data.get('prompt') or {}).get('id'),
+            images_count=data.get('images_count', 0),
+            failed_urls=data.get('failed_urls'),
+        )
+
+    # 处理 201 响应 (成功创建)
+    if status_code == 201:
+        return CreatePromptResult(
+            success=True,
+            prompt_id=(data.get('prompt') or {}).get('id'),
+            images_count=data.get('images_count', 0),
+            failed_urls=data.get('failed_urls'),
+        )
+
+    # 处理 400 响应 (图片全部失败等)
+    if status_code == 400:
+        return CreatePromptResult(
+            success=False,
+            error=data.get('error'),
+            failed_urls=data.get('failed_urls'),
+        )
+    return None
+
+
+def parse_create_prompt_response(response: httpx.Response) -> CreatePromptResult:
+    """解析 /api/bot/prompts 响应"""
+    result = prompt_result_from_data(response.status_code, response.json())
+    if result is not None:
+        return result
+
+    # 其他错误
+    response.raise_for_status()
+    return CreatePromptResult(success=False, error='Unknown error')
+
+
+def parse_bulk_prompts_response(response: httpx.Response, count: int) -> List[CreatePromptResult]:
+    """解析 /api/bot/prompts/batch 响应，返回与请求同序的结果列表"""
+    response.raise_for_status()
+    results: List[CreatePromptResult] = [
+        CreatePromptResult(success=False, error='Missing result') for _ in range(count)
+    ]
+    for item in response.json().get('results', []):
+        index = item.get('index')
+        if not isinstance(index, int) or not 0 <= index < count:
+            continue
+        status = item.get('status', 500)
+        results[index] = prompt_result_from_data(status, item) or CreatePromptResult(
+            success=False,
+            error=item.get('detail') or item.get('error') or f'HTTP {status}',
+        )
+    return results
+
+
+def chunked(items: list, size: int) -> List[list]:
+    size = max(1, size)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
 
 class BotApiClient:
     def __init__(self):
         # 去掉末尾斜杠，避免 URL 拼接问题
         self.base_url = Config.BOT_API_URL.rstrip('/')
-        self.client = httpx.Client(
-            timeout=60,  # 上传可能较慢
-            follow_redirects=True,  # 跟随重定向
-            headers={
-                'x-api-key': Config.BOT_API_KEY,
-                'Content-Type': 'application/json'
-            }
-        )
+        self.client = httpx.Client(**_client_options(), transport=cassette_transport())
+        self.status_buffer = CreatorStatusBuffer()
 
     def get_active_creators(self) -> List[Creator]:
         """获取活跃的 Twitter 创作者列表"""
         response = self.client.get(f"{self.base_url}/api/bot/creators")
         response.raise_for_status()
-        data = response.json()
-
-        return [
-            Creator(
-                id=c['id'],
-                username=c['username'],
-                display_name=c.get('display_name'),
-                last_tweet_id=c.get('last_tweet_id')
-            )
-            for c in data.get('creators', [])
-        ]
+        return parse_creators(response.json())
+
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
+    def get_prompt_fingerprints(self, since: Optional[str] = None) -> dict:
+        """获取 since 之后创建的提示词指纹（prompt_text 哈希和来源推文 ID）"""
+        params = {'since': since} if since else {}
+        response = self.client.get(f"{self.base_url}/api/bot/prompts/fingerprints", params=params)
+        response.raise_for_status()
+        return response.json()
 
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
     def create_prompt(
@@ -69,65 +213,38 @@ class BotApiClient:
         description: Optional[str] = None,
     ) -> CreatePromptResult:
         """创建提示词，支持去重检测和图片失败记录"""
-        payload = {
-            'title': title,
-            'prompt_text': prompt_text,
-            'image_urls': image_urls,
-            'author_name': author_name,
-            'source': 'twitter',
-            'is_published': True,
-            'is_featured': False,
-        }
-
-        if negative_prompt:
-            payload['negative_prompt'] = negative_prompt
-        if model:
-            payload['model'] = model
-        if description:
-            payload['description'] = description
+        payload = build_prompt_payload(
+            title, prompt_text, image_urls, author_name,
+            negative_prompt=negative_prompt,
+            model=model,
+            description=description,
+        )
 
         response = self.client.post(
             f"{self.base_url}/api/bot/prompts",
             json=payload
         )
-        
-        data = response.json()
-        
-        # 处理 200 响应 (可能是跳过重复)
-        if response.status_code == 200:
-            if data.get('skipped'):
-                return CreatePromptResult(
-                    success=False,
-                    skipped=True,
-                    reason=data.get('reason', 'duplicate'),
-                )
-            return CreatePromptResult(
-                success=data.get('success', False),
-                prompt_id=data.get('prompt', {}).get('id'),
-                images_count=data.get('images_count', 0),
-                failed_urls=data.get('failed_urls'),
-            )
-        
-        # 处理 201 响应 (成功创建)
-        if response.status_code == 201:
-            return CreatePromptResult(
-                success=True,
-                prompt_id=data.get('prompt', {}).get('id'),
-                images_count=data.get('images_count', 0),
-                failed_urls=data.get('failed_urls'),
-            )
-        
-        # 处理 400 响应 (图片全部失败等)
-        if response.status_code == 400:
-            return CreatePromptResult(
-                success=False,
-                error=data.get('error'),
-                failed_urls=data.get('failed_urls'),
-            )
-        
-        # 其他错误
-        response.raise_for_status()
-        return CreatePromptResult(success=False, error='Unknown error')
+        return parse_create_prompt_response(response)
+
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
+    def _post_prompts_batch(self, payloads: List[dict]) -> List[CreatePromptResult]:
+        response = self.client.post(
+            f"{self.base_url}/api/bot/prompts/batch",
+            json={'prompts': payloads},
+            timeout=Config.BULK_INGEST_TIMEOUT
+        )
+        return parse_bulk_prompts_response(response, len(payloads))
+
+    def create_prompts_bulk(self, payloads: List[dict]) -> List[CreatePromptResult]:
+        """
+        批量创建提示词（payload 由 build_prompt_payload 构建），返回与输入同序的结果
+
+        按 Config.BULK_INGEST_SIZE 分块请求；重试整块时已创建的条目会被服务端按重复跳过。
+        """
+        results: List[CreatePromptResult] = []
+        for chunk in chunked(payloads, Config.BULK_INGEST_SIZE):
+            results.extend(self._post_prompts_batch(chunk))
+        return results
 
     def update_creator_status(
         self,
@@ -136,20 +253,152 @@ class BotApiClient:
         increment_fetch: bool = False,
         increment_success: bool = False
     ):
-        """更新创作者抓取状态"""
-        payload = {
-            'creator_id': creator_id,
-            'increment_fetch': increment_fetch,
-            'increment_success': increment_success,
-        }
-        if last_tweet_id:
-            payload['last_tweet_id'] = last_tweet_id
+        """记录创作者抓取状态，合并后由 flush_creator_status 统一发送"""
+        self.status_buffer.add(
+            creator_id,
+            last_tweet_id=last_tweet_id,
+            fetch_count=int(increment_fetch),
+            success_count=int(increment_success)
+        )
 
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
+    def _patch_creator_statuses(self, updates: List[dict]) -> List[dict]:
+        """发送批量更新，返回服务端写入失败的那部分（部分失败不重试，避免重复累加成功的计数）"""
         response = self.client.patch(
             f"{self.base_url}/api/bot/creators",
-            json=payload
+            json={'updates': updates}
         )
         response.raise_for_status()
+        return _failed_status_updates(response, updates)
+
+    def flush_creator_status(self, creator_id: Optional[str] = None):
+        """把缓冲的状态更新合并为一次 PATCH 发出（不指定 creator_id 时发送全部）"""
+        updates = self.status_buffer.drain(creator_id)
+        if not updates:
+            return
+        try:
+            failed = self._patch_creator_statuses(updates)
+        except Exception:
+            self.status_buffer.restore(updates)
+            raise
+        if failed:
+            self.status_buffer.restore(failed)
+            raise _status_error(failed)
 
     def close(self):
-        self.client.close()
\ No newline at end of file
+        # 退出前发送剩余的状态更新
+        try:
+            self.flush_creator_status()
+        except Exception as e:
+            logger.error(f"Failed to flush creator status updates: {e}")
+        self.client.close()
+
+
+class AsyncBotApiClient:
+    """BotApiClient 的 asyncio 版本，供并发引擎使用"""
+
+    def __init__(self):
+        self.base_url = Config.BOT_API_URL.rstrip('/')
+        self.client = httpx.AsyncClient(**_client_options(), transport=async_cassette_transport())
+        self.status_buffer = CreatorStatusBuffer()
+
+    async def get_active_creators(self) -> List[Creator]:
+        """获取活跃的 Twitter 创作者列表"""
+        response = await self.client.get(f"{self.base_url}/api/bot/creators")
+        response.raise_for_status()
+        return parse_creators(response.json())
+
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
+    async def get_prompt_fingerprints(self, since: Optional[str] = None) -> dict:
+        """获取 since 之后创建的提示词指纹（prompt_text 哈希和来源推文 ID）"""
+        params = {'since': since} if since else {}
+        response = await self.client.get(f"{self.base_url}/api/bot/prompts/fingerprints", params=params)
+        response.raise_for_status()
+        return response.json()
+
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
+    async def create_prompt(
+        self,
+        title: str,
+        prompt_text: str,
+        image_urls: List[str],
+        author_name: str,
+        negative_prompt: Optional[str] = None,
+        model: Optional[str] = None,
+        description: Optional[str] = None,
+    ) -> CreatePromptResult:
+        """创建提示词，支持去重检测和图片失败记录"""
+        payload = build_prompt_payload(
+            title, prompt_text, image_urls, author_name,
+            negative_prompt=negative_prompt,
+            model=model,
+            description=description,
+        )
+
+        response = await self.client.post(
+            f"{self.base_url}/api/bot/prompts",
+            json=payload
+        )
+        return parse_create_prompt_response(response)
+
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
+    async def _post_prompts_batch(self, payloads: List[dict]) -> List[CreatePromptResult]:
+        response = await self.client.post(
+            f"{self.base_url}/api/bot/prompts/batch",
+            json={'prompts': payloads},
+            timeout=Config.BULK_INGEST_TIMEOUT
+        )
+        return parse_bulk_prompts_response(response, len(payloads))
+
+    async def create_prompts_bulk(self, payloads: List[dict]) -> List[CreatePromptResult]:
+        """批量创建提示词，返回与输入同序的结果"""
+        results: List[CreatePromptResult] = []
+        for chunk in chunked(payloads, Config.BULK_INGEST_SIZE):
+            results.extend(await self._post_prompts_batch(chunk))
+        return results
+
+    async def update_creator_status(
+        self,
+        creator_id: str,
+        last_tweet_id: Optional[str] = None,
+        increment_fetch: bool = False,
+        increment_success: bool = False
+    ):
+        """记录创作者抓取状态，合并后由 flush_creator_status 统一发送"""
+        self.status_buffer.add(
+            creator_id,
+            last_tweet_id=last_tweet_id,
+            fetch_count=int(increment_fetch),
+            success_count=int(increment_success)
+        )
+
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
+    async def _patch_creator_statuses(self, updates: List[dict]) -> List[dict]:
+        response = await self.client.patch(
+            f"{self.base_url}/api/bot/creators",
+            json={'updates': updates}
+        )
+        response.raise_for_status()
+        return _failed_status_updates(response, updates)
+
+    async def flush_creator_status(self, creator_id: Optional[str] = None):
+        """把缓冲的状态更新合并为一次 PATCH 发出（不指定 creator_id 时发送全部）"""
+        updates = self.status_buffer.drain(creator_id)
+        if not updates:
+            return
+        try:
+            failed = await self._patch_creator_statuses(updates)
+        except Exception:
+            self.status_buffer.restore(updates)
+            raise
+        if failed:
+            self.status_buffer.restore(failed)
+            raise _status_error(failed)
+
+    async def aclose(self):
+        # 退出前发送剩余的状态更新
+        try:
+            await self.flush_creator_status()
+        except Exception as e:
+            logger.error(f"Failed to flush creator status updates: {e}")
+        await self.client.aclose()
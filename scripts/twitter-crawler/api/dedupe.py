@@ -0,0 +1,176 @@
+import hashlib
+import logging
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Optional
+
+import sys
+sys.path.append('..')
+from config import Config
+from crawler.watermark import tweet_id_int
+from crawler.cache_db import open_cache_db
+
+logger = logging.getLogger(__name__)
+
+KIND_PROMPT = 0
+KIND_TWEET = 1
+
+# 新增指纹先放在 set 中，超过该数量再合并进有序数组
+_MERGE_THRESHOLD = 4096
+
+
+def prompt_fingerprint(prompt_text: str) -> int:
+    """prompt_text 指纹：与服务端一致取 SHA-256 前 8 字节，右移 1 位以放入 SQLite 有符号整数"""
+    digest = hashlib.sha256(prompt_text.strip().encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') >> 1
+
+
+class _SortedIntSet:
+    """有序 int64 数组 + 少量未合并的新增项，每条指纹仅占 8 字节"""
+
+    def __init__(self, values: Iterable[int] = ()):
+        self._sorted = array('q', sorted(values))
+        self._recent = set()
+
+    def __contains__(self, value: int) -> bool:
+        if value in self._recent:
+            return True
+        i = bisect_left(self._sorted, value)
+        return i < len(self._sorted) and self._sorted[i] == value
+
+    def add(self, value: int) -> bool:
+        """新增成功返回 True，已存在返回 False"""
+        if value in self:
+            return False
+        self._recent.add(value)
+        if len(self._recent) >= _MERGE_THRESHOLD:
+            self._sorted = array('q', sorted(self._sorted.tolist() + list(self._recent)))
+            self._recent = set()
+        return True
+
+    def __len__(self) -> int:
+        return len(self._sorted) + len(self._recent)
+
+
+class DuplicateFilter:
+    """
+    已入库提示词的本地去重过滤器
+
+    启动时从本地 SQLite 载入已知的 prompt_text 指纹和来源推文 ID，
+    再通过 /api/bot/prompts/fingerprints 增量同步上次之后的新提示词。
+    AI 分析前按推文 ID / 原文、入库前按 prompt_text 过滤掉已存在的内容，
+    省下 LLM 调用和 Bot API 请求。数据为有序 int64 数组，30 万条约 2.4 MB。
+    """
+
+    def __init__(self, path: str = Config.FINGERPRINT_PATH):
+        self.path = path
+        self.skipped_before_analysis = 0
+        self.skipped_before_ingest = 0
+        self._lock = threading.Lock()
+
+        self._conn = open_cache_db(path)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS fingerprints ('
+            ' kind INTEGER NOT NULL,'
+            ' value INTEGER NOT NULL,'
+            ' PRIMARY KEY (kind, value)) WITHOUT ROWID'
+        )
+        self._conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        self._conn.commit()
+
+        self._prompts = self._load(KIND_PROMPT)
+        self._tweets = self._load(KIND_TWEET)
+        logger.debug(f"Duplicate filter loaded: {len(self._prompts)} prompts, {len(self._tweets)} source tweets")
+
+    def _load(self, kind: int) -> _SortedIntSet:
+        rows = self._conn.execute('SELECT value FROM fingerprints WHERE kind = ?', (kind,))
+        return _SortedIntSet(row[0] for row in rows)
+
+    @property
+    def since(self) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'since'").fetchone()
+        return row[0] if row else None
+
+    def apply(self, data: dict) -> bool:
+        """合并一页 /fingerprints 响应，返回是否还有下一页"""
+        prompt_values = [int(h, 16) >> 1 for h in data.get('prompt_hashes', [])]
+        tweet_values = [tweet_id_int(t) for t in data.get('tweet_ids', [])]
+
+        with self._lock:
+            rows = [(KIND_PROMPT, v) for v in prompt_values if self._prompts.add(v)]
+            rows += [(KIND_TWEET, v) for v in tweet_values if v and self._tweets.add(v)]
+            self._conn.executemany('INSERT OR IGNORE INTO fingerprints (kind, value) VALUES (?, ?)', rows)
+            if data.get('next_since'):
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('since', ?)", (data['next_since'],)
+                )
+            self._conn.commit()
+        return bool(data.get('has_more'))
+
+    def _apply_page(self, since: Optional[str], data: dict) -> bool:
+        """合并一页响应，返回是否继续请求下一页；next_since 没有前进时停止，避免重复请求同一页"""
+        has_more = self.apply(data)
+        if has_more and data.get('next_since') == since:
+            # 服务端按 created_at >= since 查询，超过 limit 条记录时间相同时 since 无法前进
+            logger.warning(f"Duplicate filter refresh stalled at since={since}, stopping")
+            return False
+        return has_more
+
+    def refresh(self, api):
+        """从 Bot API 增量同步（BotApiClient）"""
+        before = len(self._prompts)
+        since = self.since
+        while self._apply_page(since, api.get_prompt_fingerprints(since)):
+            since = self.since
+        logger.info(f"Duplicate filter: {len(self._prompts)} known prompts (+{len(self._prompts) - before})")
+
+    async def refresh_async(self, api):
+        """从 Bot API 增量同步（AsyncBotApiClient）"""
+        before = len(self._prompts)
+        since = self.since
+        while self._apply_page(since, await api.get_prompt_fingerprints(since)):
+            since = self.since
+        logger.info(f"Duplicate filter: {len(self._prompts)} known prompts (+{len(self._prompts) - before})")
+
+    def is_known_tweet(self, tweet) -> bool:
+        """AI 分析前检查：来源推文已入库，或推文原文本身就是已有的 prompt_text"""
+        known = (
+            tweet_id_int(tweet.id) in self._tweets
+            or prompt_fingerprint(tweet.text) in self._prompts
+        )
+        if known:
+            with self._lock:
+                self.skipped_before_analysis += 1
+        return known
+
+    def is_known_prompt(self, prompt_text: str) -> bool:
+        """入库前检查 prompt_text 是否已存在"""
+        known = prompt_fingerprint(prompt_text) in self._prompts
+        if known:
+            with self._lock:
+                self.skipped_before_ingest += 1
+        return known
+
+    def add(self, prompt_text: Optional[str] = None, tweet_id: Optional[str] = None):
+        """记录本次运行新入库（或服务端判定重复）的提示词"""
+        rows = []
+        with self._lock:
+            if prompt_text:
+                value = prompt_fingerprint(prompt_text)
+                if self._prompts.add(value):
+                    rows.append((KIND_PROMPT, value))
+            value = tweet_id_int(tweet_id)
+            if value and self._tweets.add(value):
+                rows.append((KIND_TWEET, value))
+            if rows:
+                self._conn.executemany('INSERT OR IGNORE INTO fingerprints (kind, value) VALUES (?, ?)', rows)
+                self._conn.commit()
+
+    @property
+    def skipped(self) -> int:
+        return self.skipped_before_analysis + self.skipped_before_ingest
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
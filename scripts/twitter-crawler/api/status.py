@@ -0,0 +1,75 @@
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import sys
+sys.path.append('..')
+from crawler.watermark import tweet_id_int
+
+
+@dataclass
+class PendingCreatorStatus:
+    last_tweet_id: Optional[str] = None
+    fetch_count: int = 0
+    success_count: int = 0
+
+
+class CreatorStatusBuffer:
+    """
+    创作者状态更新缓冲区
+
+    每次 update_creator_status 只在内存中合并：计数累加，last_tweet_id 取数值最大者。
+    flush 时整批通过一次 PATCH 发出，代替每个成功提示词各一次 PATCH。
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, PendingCreatorStatus] = {}
+        self._lock = threading.Lock()
+
+    def add(
+        self,
+        creator_id: str,
+        last_tweet_id: Optional[str] = None,
+        fetch_count: int = 0,
+        success_count: int = 0
+    ):
+        with self._lock:
+            pending = self._pending.setdefault(creator_id, PendingCreatorStatus())
+            pending.fetch_count += fetch_count
+            pending.success_count += success_count
+            if last_tweet_id and tweet_id_int(last_tweet_id) > tweet_id_int(pending.last_tweet_id):
+                pending.last_tweet_id = last_tweet_id
+
+    def drain(self, creator_id: Optional[str] = None) -> List[dict]:
+        """取出待发送的更新（指定 creator_id 时只取该创作者），返回 PATCH 的 updates 列表"""
+        with self._lock:
+            if creator_id is None:
+                drained, self._pending = self._pending, {}
+            else:
+                pending = self._pending.pop(creator_id, None)
+                drained = {creator_id: pending} if pending else {}
+
+        updates = []
+        for cid, pending in drained.items():
+            update = {
+                'creator_id': cid,
+                'fetch_count': pending.fetch_count,
+                'success_count': pending.success_count,
+            }
+            if pending.last_tweet_id:
+                update['last_tweet_id'] = pending.last_tweet_id
+            updates.append(update)
+        return updates
+
+    def restore(self, updates: List[dict]):
+        """发送失败时放回缓冲区，下次 flush 重试"""
+        for update in updates:
+            self.add(
+                update['creator_id'],
+                last_tweet_id=update.get('last_tweet_id'),
+                fetch_count=update.get('fetch_count', 0),
+                success_count=update.get('success_count', 0)
+            )
+
+    def __len__(self) -> int:
+        return len(self._pending)
@@ -7,183 +7,324 @@ Twitter Prompt Crawler - Backfill Mode
   python backfill.py                    # 默认补抓最近 7 天
   python backfill.py --days 10          # 补抓最近 10 天
   python backfill.py --max-pages 10     # 每个用户最多翻 10 页
+  python backfill.py --resume           # 从上次中断的位置继续
+  python backfill.py --profile          # 剖析本次运行，结果写入 logs/
 """
 
 import argparse
 import logging
+import signal
+import sys
+import threading
 from datetime import datetime, timezone, timedelta
 from typing import List, Optional
 from config import Config
-from crawler import TwitterCrawler, Tweet
-from ai import create_analyzer
-from api import BotApiClient
-
-logging.basicConfig(
-    level=logging.DEBUG if Config.DEBUG else logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
+from crawler import TwitterCrawler, Tweet, CrawlLedger, MediaValidator, ImageHashIndex, QuotaExhaustedError
+from crawler.checkpoint import BackfillCheckpoint
+from crawler.watermark import DateCutoff
+from crawler.ledger import (
+    STAGE_PARSE, STAGE_ANALYSIS, STAGE_INGEST,
+    OUTCOME_NO_IMAGES, OUTCOME_AMBIGUOUS, OUTCOME_DUPLICATE, OUTCOME_ERROR,
+    analysis_outcome, ingest_outcome,
 )
+from ai import create_analyzer, AnalyzerPool, PromptPreFilter, is_ambiguous
+from api import BotApiClient, DuplicateFilter
+from api.client import Creator, build_prompt_payload
+from components import CrawlComponents, new_stats, log_summary
+from logsetup import setup_logging
+from metrics import export_run
+from profiling import profile_run
+from pipeline import Stage, StagePipeline, timeline_pages, boundary_stage, media_stage, image_hash_stage
+
 logger = logging.getLogger(__name__)
 
 
-def fetch_tweets_in_date_range(
+def backfill_creator(
+    creator: Creator,
     crawler: TwitterCrawler,
-    username: str,
+    analyzer,
+    api: BotApiClient,
+    ledger: CrawlLedger,
+    prefilter: Optional[PromptPreFilter],
+    stats: dict,
     since_date: datetime,
-    max_pages: int = 10
-) -> List[Tweet]:
-    """获取用户在指定日期之后的所有带图推文（忽略 since_id，按日期过滤）"""
-    all_tweets = []
-    cursor = None
+    max_pages: int = 10,
+    ignore_ledger: bool = False,
+    dedupe: Optional[DuplicateFilter] = None,
+    media: Optional[MediaValidator] = None,
+    image_index: Optional[ImageHashIndex] = None,
+    checkpoint: Optional[BackfillCheckpoint] = None
+):
+    """流式补抓单个创作者在指定日期之后的带图推文（忽略 since_id，按日期过滤）"""
+    state = {'found': 0}
+    stop = threading.Event()
+
+    # 断点续抓：从上次处理完的最后一页之后继续
+    cursor, pages_done = checkpoint.position(creator.username) if checkpoint else (None, 0)
+    if pages_done:
+        if not cursor or pages_done >= max_pages:
+            return
+        logger.info(f"  Resuming from page {pages_done + 1}")
+
+    def save_page(next_cursor: Optional[str], pages: int):
+        checkpoint.save_page(creator.username, next_cursor, pages_done + pages)
+
+    cutoff = DateCutoff(since_date)
+
+    def reached_old(tweet: Tweet) -> bool:
+        # 推文 ID 已低于截止日期对应的 Snowflake 下界，说明已经翻到更早的内容了
+        if cutoff.is_before(tweet):
+            logger.debug("  Reached tweets older than %s", since_date.date())
+            return True
+        return False
+
+    def filter_tweet(tweet: Tweet):
+        # 台账中已有结论的推文直接跳过
+        if not ignore_ledger and ledger.should_skip(tweet.id):
+            return
+        if not tweet.image_urls:
+            ledger.record(tweet.id, STAGE_PARSE, OUTCOME_NO_IMAGES, creator.username)
+            return
+
+        stats['tweets_found'] += 1
+        state['found'] += 1
+
+        # 来源推文或原文已入库，不再分析
+        if dedupe and dedupe.is_known_tweet(tweet):
+            logger.debug("  Known duplicate tweet: %s", tweet.id)
+            ledger.record(tweet.id, STAGE_INGEST, OUTCOME_DUPLICATE, creator.username, 'known before analysis')
+            return
+
+        # 启发式预筛，明显无关的推文不调用 LLM
+        if prefilter and not prefilter.should_analyze(tweet):
+            logger.debug("  Pre-filter rejected tweet: %s", tweet.id)
+            return
+
+        yield tweet
+
+    def analyze(batch: List[Tweet]):
+        # AI 分析（多条推文合并为一次请求）
+        stats['tweets_analyzed'] += len(batch)
+        yield from zip(batch, analyzer.analyze_tweets(batch))
+
+    def store(items):
+        relevant = []
+        for tweet, analysis in items:
+            if analysis.is_relevant and analysis.confidence >= Config.RELEVANCE_THRESHOLD:
+                if is_ambiguous(analysis, tweet):
+                    logger.info("  Skipped ambiguous tweet: %s", tweet.id)
+                    ledger.record(tweet.id, STAGE_ANALYSIS, OUTCOME_AMBIGUOUS, creator.username)
+                    continue
+                stats['tweets_relevant'] += 1
+                prompt_text = analysis.extracted_prompt or tweet.text
+                if dedupe and dedupe.is_known_prompt(prompt_text):
+                    logger.debug("  Skipped known duplicate: %s", tweet.id)
+                    ledger.record(tweet.id, STAGE_INGEST, OUTCOME_DUPLICATE, creator.username, 'known before ingest')
+                    continue
+                relevant.append((tweet, analysis, prompt_text))
+            else:
+                logger.debug("  Skipped tweet %s: %s", tweet.id, analysis.reason)
+                ledger.record(
+                    tweet.id, STAGE_ANALYSIS, analysis_outcome(analysis, False),
+                    creator.username, analysis.reason
+                )
 
-    for page in range(max_pages):
-        logger.debug(f"  Fetching page {page + 1}...")
+        if not relevant:
+            return
+
+        payloads = [
+            build_prompt_payload(
+                title=analysis.suggested_title or f"@{creator.username} 的提示词",
+                prompt_text=prompt_text,
+                image_urls=tweet.image_urls,
+                author_name=creator.username,
+                negative_prompt=analysis.extracted_negative_prompt,
+                model=analysis.suggested_model,
+                description=f"来源: {tweet.url}"
+            )
+            for tweet, analysis, prompt_text in relevant
+        ]
 
         try:
-            results, next_cursor = crawler.fetch_timeline_page(username, cursor)
+            results = api.create_prompts_bulk(payloads)
         except Exception as e:
-            logger.error(f"  Failed to fetch page {page + 1}: {e}")
-            break
-
-        if not results:
-            break
-
-        reached_old = False
-        for item in results:
-            tweet = crawler._parse_tweet(item, username)
-            if not tweet:
-                continue
-
-            # 如果推文时间早于目标日期，说明已经翻到更早的内容了
-            tweet_time = tweet.created_at
-            if tweet_time.tzinfo is None:
-                tweet_time = tweet_time.replace(tzinfo=timezone.utc)
-            if tweet_time < since_date:
-                reached_old = True
-                break
-
-            if tweet.image_urls:
-                all_tweets.append(tweet)
-
-        if reached_old:
-            logger.debug(f"  Reached tweets older than {since_date.date()} at page {page + 1}")
-            break
-
-        cursor = next_cursor
-        if not cursor:
-            break
-
-    return all_tweets
+            logger.error(f"  Failed to create {len(payloads)} prompts: {e}")
+            stats['errors'] += len(payloads)
+            for tweet, _, _ in relevant:
+                ledger.record(tweet.id, STAGE_INGEST, OUTCOME_ERROR, creator.username, str(e))
+            return
+
+        for (tweet, _, prompt_text), result in zip(relevant, results):
+            ledger.record(tweet.id, STAGE_INGEST, ingest_outcome(result), creator.username)
+            if dedupe and result.stored:
+                dedupe.add(prompt_text, tweet.id)
+            if image_index and result.stored:
+                image_index.add(tweet.id)
+
+            if result.success:
+                stats['prompts_created'] += 1
+                logger.info("  Created prompt: %s", result.prompt_id)
+            elif result.skipped:
+                stats['duplicates_skipped'] += 1
+                logger.debug("  Skipped duplicate: %s", tweet.id)
+            else:
+                stats['images_failed'] += 1
+                logger.warning("  Failed to create prompt: %s", result.error)
+
+    def ingest(items):
+        # 攒批后一次请求批量入库，服务端并发处理图片
+        try:
+            store(items)
+        finally:
+            # 已入库的图片哈希已由 add() 写入索引，其余情况丢弃暂存的哈希
+            if image_index:
+                for tweet, _ in items:
+                    image_index.discard(tweet.id)
+
+    analyze_batch = Config.ANALYZE_BATCH_SIZE * Config.ANALYZER_CONCURRENCY.get(analyzer.provider, 1)
+
+    stages = [
+        Stage('boundary', boundary_stage(stop, reached_old)),
+        Stage('filter', filter_tweet),
+    ]
+    if media:
+        stages.append(Stage(
+            'media', media_stage(media, ledger, creator.username),
+            batch_size=Config.MEDIA_CHECK_CONCURRENCY
+        ))
+    if image_index:
+        stages.append(Stage(
+            'image_hash', image_hash_stage(image_index, ledger, creator.username),
+            batch_size=Config.MEDIA_CHECK_CONCURRENCY
+        ))
+    stages += [
+        Stage('analyze', analyze, batch_size=analyze_batch, provider=analyzer.provider),
+        Stage('ingest', ingest, batch_size=Config.BULK_INGEST_SIZE),
+    ]
+
+    StagePipeline(
+        timeline_pages(
+            crawler, creator.username, max_pages - pages_done,
+            cursor=cursor, on_page=save_page if checkpoint else None,
+            raise_on_error=True
+        ),
+        stages,
+        sync_source=True,
+        stop=stop,
+        creator=creator.username
+    ).run()
+    logger.info(f"  Found {state['found']} tweets with images since {since_date.date()}")
+
+
+def handle_sigterm(signum, frame):
+    """SIGTERM（Actions 取消/超时）按 Ctrl-C 处理：停止流水线，finally 中写入台账，断点已随处理进度提交"""
+    raise KeyboardInterrupt
 
 
 def main():
     parser = argparse.ArgumentParser(description='Backfill missed tweets')
     parser.add_argument('--days', type=int, default=7, help='补抓最近 N 天的推文 (default: 7)')
     parser.add_argument('--max-pages', type=int, default=10, help='每个用户最多翻页数 (default: 10)')
+    parser.add_argument('--ignore-ledger', action='store_true', help='不跳过台账中已处理的推文（仍会记录结果）')
+    parser.add_argument('--resume', action='store_true', help='从上次中断的断点继续（沿用当时的日期范围和翻页数）')
+    parser.add_argument('--profile', action='store_true', default=Config.PROFILE_ENABLED,
+                        help='采集 CPU / 墙钟剖析和各阶段、各创作者的内存峰值，写入 logs/')
     args = parser.parse_args()
+    setup_logging('backfill')
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
 
-    since_date = datetime.now(timezone.utc) - timedelta(days=args.days)
+    checkpoint = BackfillCheckpoint()
+    params = checkpoint.start({
+        'since_date': (datetime.now(timezone.utc) - timedelta(days=args.days)).isoformat(),
+        'max_pages': args.max_pages,
+        'ignore_ledger': args.ignore_ledger,
+    }, resume=args.resume)
+    since_date = datetime.fromisoformat(params['since_date'])
+    max_pages = params['max_pages']
 
     logger.info("=" * 50)
     logger.info("Twitter Prompt Crawler - BACKFILL MODE")
     logger.info(f"Backfilling tweets since: {since_date.date()}")
-    logger.info(f"Max pages per user: {args.max_pages}")
+    logger.info(f"Max pages per user: {max_pages}")
     logger.info(f"AI Provider: {Config.AI_PROVIDER}")
     logger.info("=" * 50)
 
     crawler = TwitterCrawler()
-    analyzer = create_analyzer()
+    analyzer = AnalyzerPool(create_analyzer())
     api = BotApiClient()
+    components = CrawlComponents.create()
 
-    stats = {
-        'creators_processed': 0,
-        'tweets_found': 0,
-        'tweets_analyzed': 0,
-        'tweets_relevant': 0,
-        'prompts_created': 0,
-        'duplicates_skipped': 0,
-        'images_failed': 0,
-        'errors': 0
-    }
-
-    try:
-        creators = api.get_active_creators()
-        logger.info(f"Found {len(creators)} active creators")
-
-        for creator in creators:
-            logger.info(f"Processing @{creator.username}")
-            stats['creators_processed'] += 1
-
-            try:
-                # 按日期范围抓取，不依赖 since_id
-                tweets = fetch_tweets_in_date_range(
-                    crawler,
-                    username=creator.username,
-                    since_date=since_date,
-                    max_pages=args.max_pages
-                )
-                stats['tweets_found'] += len(tweets)
-                logger.info(f"  Found {len(tweets)} tweets with images since {since_date.date()}")
-
-                for tweet in tweets:
-                    stats['tweets_analyzed'] += 1
-
-                    analysis = analyzer.analyze_tweet(tweet)
-
-                    if analysis.is_relevant and analysis.confidence >= Config.RELEVANCE_THRESHOLD:
-                        if not analysis.extracted_prompt and not any(
-                            kw in tweet.text.lower()
-                            for kw in ['--', 'prompt', 'negative', 'artstation', 'detailed']
-                        ):
-                            logger.info(f"  Skipped ambiguous tweet: {tweet.id}")
-                            continue
-
-                        stats['tweets_relevant'] += 1
-
-                        try:
-                            result = api.create_prompt(
-                                title=analysis.suggested_title or f"@{creator.username} 的提示词",
-                                prompt_text=analysis.extracted_prompt or tweet.text,
-                                image_urls=tweet.image_urls,
-                                author_name=creator.username,
-                                negative_prompt=analysis.extracted_negative_prompt,
-                                model=analysis.suggested_model,
-                                description=f"来源: {tweet.url}"
-                            )
-
-                            if result.success:
-                                stats['prompts_created'] += 1
-                                logger.info(f"  Created prompt: {result.prompt_id}")
-                            elif result.skipped:
-                                stats['duplicates_skipped'] += 1
-                                logger.debug(f"  Skipped duplicate: {tweet.id}")
-                            else:
-                                stats['images_failed'] += 1
-                                logger.warning(f"  Failed to create prompt: {result.error}")
-
-                        except Exception as e:
-                            logger.error(f"  Failed to create prompt: {e}")
-                            stats['errors'] += 1
-                    else:
-                        logger.debug(f"  Skipped tweet {tweet.id}: {analysis.reason}")
-
-            except Exception as e:
-                logger.error(f"Error processing @{creator.username}: {e}")
-                stats['errors'] += 1
-
-    finally:
-        crawler.close()
-        api.close()
+    stats = new_stats()
 
-    logger.info("=" * 50)
-    logger.info("Backfill completed!")
-    logger.info(f"  Creators processed: {stats['creators_processed']}")
-    logger.info(f"  Tweets found: {stats['tweets_found']}")
-    logger.info(f"  Tweets analyzed: {stats['tweets_analyzed']}")
-    logger.info(f"  Relevant tweets: {stats['tweets_relevant']}")
-    logger.info(f"  Prompts created: {stats['prompts_created']}")
-    logger.info(f"  Duplicates skipped: {stats['duplicates_skipped']}")
-    logger.info(f"  Images failed: {stats['images_failed']}")
-    logger.info(f"  Errors: {stats['errors']}")
+    interrupted = False
+    failed = 0
+
+    with profile_run('backfill', args.profile):
+        try:
+            creators = api.get_active_creators()
+            logger.info(f"Found {len(creators)} active creators")
+            crawler.warmup_user_ids([c.username for c in creators])
+            if components.dedupe:
+                try:
+                    components.dedupe.refresh(api)
+                except Exception as e:
+                    logger.warning(f"Duplicate filter refresh failed, using local data: {e}")
+
+            for creator in creators:
+                if checkpoint.is_done(creator.username):
+                    logger.debug("Skipping @%s (done before resume)", creator.username)
+                    continue
+                logger.info(f"Processing @{creator.username}")
+                stats['creators_processed'] += 1
+
+                try:
+                    # 按日期范围抓取，不依赖 since_id
+                    backfill_creator(
+                        creator, crawler, analyzer, api,
+                        stats=stats,
+                        since_date=since_date,
+                        max_pages=max_pages,
+                        ignore_ledger=params['ignore_ledger'],
+                        checkpoint=checkpoint,
+                        **components.kwargs()
+                    )
+                    checkpoint.mark_done(creator.username)
+                except QuotaExhaustedError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Error processing @{creator.username}: {e}")
+                    stats['errors'] += 1
+                    failed += 1
+
+            # 有创作者失败时保留断点，--resume 只重试这些创作者
+            if failed:
+                logger.warning(f"{failed} creators failed, rerun with --resume to retry them")
+            else:
+                checkpoint.finish()
+
+        except KeyboardInterrupt:
+            interrupted = True
+            logger.warning("Backfill interrupted, progress saved; rerun with --resume to continue")
+
+        except QuotaExhaustedError as e:
+            interrupted = True
+            stats['errors'] += 1
+            logger.error(f"Twitter API quota exhausted ({e}), progress saved; rerun with --resume after it resets")
+
+        finally:
+            components.collect_stats(stats, analyzer)
+            crawler.close()
+            api.close()
+            components.close()
+            checkpoint.close()
+            analyzer.close()
+
+    log_summary(stats, "Backfill interrupted!" if interrupted else "Backfill completed!")
+    export_run('backfill', stats)
+
+    if interrupted:
+        sys.exit(130)
 
 
 if __name__ == '__main__':
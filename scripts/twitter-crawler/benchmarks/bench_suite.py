@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+爬虫热点路径微基准（不访问网络）
+
+覆盖 timeline 解析、AI 响应解析、启发式预筛、相关性检查、去重指纹和入库请求体构建。
+每个用例报告 ops/s（多次重复取最快一次）和单次操作的内存分配峰值 (tracemalloc)，
+并与保存的基线对比，超出阈值的变化标记为回退。
+
+用法:
+  python benchmarks/bench_suite.py                    # 运行全部用例，有基线时对比
+  python benchmarks/bench_suite.py -k timeline        # 只运行名称包含 timeline 的用例
+  python benchmarks/bench_suite.py --save-baseline    # 把本次结果保存为基线
+  python benchmarks/bench_suite.py --check            # 有回退时退出码为 1
+
+基线默认保存在 .cache/bench_baseline.json（与机器相关，不提交）。
+ops/s 受机器负载影响，建议在同一台机器上对比；分配峰值基本稳定。
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from config import Config
+from crawler.twitter import TwitterTimelineParser
+from crawler.timeline import loads, parse_entry, parse_timeline
+from ai.analyzer import PromptAnalysis, parse_response, parse_batch_response, is_ambiguous
+from ai.prefilter import PromptPreFilter
+from api.client import build_prompt_payload
+from api.dedupe import prompt_fingerprint
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+BASELINE_PATH = os.path.join(Config.CACHE_DIR, 'bench_baseline.json')
+USERNAME = 'promptcraft_ai'
+
+
+@dataclass
+class Case:
+    name: str
+    fn: Callable
+    items: list  # 每个元素调用一次 fn，即一次操作
+
+
+@dataclass
+class Result:
+    name: str
+    ops_per_sec: float
+    alloc_bytes: float  # 单次操作的分配峰值
+
+
+def analysis_text(tweet, index: Optional[int] = None) -> dict:
+    """按 get_user_prompt 要求的格式构造一条模型输出"""
+    result = {
+        'is_relevant': '--' in tweet.text,
+        'confidence': 0.92,
+        'reason': '包含 Midjourney 参数',
+        'extracted_prompt': tweet.text[:200],
+        'extracted_negative_prompt': None,
+        'suggested_title': '赛博朋克城市夜景',
+        'suggested_model': 'midjourney-v6',
+    }
+    if index is not None:
+        result = {'index': index, **result}
+    return result
+
+
+def build_cases(paths: List[str]) -> List[Case]:
+    payloads = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            payloads.append(f.read())
+
+    pages = [parse_timeline(loads(content), USERNAME) for content in payloads]
+    entries = [entry for page in pages for entry in page.entries]
+    tweets = [tweet for page in pages for tweet in page.tweets]
+    if not tweets:
+        raise SystemExit('Fixtures contain no tweets')
+    datas = [loads(content) for content in payloads]
+    reference = TwitterTimelineParser()
+
+    single = [json.dumps(analysis_text(tweet), ensure_ascii=False) for tweet in tweets]
+    fenced = [f"```json\n{text}\n```" for text in single]
+    batch_size = max(2, Config.ANALYZE_BATCH_SIZE)
+    batches = [
+        (json.dumps([analysis_text(t, i) for i, t in enumerate(tweets[start:start + batch_size])], ensure_ascii=False),
+         len(tweets[start:start + batch_size]))
+        for start in range(0, len(tweets), batch_size)
+    ]
+    analyses = [PromptAnalysis(**analysis_text(tweet)) for tweet in tweets]
+    # 一半没有提取到 prompt，走原文关键词检查
+    for analysis in analyses[::2]:
+        analysis.extracted_prompt = None
+    prefilter = PromptPreFilter()
+
+    def payload(pair):
+        tweet, analysis = pair
+        return json.dumps(build_prompt_payload(
+            title=analysis.suggested_title or f"@{tweet.username} 的提示词",
+            prompt_text=analysis.extracted_prompt or tweet.text,
+            image_urls=tweet.image_urls,
+            author_name=tweet.username,
+            negative_prompt=analysis.extracted_negative_prompt,
+            model=analysis.suggested_model,
+            description=f"来源: {tweet.url}"
+        ), ensure_ascii=False)
+
+    return [
+        Case('timeline.page', lambda content: parse_timeline(loads(content), USERNAME), payloads),
+        Case('timeline.decode', loads, payloads),
+        Case('timeline.extract_entries', reference._extract_entries, datas),
+        Case('timeline.parse_entry', lambda entry: parse_entry(entry, USERNAME), entries),
+        Case('timeline.parse_tweet (reference)', lambda entry: reference._parse_tweet(entry, USERNAME), entries),
+        Case('analyzer.parse_response', parse_response, single),
+        Case('analyzer.parse_response (fenced)', parse_response, fenced),
+        Case(f'analyzer.parse_batch_response (x{batch_size})', lambda item: parse_batch_response(*item), batches),
+        Case('prefilter.evaluate', prefilter.evaluate, tweets),
+        Case('relevance.is_ambiguous', lambda pair: is_ambiguous(pair[1], pair[0]), list(zip(tweets, analyses))),
+        Case('dedupe.prompt_fingerprint', prompt_fingerprint, [tweet.text for tweet in tweets]),
+        Case('api.build_prompt_payload+json', payload, list(zip(tweets, analyses))),
+    ]
+
+
+def _run(fn, items, loops: int) -> float:
+    start = time.perf_counter()
+    for _ in range(loops):
+        for item in items:
+            fn(item)
+    return time.perf_counter() - start
+
+
+def _alloc_peak(fn, items) -> float:
+    """单次调用期间 tracemalloc 记录的内存峰值（相对调用前），取平均"""
+    tracemalloc.start()
+    total = 0
+    for item in items:
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        fn(item)
+        total += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    return total / len(items)
+
+
+def measure(case: Case, min_time: float, repeat: int) -> Result:
+    fn, items = case.fn, case.items
+    _run(fn, items, 1)  # 预热
+
+    # 校准循环次数，使每次重复至少运行 min_time 秒
+    loops = 1
+    while True:
+        elapsed = _run(fn, items, loops)
+        if elapsed >= min_time / 5 or loops >= 1 << 20:
+            break
+        loops *= 2
+    loops = max(1, int(loops * min_time / max(elapsed, 1e-9)))
+
+    best = min(_run(fn, items, loops) for _ in range(repeat))
+    ops_per_sec = loops * len(items) / best
+
+    # 分配峰值单独测（tracemalloc 会显著拖慢执行），扣除测量本身的开销
+    overhead = _alloc_peak(lambda item: None, items)
+    alloc_bytes = max(0.0, _alloc_peak(fn, items) - overhead)
+    return Result(case.name, ops_per_sec, alloc_bytes)
+
+
+def load_baseline(path: str) -> Dict[str, dict]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f).get('results', {})
+
+
+def save_baseline(path: str, results: List[Result]):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    data = {
+        'python': sys.version.split()[0],
+        'saved_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': {r.name: {'ops_per_sec': r.ops_per_sec, 'alloc_bytes': r.alloc_bytes} for r in results},
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+
+
+def _change(current: float, previous: Optional[float]) -> Optional[float]:
+    if not previous:
+        return None
+    return (current - previous) / previous * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmarks for the crawler hot paths')
+    parser.add_argument('-k', '--filter', help='只运行名称包含该字符串的用例')
+    parser.add_argument('--fixtures', nargs='*', help='timeline fixture 文件 (default: benchmarks/fixtures/*.json)')
+    parser.add_argument('--min-time', type=float, default=0.2, help='每次重复的最短运行时间，秒 (default: 0.2)')
+    parser.add_argument('--repeat', type=int, default=5, help='重复次数，取最快一次 (default: 5)')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help=f'基线文件 (default: {BASELINE_PATH})')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果保存为基线')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='ops/s 下降或分配增加超过该百分比视为回退 (default: 10)')
+    parser.add_argument('--check', action='store_true', help='有回退时以退出码 1 结束')
+    args = parser.parse_args()
+
+    paths = args.fixtures or sorted(glob.glob(os.path.join(FIXTURE_DIR, '*.json')))
+    if not paths:
+        raise SystemExit('No fixtures found')
+
+    cases = [c for c in build_cases(paths) if not args.filter or args.filter in c.name]
+    if not cases:
+        raise SystemExit(f'No benchmark matches {args.filter!r}')
+    baseline = load_baseline(args.baseline)
+
+    print(f"{'benchmark':<40}{'ops/s':>12}{'alloc/op':>11}{'vs baseline':>14}{'alloc Δ':>10}")
+    results, regressions = [], []
+    for case in cases:
+        result = measure(case, args.min_time, args.repeat)
+        results.append(result)
+
+        previous = baseline.get(case.name, {})
+        speed = _change(result.ops_per_sec, previous.get('ops_per_sec'))
+        alloc = _change(result.alloc_bytes, previous.get('alloc_bytes'))
+        regressed = (speed is not None and speed < -args.threshold) or \
+            (alloc is not None and alloc > args.threshold)
+        if regressed:
+            regressions.append(case.name)
+
+        speed_text = f"{speed:+.1f}%" if speed is not None else '-'
+        alloc_text = f"{alloc:+.1f}%" if alloc is not None else '-'
+        print(
+            f"{case.name:<40}{result.ops_per_sec:>12,.0f}{result.alloc_bytes / 1024:>9.1f}KB"
+            f"{speed_text:>14}{alloc_text:>10}{'  REGRESSION' if regressed else ''}"
+        )
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"Baseline saved to {args.baseline}")
+    elif not baseline:
+        print(f"No baseline at {args.baseline}, run with --save-baseline to create one")
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0f}%: {', '.join(regressions)}")
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+timeline 解析基准：逐字段查找的参考实现 vs 单遍解析
+
+用法:
+  python benchmarks/bench_timeline.py                 # 默认每个 fixture 跑 200 轮
+  python benchmarks/bench_timeline.py --rounds 1000
+  python benchmarks/bench_timeline.py --fixtures path/to/*.json
+
+fixtures/ 下是按 twitter241 /user-tweets 响应结构构造的样本页（置顶、长推文、转推、
+TweetWithVisibilityResults、视频、纯文本、cursor entry 等情况都有覆盖）。
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from crawler.twitter import TwitterTimelineParser
+from crawler.timeline import loads, parse_timeline, orjson
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+USERNAME = 'promptcraft_ai'
+
+
+def legacy_parse(parser: TwitterTimelineParser, content: bytes):
+    """改动前 fetch_timeline_page + _parse_tweet 的解析路径"""
+    data = json.loads(content)
+    entries = parser._extract_entries(data)
+    cursor = parser._extract_cursor(data)
+    tweets = [t for t in (parser._parse_tweet(e, USERNAME) for e in entries) if t]
+    return entries, cursor, tweets
+
+
+def single_pass_json(content: bytes):
+    page = parse_timeline(json.loads(content), USERNAME)
+    return page.entries, page.cursor, page.tweets
+
+
+def single_pass(content: bytes):
+    page = parse_timeline(loads(content), USERNAME)
+    return page.entries, page.cursor, page.tweets
+
+
+def check_equivalent(parser: TwitterTimelineParser, name: str, content: bytes):
+    expected = legacy_parse(parser, content)
+    actual = single_pass(content)
+    if expected != actual:
+        raise SystemExit(f"{name}: single-pass result differs from the reference parser")
+    return len(expected[2])
+
+
+def measure(fn, payloads, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for content in payloads:
+            fn(content)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark twitter241 timeline parsing')
+    parser.add_argument('--rounds', type=int, default=200, help='每个 fixture 的解析轮数 (default: 200)')
+    parser.add_argument('--fixtures', nargs='*', help='fixture 文件 (default: benchmarks/fixtures/*.json)')
+    args = parser.parse_args()
+
+    paths = args.fixtures or sorted(glob.glob(os.path.join(FIXTURE_DIR, '*.json')))
+    if not paths:
+        raise SystemExit('No fixtures found')
+
+    reference = TwitterTimelineParser()
+    payloads = []
+    tweets_per_round = 0
+    for path in paths:
+        with open(path, 'rb') as f:
+            content = f.read()
+        tweets_per_round += check_equivalent(reference, os.path.basename(path), content)
+        payloads.append(content)
+
+    total_bytes = sum(len(p) for p in payloads) * args.rounds
+    total_pages = len(payloads) * args.rounds
+    total_tweets = tweets_per_round * args.rounds
+
+    cases = [
+        ('reference (json + .get chains)', lambda c: legacy_parse(reference, c)),
+        ('single-pass (json)', single_pass_json),
+    ]
+    if orjson is not None:
+        cases.append(('single-pass (orjson)', single_pass))
+
+    print(f"{len(payloads)} fixtures, {tweets_per_round} tweets/round, {args.rounds} rounds")
+    print(f"{'parser':<34}{'pages/s':>10}{'tweets/s':>12}{'MB/s':>9}{'speedup':>9}")
+
+    baseline = None
+    for label, fn in cases:
+        fn(payloads[0])  # 预热
+        elapsed = measure(fn, payloads, args.rounds)
+        baseline = baseline or elapsed
+        print(
+            f"{label:<34}{total_pages / elapsed:>10.0f}{total_tweets / elapsed:>12.0f}"
+            f"{total_bytes / elapsed / 1e6:>9.1f}{baseline / elapsed:>8.2f}x"
+        )
+
+    if orjson is None:
+        print('orjson not installed: single-pass falls back to the standard json module')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,529 @@
+#!/usr/bin/env python3
+"""
+端到端负载模拟：本地启动 twitter241 / LLM / Bot API 三个替身服务，用它们完整运行 main.py
+
+- twitter241：/user、/user-tweets 返回合成的分页 timeline，/media/* 提供推文图片
+- LLM：Anthropic (/v1/messages) 和 OpenAI 兼容 (/v1/chat/completions) 两种接口，
+  按推文内容返回单条或批量分析结果
+- Bot API：/api/bot/creators、/api/bot/prompts(/batch)、/api/bot/prompts/fingerprints
+
+每个服务都可以注入延迟、429 和 5xx。每个创作者数量各跑一次 main.py（独立的缓存目录），
+报告总耗时、吞吐量，以及服务端看到的各阶段请求延迟分位数。
+
+用法:
+  python benchmarks/loadsim.py --creators 100 1000
+  python benchmarks/loadsim.py --creators 500 --llm-latency 2000 --llm-429 0.05 -- --concurrency 8
+  python benchmarks/loadsim.py --creators 50 --provider openai --rate-limit-rps 50 --json logs/loadsim.json
+
+"--" 之后的参数原样传给 main.py。main.py 的日志写入 logs/loadsim-<creators>.log。
+注意 twitter241 限流器默认 1 请求/秒，与生产一致；只关心其余阶段时可用 --rate-limit-rps 放开。
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+CRAWLER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+LOG_DIR = os.path.join(CRAWLER_DIR, 'logs')
+
+try:
+    from PIL import Image
+except ImportError:  # 可选依赖：没有 Pillow 时所有图片内容相同（爬虫端的感知哈希去重也会关闭）
+    Image = None
+
+TWITTER_EPOCH_MS = 1288834974657
+PAGE_SIZE = 20
+PROMPT_TEXTS = [
+    'neon city at night, rain, cinematic lighting --ar 16:9 --v 6',
+    'Prompt: portrait of an old sailor, (masterpiece:1.2), highly detailed, 8k',
+    'a tiny dragon sleeping in a teacup, watercolor --niji 6 --s 250',
+    'Midjourney prompt: brutalist library interior, volumetric light --ar 3:4',
+]
+CHATTER_TEXTS = [
+    'good morning everyone',
+    'check out my #AIArt gallery',
+    'new drop this weekend, stay tuned',
+    'thanks for 10k followers!',
+]
+
+
+@dataclass
+class Faults:
+    """注入的延迟（毫秒，对数正态抖动）、429 概率和 5xx 概率"""
+    latency_ms: float = 0.0
+    jitter: float = 0.5
+    rate_429: float = 0.0
+    error_rate: float = 0.0
+
+    def delay(self) -> float:
+        if self.latency_ms <= 0:
+            return 0.0
+        return self.latency_ms * random.lognormvariate(0, self.jitter) / 1000
+
+    def pick_status(self) -> Optional[int]:
+        roll = random.random()
+        if roll < self.rate_429:
+            return 429
+        if roll < self.rate_429 + self.error_rate:
+            return 503
+        return None
+
+
+@dataclass
+class Recorder:
+    """按阶段记录服务端处理耗时和状态码"""
+    latencies: Dict[str, List[float]] = field(default_factory=dict)
+    statuses: Dict[str, Dict[int, int]] = field(default_factory=dict)
+    counters: Dict[str, int] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def observe(self, stage: str, seconds: float, status: int):
+        with self.lock:
+            self.latencies.setdefault(stage, []).append(seconds * 1000)
+            by_status = self.statuses.setdefault(stage, {})
+            by_status[status] = by_status.get(status, 0) + 1
+
+    def incr(self, name: str, value: int = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def snowflake(moment_ms: int) -> int:
+    return (moment_ms - TWITTER_EPOCH_MS) << 22
+
+
+class World:
+    """合成数据：创作者、timeline 和图片"""
+
+    def __init__(self, creators: int, tweets_per_creator: int, prompt_ratio: float, image_ratio: float, seed: int):
+        self.creators = creators
+        self.tweets_per_creator = tweets_per_creator
+        self.prompt_ratio = prompt_ratio
+        self.image_ratio = image_ratio
+        self.seed = seed
+        self.now_ms = int(time.time() * 1000)
+        self.media_base = ''
+        self._images: Dict[str, bytes] = {}
+        self._images_lock = threading.Lock()
+
+    def creator_list(self) -> List[dict]:
+        return [
+            {'id': f'sim-{i}', 'username': f'sim_user{i}', 'display_name': None, 'last_tweet_id': None}
+            for i in range(self.creators)
+        ]
+
+    def user_id(self, username: str) -> Optional[str]:
+        match = re.fullmatch(r'sim_user(\d+)', username)
+        if not match or int(match.group(1)) >= self.creators:
+            return None
+        return str(1_000_000 + int(match.group(1)))
+
+    def _tweet(self, creator: int, index: int) -> dict:
+        rnd = random.Random(f'{self.seed}-{creator}-{index}')
+        # 每条推文间隔 10 分钟，创作者之间错开 1 秒，保证 ID 唯一
+        tid = str(snowflake(self.now_ms - index * 600_000 - creator * 1000))
+        relevant = rnd.random() < self.prompt_ratio
+        base = rnd.choice(PROMPT_TEXTS if relevant else CHATTER_TEXTS)
+        legacy = {
+            'id_str': tid,
+            'full_text': f'{base} #{creator}-{index}',
+            'created_at': time.strftime(
+                '%a %b %d %H:%M:%S +0000 %Y', time.gmtime((self.now_ms - index * 600_000) / 1000)
+            ),
+        }
+        if rnd.random() < self.image_ratio:
+            legacy['extended_entities'] = {'media': [
+                {'type': 'photo', 'media_url_https': f'{self.media_base}/media/{tid}.jpg'}
+            ]}
+        return {
+            'entryId': f'tweet-{tid}',
+            'content': {'itemContent': {'tweet_results': {'result': {
+                '__typename': 'Tweet',
+                'rest_id': tid,
+                'legacy': legacy,
+                'core': {'user_results': {'result': {'legacy': {'screen_name': f'sim_user{creator}'}}}},
+            }}}},
+        }
+
+    def timeline_page(self, user_id: str, cursor: Optional[str]) -> dict:
+        creator = int(user_id) - 1_000_000
+        page = int(cursor[1:]) if cursor and cursor.startswith('p') else 0
+        start = page * PAGE_SIZE
+        end = min(start + PAGE_SIZE, self.tweets_per_creator)
+        entries = [self._tweet(creator, i) for i in range(start, end)]
+        if end < self.tweets_per_creator:
+            entries.append({'entryId': f'cursor-bottom-{page}', 'content': {'value': f'p{page + 1}'}})
+        return {'result': {'timeline': {'instructions': [{'type': 'TimelineAddEntries', 'entries': entries}]}}}
+
+    def image(self, tid: str) -> bytes:
+        with self._images_lock:
+            cached = self._images.get(tid)
+        if cached is not None:
+            return cached
+        if Image is None:
+            return b'\xff\xd8\xff\xe0' + b'\x00' * 256 + b'\xff\xd9'
+        rnd = random.Random(tid)
+        image = Image.new('L', (64, 48))
+        a, b, c = rnd.randint(1, 7), rnd.randint(1, 7), rnd.randint(0, 255)
+        image.putdata([(x * a + y * b + c) % 256 for y in range(48) for x in range(64)])
+        buffer = io.BytesIO()
+        image.convert('RGB').save(buffer, 'JPEG', quality=70)
+        data = buffer.getvalue()
+        with self._images_lock:
+            self._images[tid] = data
+        return data
+
+
+class SimServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, handler, world: World, recorder: Recorder, faults: Dict[str, Faults]):
+        super().__init__(('127.0.0.1', 0), handler)
+        self.world = world
+        self.recorder = recorder
+        self.faults = faults
+        self.seen_prompts = set()
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class SimHandler(BaseHTTPRequestHandler, ABC):
+    """各模拟服务的公共部分：故障注入和耗时记录；子类实现 stage() 和 route()"""
+
+    protocol_version = 'HTTP/1.1'
+    server: SimServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes = b'', content_type: str = 'application/json', headers: dict = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _json(self, status: int, data) -> int:
+        self._send(status, json.dumps(data, ensure_ascii=False).encode('utf-8'))
+        return status
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        return json.loads(raw) if raw else {}
+
+    def _handle(self):
+        start = time.perf_counter()
+        parsed = urlparse(self.path)
+        stage = self.stage(parsed.path)
+        faults = self.server.faults.get(stage.split('.')[0], Faults())
+        body = self._body() if self.command in ('POST', 'PATCH') else None
+
+        time.sleep(faults.delay())
+        status = faults.pick_status()
+        if status == 429:
+            self._send(429, b'{"error":"rate limited"}', headers={'Retry-After': '1'})
+        elif status:
+            self._json(status, {'error': 'injected failure'})
+        else:
+            status = self.route(parsed, body)
+        self.server.recorder.observe(stage, time.perf_counter() - start, status)
+
+    do_GET = do_POST = do_PATCH = do_HEAD = _handle
+
+    @abstractmethod
+    def stage(self, path: str) -> str:
+        """请求所属的统计阶段，如 twitter.timeline；点号前的部分用于查找 Faults"""
+
+    @abstractmethod
+    def route(self, parsed, body) -> int:
+        """处理请求并写出响应，返回 HTTP 状态码"""
+
+
+class TwitterHandler(SimHandler):
+    def stage(self, path: str) -> str:
+        if path.startswith('/media/'):
+            return 'media.head' if self.command == 'HEAD' else 'media.get'
+        return 'twitter.user' if path == '/user' else 'twitter.timeline'
+
+    def route(self, parsed, body) -> int:
+        world = self.server.world
+        params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        if parsed.path == '/user':
+            user_id = world.user_id(params.get('username', ''))
+            if not user_id:
+                return self._json(200, {'result': {}})
+            return self._json(200, {'result': {'rest_id': user_id}})
+        if parsed.path == '/user-tweets':
+            self.server.recorder.incr('timeline_pages')
+            page = world.timeline_page(params['user'], params.get('cursor'))
+            return self._json(200, page)
+        if parsed.path.startswith('/media/'):
+            data = world.image(parsed.path.rsplit('/', 1)[1].split('.')[0])
+            self._send(200, data, content_type='image/jpeg')
+            return 200
+        return self._json(404, {'error': 'not found'})
+
+
+_TWEET_TEXT = re.compile(r'推文内容:\n(.*?)\n\n推文包含', re.S)
+
+
+def _analysis(text: str) -> dict:
+    relevant = '--' in text or 'prompt' in text.lower() or '(masterpiece' in text
+    return {
+        'is_relevant': relevant,
+        'confidence': 0.93 if relevant else 0.1,
+        'reason': 'simulated',
+        'extracted_prompt': text if relevant else None,
+        'extracted_negative_prompt': None,
+        'suggested_title': '模拟提示词' if relevant else None,
+        'suggested_model': 'midjourney-v6' if relevant else None,
+    }
+
+
+class LLMHandler(SimHandler):
+    def stage(self, path: str) -> str:
+        return 'llm.messages' if path.endswith('/messages') else 'llm.chat'
+
+    def route(self, parsed, body) -> int:
+        messages = body.get('messages', [])
+        prompt = next((m['content'] for m in reversed(messages) if m.get('role') == 'user'), '')
+        if isinstance(prompt, list):
+            prompt = ''.join(part.get('text', '') for part in prompt)
+        texts = _TWEET_TEXT.findall(prompt)
+        self.server.recorder.incr('llm_requests')
+        self.server.recorder.incr('llm_tweets', len(texts))
+
+        if re.search(r'^\[0\]', prompt, re.M):
+            content = json.dumps([{'index': i, **_analysis(t)} for i, t in enumerate(texts)], ensure_ascii=False)
+        else:
+            content = json.dumps(_analysis(texts[0] if texts else ''), ensure_ascii=False)
+
+        usage = {'input_tokens': len(prompt) // 4, 'output_tokens': len(content) // 4}
+        if parsed.path.endswith('/messages'):
+            return self._json(200, {
+                'id': 'msg_sim', 'type': 'message', 'role': 'assistant', 'model': body.get('model', 'sim'),
+                'content': [{'type': 'text', 'text': content}],
+                'stop_reason': 'end_turn', 'stop_sequence': None, 'usage': usage,
+            })
+        return self._json(200, {
+            'id': 'chatcmpl-sim', 'object': 'chat.completion', 'created': int(time.time()),
+            'model': body.get('model', 'sim'),
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': content}}],
+            'usage': {'prompt_tokens': usage['input_tokens'], 'completion_tokens': usage['output_tokens'],
+                      'total_tokens': usage['input_tokens'] + usage['output_tokens']},
+        })
+
+
+class BotHandler(SimHandler):
+    def stage(self, path: str) -> str:
+        if path == '/api/bot/creators':
+            return 'bot.status' if self.command == 'PATCH' else 'bot.creators'
+        if path.endswith('/fingerprints'):
+            return 'bot.fingerprints'
+        return 'bot.prompts'
+
+    def _create(self, payload: dict) -> dict:
+        with self.server.lock:
+            duplicate = payload.get('prompt_text') in self.server.seen_prompts
+            self.server.seen_prompts.add(payload.get('prompt_text'))
+        if duplicate:
+            self.server.recorder.incr('prompts_skipped')
+            return {'status': 200, 'success': False, 'skipped': True, 'reason': 'duplicate'}
+        self.server.recorder.incr('prompts_created')
+        return {'status': 201, 'success': True, 'prompt': {'id': 'sim'}, 'images_count': len(payload.get('image_urls', []))}
+
+    def route(self, parsed, body) -> int:
+        path = parsed.path
+        if path == '/api/bot/creators' and self.command == 'GET':
+            return self._json(200, {'creators': self.server.world.creator_list()})
+        if path == '/api/bot/creators':
+            self.server.recorder.incr('status_updates', len(body.get('updates', [body])))
+            return self._json(200, {'success': True})
+        if path == '/api/bot/prompts/fingerprints':
+            return self._json(200, {'prompt_hashes': [], 'tweet_ids': [], 'next_since': None, 'has_more': False})
+        if path == '/api/bot/prompts/batch':
+            results = [{'index': i, **self._create(p)} for i, p in enumerate(body.get('prompts', []))]
+            return self._json(200, {'results': results})
+        if path == '/api/bot/prompts':
+            result = self._create(body)
+            return self._json(result.pop('status'), result)
+        return self._json(404, {'error': 'not found'})
+
+
+def start(handler, world, recorder, faults) -> SimServer:
+    server = SimServer(handler, world, recorder, faults)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_once(creators: int, args, faults: Dict[str, Faults]) -> dict:
+    world = World(creators, args.tweets_per_creator, args.prompt_ratio, args.image_ratio, args.seed)
+    recorder = Recorder()
+    twitter = start(TwitterHandler, world, recorder, faults)
+    llm = start(LLMHandler, world, recorder, faults)
+    bot = start(BotHandler, world, recorder, faults)
+    world.media_base = twitter.url
+
+    os.makedirs(LOG_DIR, exist_ok=True)
+    log_path = os.path.join(LOG_DIR, f'loadsim-{creators}.log')
+    # 模拟运行的日志、指标和剖析结果写到 logs/loadsim/<创作者数>/，不覆盖真实运行的 logs/main.*
+    run_log_dir = os.path.join(LOG_DIR, 'loadsim', str(creators))
+    with tempfile.TemporaryDirectory(prefix='loadsim-') as cache_dir:
+        env = dict(
+            os.environ,
+            CRAWLER_CACHE_DIR=cache_dir,
+            CRAWLER_LOG_DIR=run_log_dir,
+            METRICS_DIR=run_log_dir,
+            TWITTER_API_URL=twitter.url,
+            RAPIDAPI_KEY='sim',
+            BOT_API_URL=bot.url,
+            BOT_API_KEY='sim',
+            AI_PROVIDER=args.provider,
+            CLAUDE_API_KEY='sim',
+            CLAUDE_BASE_URL=llm.url,
+            OPENAI_API_KEY='sim',
+            OPENAI_BASE_URL=f'{llm.url}/v1',
+            CASSETTE_MODE='off',
+        )
+        if args.rate_limit_rps:
+            env['RATE_LIMIT_RPS'] = env['RATE_LIMIT_MAX_RPS'] = str(args.rate_limit_rps)
+
+        start_time = time.perf_counter()
+        with open(log_path, 'w', encoding='utf-8') as log:
+            process = subprocess.run(
+                [sys.executable, 'main.py', *args.main_args],
+                cwd=CRAWLER_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+            )
+        elapsed = time.perf_counter() - start_time
+
+    for server in (twitter, llm, bot):
+        server.shutdown()
+        server.server_close()
+
+    counters = recorder.counters
+    return {
+        'creators': creators,
+        'exit_code': process.returncode,
+        'seconds': elapsed,
+        'log': log_path,
+        'creators_per_sec': creators / elapsed if elapsed else 0.0,
+        'timeline_pages': counters.get('timeline_pages', 0),
+        'llm_requests': counters.get('llm_requests', 0),
+        'llm_tweets': counters.get('llm_tweets', 0),
+        'prompts_created': counters.get('prompts_created', 0),
+        'prompts_per_sec': counters.get('prompts_created', 0) / elapsed if elapsed else 0.0,
+        'stages': {
+            stage: {
+                'requests': len(values),
+                'p50_ms': percentile(values, 50),
+                'p95_ms': percentile(values, 95),
+                'p99_ms': percentile(values, 99),
+                'max_ms': max(values),
+                'status': {str(k): v for k, v in sorted(recorder.statuses[stage].items())},
+            }
+            for stage, values in sorted(recorder.latencies.items())
+        },
+    }
+
+
+def print_report(result: dict):
+    print(
+        f"\n== {result['creators']} creators: {result['seconds']:.1f}s "
+        f"(exit {result['exit_code']}, log: {os.path.relpath(result['log'])})"
+    )
+    print(
+        f"  {result['creators_per_sec']:.2f} creators/s, {result['timeline_pages']} timeline pages, "
+        f"{result['llm_requests']} LLM requests ({result['llm_tweets']} tweets), "
+        f"{result['prompts_created']} prompts created ({result['prompts_per_sec']:.2f}/s)"
+    )
+    print(f"  {'stage':<18}{'requests':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  status")
+    for stage, data in result['stages'].items():
+        status = ' '.join(f"{code}:{count}" for code, count in data['status'].items())
+        print(
+            f"  {stage:<18}{data['requests']:>9}{data['p50_ms']:>8.0f}ms{data['p95_ms']:>7.0f}ms"
+            f"{data['p99_ms']:>7.0f}ms{data['max_ms']:>7.0f}ms  {status}"
+        )
+
+
+def main():
+    argv = sys.argv[1:]
+    main_args = []
+    if '--' in argv:
+        index = argv.index('--')
+        argv, main_args = argv[:index], argv[index + 1:]
+
+    parser = argparse.ArgumentParser(description='End-to-end load simulation for main.py against local stand-in servers')
+    parser.add_argument('--creators', type=int, nargs='+', default=[100], help='创作者数量，可指定多个 (default: 100)')
+    parser.add_argument('--tweets-per-creator', type=int, default=40, help='每个创作者的推文数 (default: 40)')
+    parser.add_argument('--prompt-ratio', type=float, default=0.4, help='包含提示词的推文比例 (default: 0.4)')
+    parser.add_argument('--image-ratio', type=float, default=0.7, help='带图片的推文比例 (default: 0.7)')
+    parser.add_argument('--provider', choices=['claude', 'openai'], default='claude', help='LLM 接口形态 (default: claude)')
+    parser.add_argument('--rate-limit-rps', type=float, help='覆盖 twitter241 限流速率 (默认使用 Config)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='把结果写入 JSON 文件')
+    for name, latency in (('twitter', 150), ('media', 30), ('llm', 1500), ('bot', 300)):
+        parser.add_argument(f'--{name}-latency', type=float, default=latency, help=f'{name} 平均延迟，毫秒 (default: {latency})')
+        parser.add_argument(f'--{name}-429', type=float, default=0.0, help=f'{name} 返回 429 的概率')
+        parser.add_argument(f'--{name}-errors', type=float, default=0.0, help=f'{name} 返回 503 的概率')
+    parser.add_argument('--jitter', type=float, default=0.5, help='延迟的对数正态抖动 sigma (default: 0.5)')
+    args = parser.parse_args(argv)
+    args.main_args = main_args
+
+    random.seed(args.seed)
+    faults = {
+        name: Faults(
+            latency_ms=getattr(args, f'{name}_latency'),
+            jitter=args.jitter,
+            rate_429=getattr(args, f'{name}_429'),
+            error_rate=getattr(args, f'{name}_errors'),
+        )
+        for name in ('twitter', 'media', 'llm', 'bot')
+    }
+
+    results = []
+    for creators in args.creators:
+        result = run_once(creators, args, faults)
+        print_report(result)
+        results.append(result)
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+    if any(r['exit_code'] != 0 for r in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+入口脚本共用的本地组件和运行统计
+
+main.py 的顺序流程、engine.py 的并发引擎和 backfill.py 使用同一组本地组件
+（台账、预筛、去重指纹、图片预检、图片感知哈希），创建、统计收集、关闭和结束时的汇总日志都在这里，
+新增组件或统计项只需修改本文件。
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from config import Config
+from crawler import CrawlLedger, MediaValidator, ImageHashIndex, create_image_hash_index
+from ai import PromptPreFilter
+from api import DuplicateFilter
+
+logger = logging.getLogger(__name__)
+
+# main.py / backfill.py 的统计项，export_run 原样写入指标
+STAT_KEYS = (
+    'creators_processed',
+    'tweets_found',
+    'tweets_analyzed',
+    'tweets_relevant',
+    'prompts_created',
+    'duplicates_skipped',
+    'images_failed',
+    'known_tweets_skipped',
+    'prefilter_rejected',
+    'known_duplicates_skipped',
+    'media_checked',
+    'media_cache_hits',
+    'dead_media_tweets_dropped',
+    'dead_media_urls_dropped',
+    'image_hash_downloads',
+    'similar_image_tweets_dropped',
+    'similar_images_dropped',
+    'analysis_cache_hits',
+    'analysis_cache_misses',
+    'errors',
+)
+
+
+def new_stats() -> dict:
+    return dict.fromkeys(STAT_KEYS, 0)
+
+
+@dataclass
+class CrawlComponents:
+    """一次运行中各创作者共用的本地组件；未启用的组件为 None"""
+    ledger: CrawlLedger
+    prefilter: Optional[PromptPreFilter] = None
+    dedupe: Optional[DuplicateFilter] = None
+    media: Optional[MediaValidator] = None
+    image_index: Optional[ImageHashIndex] = None
+
+    @classmethod
+    def create(cls) -> 'CrawlComponents':
+        """按 Config 中的开关创建各组件"""
+        return cls(
+            ledger=CrawlLedger(),
+            prefilter=PromptPreFilter() if Config.PREFILTER_ENABLED else None,
+            dedupe=DuplicateFilter() if Config.DEDUPE_FILTER_ENABLED else None,
+            media=MediaValidator() if Config.MEDIA_CHECK_ENABLED else None,
+            image_index=create_image_hash_index(),
+        )
+
+    def kwargs(self) -> dict:
+        """作为关键字参数传给各入口的 process_creator / backfill_creator"""
+        return {
+            'ledger': self.ledger,
+            'prefilter': self.prefilter,
+            'dedupe': self.dedupe,
+            'media': self.media,
+            'image_index': self.image_index,
+        }
+
+    def collect_stats(self, stats: dict, analyzer=None):
+        """把各组件自身的计数写入 stats（运行结束、关闭组件之前调用）"""
+        stats['known_tweets_skipped'] = self.ledger.skipped
+        if self.prefilter:
+            stats['prefilter_rejected'] = self.prefilter.rejected
+        if self.dedupe:
+            stats['known_duplicates_skipped'] = self.dedupe.skipped
+        if self.media:
+            stats['media_checked'] = self.media.checked
+            stats['media_cache_hits'] = self.media.cache_hits
+            stats['dead_media_tweets_dropped'] = self.media.tweets_dropped
+            stats['dead_media_urls_dropped'] = self.media.urls_dropped
+        if self.image_index:
+            stats['image_hash_downloads'] = self.image_index.downloads
+            stats['similar_image_tweets_dropped'] = self.image_index.tweets_dropped
+            stats['similar_images_dropped'] = self.image_index.images_dropped
+        if analyzer is not None and hasattr(analyzer, 'cache'):
+            stats['analysis_cache_hits'] = analyzer.cache.hits
+            stats['analysis_cache_misses'] = analyzer.cache.misses
+
+    def close(self):
+        if self.dedupe:
+            self.dedupe.close()
+        if self.media:
+            self.media.close()
+        if self.image_index:
+            self.image_index.close()
+        self.ledger.close()
+
+    async def aclose(self):
+        """asyncio 引擎使用：额外关闭图片预检和感知哈希的 AsyncClient"""
+        if self.media:
+            await self.media.aclose()
+            self.media = None
+        if self.image_index:
+            await self.image_index.aclose()
+            self.image_index = None
+        self.close()
+
+
+def log_summary(stats: dict, title: str):
+    """输出运行结束时的统计汇总"""
+    logger.info("=" * 50)
+    logger.info(title)
+    logger.info(f"  Creators processed: {stats['creators_processed']}")
+    logger.info(f"  Tweets found: {stats['tweets_found']}")
+    logger.info(f"  Tweets analyzed: {stats['tweets_analyzed']}")
+    logger.info(f"  Relevant tweets: {stats['tweets_relevant']}")
+    logger.info(f"  Prompts created: {stats['prompts_created']}")
+    logger.info(f"  Duplicates skipped: {stats['duplicates_skipped']}")
+    logger.info(f"  Images failed: {stats['images_failed']}")
+    logger.info(f"  Known tweets skipped: {stats['known_tweets_skipped']}")
+    logger.info(f"  Pre-filter rejected (LLM calls saved): {stats['prefilter_rejected']}")
+    logger.info(f"  Known duplicates skipped: {stats['known_duplicates_skipped']}")
+    logger.info(
+        f"  Dead media: {stats['dead_media_tweets_dropped']} tweets dropped before analysis, "
+        f"{stats['dead_media_urls_dropped']} image URLs stripped "
+        f"({stats['media_checked']} checked, {stats['media_cache_hits']} cached)"
+    )
+    logger.info(
+        f"  Similar images: {stats['similar_image_tweets_dropped']} tweets dropped before analysis, "
+        f"{stats['similar_images_dropped']} images skipped ({stats['image_hash_downloads']} hashed)"
+    )
+    logger.info(f"  Analysis cache hits/misses: {stats['analysis_cache_hits']}/{stats['analysis_cache_misses']}")
+    logger.info(f"  Errors: {stats['errors']}")
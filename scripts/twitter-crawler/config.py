@@ -9,9 +9,14 @@ class Config:
     # Bot API
     BOT_API_URL = os.getenv('BOT_API_URL', 'https://admin.vibeshotclub.com')
     BOT_API_KEY = os.getenv('BOT_API_KEY', '')
+    BULK_INGEST_SIZE = int(os.getenv('BULK_INGEST_SIZE') or 20)  # 批量入库每次请求的提示词数（服务端上限 50）
+    BULK_INGEST_TIMEOUT = 300  # 批量入库请求超时（秒），服务端需处理整批图片
+    # 创作者状态更新的发送时机: creator = 每处理完一个创作者发送一次, run = 整次运行结束时发送一次
+    STATUS_FLUSH = os.getenv('STATUS_FLUSH', 'creator')
 
     # RapidAPI (Twitter154)
     RAPIDAPI_KEY = os.getenv('RAPIDAPI_KEY', '')
+    TWITTER_API_URL = os.getenv('TWITTER_API_URL') or 'https://twitter241.p.rapidapi.com'
 
     # AI Provider: claude, deepseek, openai, qwen
     AI_PROVIDER = os.getenv('AI_PROVIDER', 'claude').lower()
@@ -19,28 +24,96 @@ class Config:
     # Claude
     CLAUDE_API_KEY = os.getenv('CLAUDE_API_KEY', '')
     CLAUDE_MODEL = 'claude-sonnet-4-20250514'
+    CLAUDE_BASE_URL = os.getenv('CLAUDE_BASE_URL') or None  # None = SDK 默认地址
 
     # DeepSeek
     DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY', '')
     DEEPSEEK_MODEL = 'deepseek-chat'
-    DEEPSEEK_BASE_URL = 'https://api.deepseek.com'
+    DEEPSEEK_BASE_URL = os.getenv('DEEPSEEK_BASE_URL') or 'https://api.deepseek.com'
 
     # OpenAI
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
     OPENAI_MODEL = 'gpt-4o'
+    OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL') or None
 
     # Qwen (阿里云)
     QWEN_API_KEY = os.getenv('QWEN_API_KEY', '')
     QWEN_MODEL = 'qwen-plus'
-    QWEN_BASE_URL = 'https://dashscope.aliyuncs.com/compatible-mode/v1'
+    QWEN_BASE_URL = os.getenv('QWEN_BASE_URL') or 'https://dashscope.aliyuncs.com/compatible-mode/v1'
 
     # 爬虫配置
     MAX_TWEETS_PER_USER = 20  # 每个用户最多抓取的推文数
+    PIPELINE_QUEUE_SIZE = 50  # 流水线各阶段之间的缓冲区大小
     REQUEST_TIMEOUT = 30
-    REQUEST_DELAY = 2  # 请求间隔 (秒)
+
+    # 本地缓存目录（GitHub Actions 通过 actions/cache 在多次运行间保留）
+    CACHE_DIR = os.getenv('CRAWLER_CACHE_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+    USER_ID_CACHE_PATH = os.path.join(CACHE_DIR, 'user_ids.sqlite3')
+    USER_ID_CACHE_TTL = 30 * 24 * 3600  # username -> user_id 缓存有效期 (秒)
+    LEDGER_PATH = os.path.join(CACHE_DIR, 'ledger.sqlite3')  # 推文处理台账
+    CHECKPOINT_PATH = os.path.join(CACHE_DIR, 'backfill_checkpoint.sqlite3')  # backfill 断点
+    ANALYSIS_CACHE_ENABLED = os.getenv('ANALYSIS_CACHE', 'true').lower() != 'false'
+    ANALYSIS_CACHE_PATH = os.path.join(CACHE_DIR, 'analyses.sqlite3')
+    ANALYSIS_CACHE_MAX_ENTRIES = 50000  # AI 分析结果缓存条数上限 (LRU 淘汰)
+    DEDUPE_FILTER_ENABLED = os.getenv('DEDUPE_FILTER', 'true').lower() != 'false'  # 分析/入库前按已有提示词去重
+    FINGERPRINT_PATH = os.path.join(CACHE_DIR, 'fingerprints.sqlite3')
+
+    # AI 分析前预检图片 URL（并发 HEAD 请求，确定性结果按 URL 缓存）
+    MEDIA_CHECK_ENABLED = os.getenv('MEDIA_CHECK', 'true').lower() != 'false'
+    MEDIA_CHECK_CONCURRENCY = int(os.getenv('MEDIA_CHECK_CONCURRENCY') or 8)
+    MEDIA_CHECK_TIMEOUT = 10
+    MEDIA_CACHE_PATH = os.path.join(CACHE_DIR, 'media.sqlite3')
+    MEDIA_CACHE_TTL = 7 * 24 * 3600  # 预检结果有效期 (秒)
+    MEDIA_MAX_BYTES = 20 * 1024 * 1024  # 超过该大小的图片视为不可用
+
+    # 图片感知哈希去重（需要 Pillow；汉明距离不超过阈值的视为同一张图）
+    IMAGE_HASH_ENABLED = os.getenv('IMAGE_HASH', 'true').lower() != 'false'
+    IMAGE_HASH_PATH = os.path.join(CACHE_DIR, 'image_hashes.sqlite3')
+    IMAGE_HASH_MAX_DISTANCE = int(os.getenv('IMAGE_HASH_MAX_DISTANCE') or 6)  # 64 位 dHash
+
+    # 运行产物目录（GitHub Actions 失败时上传 scripts/twitter-crawler/logs/）
+    LOG_DIR = os.getenv('CRAWLER_LOG_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
+    # 运行结束时写出 <脚本名>.prom (Prometheus textfile) 和 <脚本名>.json 摘要
+    METRICS_DIR = os.getenv('METRICS_DIR') or LOG_DIR
+    # 日志经后台线程写出到控制台和 LOG_DIR/<脚本名>.jsonl（按大小轮转）
+    LOG_MAX_BYTES = 10 * 1024 * 1024
+    LOG_BACKUP_COUNT = 5
+    LOG_QUEUE_SIZE = 10000  # 队列满时丢弃日志，不阻塞抓取
+    # DEBUG 日志采样：同一调用位置前 N 条全部保留，之后每 M 条保留 1 条 (LOG_SAMPLE_EVERY=1 关闭采样)
+    LOG_SAMPLE_FIRST = 20
+    LOG_SAMPLE_EVERY = int(os.getenv('LOG_SAMPLE_EVERY') or 10)
+    # --profile 的默认值；开启后 CPU / 墙钟剖析和内存峰值写入 LOG_DIR
+    PROFILE_ENABLED = os.getenv('CRAWLER_PROFILE', 'false').lower() == 'true'
+    PROFILE_INTERVAL = 0.01  # 墙钟剖析采样间隔 (秒)
+
+    # HTTP 录制 / 回放: off, record = 正常请求并录制, replay = 只从录制回放、不访问网络
+    CASSETTE_MODE = os.getenv('CASSETTE_MODE', 'off').lower()
+    CASSETTE_DIR = os.getenv('CASSETTE_DIR') or os.path.join(CACHE_DIR, 'cassettes')
+
+    # twitter241 限流（令牌桶，速率会根据 x-ratelimit-* / Retry-After 响应头自动调整）
+    RATE_LIMIT_RPS = float(os.getenv('RATE_LIMIT_RPS') or 1.0)  # 初始速率 (请求/秒)
+    RATE_LIMIT_MAX_RPS = float(os.getenv('RATE_LIMIT_MAX_RPS') or 5.0)  # 速率上限
+    RATE_LIMIT_MIN_RPS = 0.05  # 速率下限
+    RATE_LIMIT_BURST = 3  # 令牌桶容量
+    RATE_LIMIT_RECOVERY_STEP = 0.1  # 每次成功响应后速率回升量
+    RATE_LIMIT_PACING_WINDOW = 3600  # 只对重置时间在该窗口内 (秒) 的配额做匀速分配
+    CRAWL_CONCURRENCY = int(os.getenv('CRAWL_CONCURRENCY') or 1)  # 同时处理的创作者数 (>1 时启用 asyncio 引擎)
+
+    # 每次 LLM 请求打包分析的推文数 (1 = 逐条分析)
+    ANALYZE_BATCH_SIZE = int(os.getenv('ANALYZE_BATCH_SIZE') or 8)
+
+    # 每个 provider 同时在途的分析请求数上限 (可用 ANALYZER_CONCURRENCY_<PROVIDER> 覆盖)
+    ANALYZER_CONCURRENCY = {
+        provider: int(os.getenv(f'ANALYZER_CONCURRENCY_{provider.upper()}') or default)
+        for provider, default in {'claude': 4, 'deepseek': 8, 'openai': 8, 'qwen': 4}.items()
+    }
 
     # AI 判断阈值
     RELEVANCE_THRESHOLD = 0.8  # 提高相关性阈值，减少误判
 
+    # AI 分析前的启发式预筛（得分低于阈值的推文不调用 LLM）
+    PREFILTER_ENABLED = os.getenv('PREFILTER', 'true').lower() != 'false'
+    PREFILTER_MIN_SCORE = 2
+
     # Debug
     DEBUG = os.getenv('DEBUG', 'false').lower() == 'true'
@@ -1,3 +1,10 @@
 from .twitter import TwitterCrawler, Tweet
+from .timeline import TimelinePage
+from .async_twitter import AsyncTwitterCrawler
+from .ledger import CrawlLedger
+from .media import MediaValidator
+from .rate_limit import QuotaExhaustedError
+from .phash import ImageHashIndex, create_image_hash_index
 
-__all__ = ['TwitterCrawler', 'Tweet']
+__all__ = ['TwitterCrawler', 'AsyncTwitterCrawler', 'Tweet', 'TimelinePage', 'CrawlLedger', 'MediaValidator',
+           'ImageHashIndex', 'create_image_hash_index', 'QuotaExhaustedError']
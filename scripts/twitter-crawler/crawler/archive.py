@@ -0,0 +1,150 @@
+"""
+原始推文归档 (history.py --save-raw / --load-raw)
+
+格式为 gzip 压缩的 JSON Lines，每行一条原始 GraphQL entry，按 timeline 顺序（新 → 旧）。
+每抓一页就以一个独立的 gzip member 追加到文件末尾，中途崩溃也只丢失最后一页；
+读取时逐行解码，内存占用与归档大小无关。旧版的整段 JSON 数组文件仍可读取。
+"""
+
+import gzip
+import json
+import logging
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+from .timeline import loads
+from .watermark import snowflake_floor, tweet_id_int
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+_GZIP_MAGIC = b'\x1f\x8b'
+
+# 不解码整行就能取到推文 ID，跳过范围外的 entry 时省去 JSON 解码
+_ENTRY_ID = re.compile(rb'"entryId":\s*"[^"]*?-(\d+)"')
+
+# 连续这么多条 entry 都早于下界时停止读取（约一页；避免被置顶的旧推文提前终止）
+_STOP_AFTER = 20
+
+
+def _dumps(entry: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(entry)
+    return json.dumps(entry, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class RawArchiveWriter:
+    """
+    逐页追加写入归档
+
+    文件名以 .jsonl 结尾时不压缩，其余（推荐 .jsonl.gz）使用 gzip。
+    append=False 时先清空已有文件。
+    """
+
+    def __init__(self, path: str, append: bool = False):
+        self.path = Path(path)
+        self.compress = self.path.suffix != '.jsonl'
+        self.count = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not append:
+            self.path.write_bytes(b'')
+
+    def append(self, entries: List[dict]):
+        if not entries:
+            return
+        data = b''.join(_dumps(entry) + b'\n' for entry in entries)
+        if self.compress:
+            # 每页一个 gzip member，写完即完整可读
+            data = gzip.compress(data, compresslevel=6)
+        with open(self.path, 'ab') as f:
+            f.write(data)
+        self.count += len(entries)
+
+    def tee(self, entries: Iterable[dict], chunk_size: int = 1000) -> Iterator[dict]:
+        """边产出 entry 边按块写入归档（用于转存已有的归档）"""
+        chunk = []
+        for entry in entries:
+            chunk.append(entry)
+            if len(chunk) >= chunk_size:
+                self.append(chunk)
+                chunk = []
+            yield entry
+        self.append(chunk)
+
+
+def _open_lines(path: Path):
+    with open(path, 'rb') as f:
+        head = f.read(2)
+    if head == _GZIP_MAGIC:
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def _legacy_entries(path: Path) -> Iterator[dict]:
+    """旧版 --save-raw 输出的 JSON 数组（需整体载入）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        yield from json.load(f)
+
+
+def _is_legacy(path: Path) -> bool:
+    with open(path, 'rb') as f:
+        head = f.read(64).lstrip()
+    return head.startswith(b'[')
+
+
+def read_raw_archive(
+    path: str,
+    max_id: Optional[str] = None,
+    since_id: Optional[str] = None,
+    since: Optional[datetime] = None
+) -> Iterator[dict]:
+    """
+    逐条读取归档中的原始 entry（生成器）
+
+    Args:
+        max_id: 只返回 ID <= max_id 的推文（从该推文开始读，跳过更新的）
+        since_id: 只返回 ID > since_id 的推文
+        since: 只返回该时间之后的推文（按 Snowflake ID 换算，不解析 created_at）
+
+    归档按新 → 旧排列，读到连续一页都早于下界时即停止。
+    """
+    path = Path(path)
+    upper = tweet_id_int(max_id) if max_id else None
+    lower = tweet_id_int(since_id) + 1 if since_id else 0
+    if since is not None:
+        lower = max(lower, snowflake_floor(since))
+
+    if _is_legacy(path):
+        lines = (_dumps(entry) for entry in _legacy_entries(path))
+    else:
+        lines = _open_lines(path)
+
+    older = 0
+    try:
+        for line in lines:
+            if not line.strip():
+                continue
+            match = _ENTRY_ID.search(line)
+            if match:
+                value = int(match.group(1))
+                if upper is not None and value > upper:
+                    continue
+                if value < lower:
+                    older += 1
+                    if older >= _STOP_AFTER:
+                        break
+                    continue
+                older = 0
+            yield loads(line)
+    except (EOFError, gzip.BadGzipFile) as e:
+        # 写入中途被中断的最后一个 member 不完整，前面的数据仍然有效
+        logger.warning(f"Raw archive truncated, stopped at last complete page: {e}")
+    finally:
+        if hasattr(lines, 'close'):
+            lines.close()
@@ -0,0 +1,95 @@
+import logging
+from typing import List, Optional
+
+import httpx
+
+import sys
+sys.path.append('..')
+from config import Config
+from metrics import stage_timer
+from .twitter import TwitterTimelineParser, api_retry
+from .timeline import TimelinePage, loads, parse_timeline
+from .rate_limit import RateLimiter, twitter241_limiter
+from .user_cache import UserIdCache
+from .cassette import async_cassette_transport
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTwitterCrawler(TwitterTimelineParser):
+    """基于 httpx.AsyncClient 的 twitter241 爬虫，供并发引擎使用"""
+
+    def __init__(
+        self,
+        rate_limiter: RateLimiter = twitter241_limiter,
+        user_id_cache: Optional[UserIdCache] = None
+    ):
+        self.client = httpx.AsyncClient(
+            timeout=Config.REQUEST_TIMEOUT,
+            headers=self._request_headers(),
+            transport=async_cassette_transport()
+        )
+        self.rate_limiter = rate_limiter
+        self.user_id_cache = user_id_cache or UserIdCache()
+
+    async def _get(self, path: str, params: dict) -> httpx.Response:
+        """经过共享限流器发出 twitter241 请求"""
+        await self.rate_limiter.acquire_async()
+        response = await self.client.get(f"{self.base_url}{path}", params=params)
+        self.rate_limiter.update_from_response(response.status_code, response.headers)
+        response.raise_for_status()
+        return response
+
+    @api_retry
+    async def _get_user_id(self, username: str) -> Optional[str]:
+        """通过 username 获取 Twitter 数字 user ID"""
+        cached = self.user_id_cache.get(username)
+        if cached:
+            return cached
+
+        response = await self._get('/user', {'username': username})
+
+        rest_id = self._extract_rest_id(response.json(), username)
+        if rest_id:
+            self.user_id_cache.set(username, rest_id)
+        return rest_id
+
+    @api_retry
+    async def fetch_timeline(self, username: str, cursor: Optional[str] = None) -> TimelinePage:
+        """获取单页 timeline，一次解析出 entries、next_cursor 和 Tweet 列表"""
+
+        user_id = await self._get_user_id(username)
+        if not user_id:
+            return TimelinePage()
+
+        with stage_timer(stage='fetch', creator=username):
+            response = await self._get('/user-tweets', self._timeline_params(user_id, cursor))
+        with stage_timer(stage='parse', creator=username):
+            page = parse_timeline(loads(response.content), username)
+
+        if not cursor and self._timeline_owner_mismatch(page, username):
+            # 缓存的 user_id 已不属于该用户名（账号改名），作废后重新解析
+            logger.warning(f"  Cached user_id for @{username} belongs to another account, re-resolving")
+            self.user_id_cache.invalidate(username)
+            user_id = await self._get_user_id(username)
+            if not user_id:
+                return TimelinePage()
+            with stage_timer(stage='fetch', creator=username):
+                response = await self._get('/user-tweets', self._timeline_params(user_id, cursor))
+            with stage_timer(stage='parse', creator=username):
+                page = parse_timeline(loads(response.content), username)
+
+        return page
+
+    async def fetch_timeline_page(
+        self,
+        username: str,
+        cursor: Optional[str] = None
+    ) -> tuple[List[dict], Optional[str]]:
+        """获取单页 timeline，返回 (原始 entry 列表, next_cursor)"""
+        page = await self.fetch_timeline(username, cursor)
+        return page.entries, page.cursor
+
+    async def aclose(self):
+        await self.client.aclose()
+        self.user_id_cache.close()
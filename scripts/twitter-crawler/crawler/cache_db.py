@@ -0,0 +1,14 @@
+import os
+import sqlite3
+
+
+def open_cache_db(path: str) -> sqlite3.Connection:
+    """
+    打开本地缓存用的 SQLite 数据库（Config.CACHE_DIR 下的各个 .sqlite3 文件）
+
+    不存在的目录自动创建；path 为 ':memory:' 时使用内存数据库。
+    连接允许跨线程使用，调用方需自行加锁串行化访问。
+    """
+    if path != ':memory:':
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return sqlite3.connect(path, check_same_thread=False)
@@ -0,0 +1,294 @@
+"""
+HTTP 录制 / 回放 (CASSETTE_MODE=record|replay)
+
+挂在 TwitterCrawler、BotApiClient、图片预检 / 感知哈希以及 AI SDK 的 httpx 客户端下面：
+record 模式照常发出请求，并把请求 / 响应写入 CASSETTE_DIR；
+replay 模式完全不访问网络，按请求内容从录制中取回响应，
+可以离线、无配额、无密钥地重复跑完整的 main.py / backfill.py（回放时使用与录制时相同的参数）。
+
+录制按内容寻址：文件名是请求 (method、URL、规范化后的 body) 的 SHA-256，
+请求头（API Key、SDK 附加的版本 / 重试头等）不参与匹配也不落盘。
+同一请求多次出现时按顺序依次回放，超出录制次数后重复最后一次。
+body 中含时间戳等易变字段的请求（如创作者状态更新）精确匹配不到时，
+退回到只按 method + URL 匹配。
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional
+
+import httpx
+
+import sys
+sys.path.append('..')
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+MODE_RECORD = 'record'
+MODE_REPLAY = 'replay'
+
+
+class CassetteMiss(httpx.TransportError):
+    """回放模式下没有对应的录制（按网络错误处理）"""
+
+
+def _canonical_body(content: bytes) -> bytes:
+    """JSON body 按 key 排序后再参与哈希，避免字段顺序不同导致匹配失败"""
+    if not content:
+        return b''
+    try:
+        return json.dumps(json.loads(content), sort_keys=True, ensure_ascii=False).encode('utf-8')
+    except (ValueError, UnicodeDecodeError):
+        return content
+
+
+def _loose_key(request: httpx.Request) -> str:
+    return f"{request.method} {request.url.copy_with(params=sorted(request.url.params.multi_items()))}"
+
+
+def request_key(request: httpx.Request) -> str:
+    digest = hashlib.sha256(_loose_key(request).encode('utf-8'))
+    digest.update(b'\n')
+    digest.update(_canonical_body(request.content))
+    return digest.hexdigest()
+
+
+class Cassette:
+    """
+    一个录制目录
+
+    每个请求一个文件 <key[:2]>/<key>.json，记录请求摘要和按顺序出现的所有响应。
+    record 模式下本次运行第一次遇到某个请求时覆盖旧的录制。
+    """
+
+    def __init__(self, path: str = Config.CASSETTE_DIR, mode: str = Config.CASSETTE_MODE):
+        self.path = path
+        self.mode = mode
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[str, dict] = {}
+        self._loose: Dict[str, List[str]] = {}
+        self._played: Dict[str, int] = {}
+        os.makedirs(path, exist_ok=True)
+        if mode == MODE_REPLAY:
+            self._load()
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], f"{key}.json")
+
+    def _load(self):
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                with open(os.path.join(root, name), 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+                key = name[:-len('.json')]
+                self._entries[key] = entry
+                self._loose.setdefault(entry['request']['match'], []).append(key)
+        logger.info(f"Cassette loaded: {len(self._entries)} recorded requests from {self.path}")
+
+    def play(self, request: httpx.Request, http=httpx) -> httpx.Response:
+        key = request_key(request)
+        with self._lock:
+            if key not in self._entries:
+                # 精确匹配不到时退回 method + URL，取最早录制的那一个
+                candidates = sorted(self._loose.get(_loose_key(request), []))
+                if not candidates:
+                    self.misses += 1
+                    raise CassetteMiss(f"No recording for {request.method} {request.url}", request=request)
+                key = candidates[0]
+            responses = self._entries[key]['responses']
+            index = self._played.get(key, 0)
+            self._played[key] = index + 1
+            self.replayed += 1
+            recorded = responses[min(index, len(responses) - 1)]
+
+        return http.Response(
+            recorded['status'],
+            headers=recorded['headers'],
+            content=base64.b64decode(recorded['body']),
+            request=request,
+        )
+
+    def record(self, request: httpx.Request, response: httpx.Response, raw: bytes):
+        key = request_key(request)
+        recorded = {
+            'status': response.status_code,
+            'headers': response.headers.multi_items(),
+            # 原始 (可能是 gzip) 字节，连同 Content-Encoding 头一起回放
+            'body': base64.b64encode(raw).decode('ascii'),
+        }
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = {
+                    'request': {'match': _loose_key(request), 'body_bytes': len(request.content)},
+                    'responses': [],
+                }
+            entry['responses'].append(recorded)
+            self.recorded += 1
+
+            path = self._file(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp, path)
+
+
+def _buffered(http, request: httpx.Request, response: httpx.Response, raw: bytes) -> httpx.Response:
+    """把已读完的原始响应重新包装，交还给客户端解码"""
+    return http.Response(
+        response.status_code,
+        headers=response.headers,
+        content=raw,
+        request=request,
+        extensions=response.extensions,
+    )
+
+
+class CassetteTransport:
+    """
+    httpx transport（不继承 httpx.BaseTransport，同一个类也可以挂在 httpx2 客户端下）
+
+    http 为构造响应所用的模块：新版 AI SDK 改用 API 相同的 httpx2，
+    其客户端拒绝 httpx 的对象
+    """
+
+    def __init__(self, cassette: Cassette, inner: Optional[httpx.BaseTransport] = None, http=httpx):
+        self.cassette = cassette
+        self.inner = inner
+        self.http = http
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        if self.cassette.mode == MODE_REPLAY:
+            return self.cassette.play(request, self.http)
+
+        response = self.inner.handle_request(request)
+        try:
+            # 直接读底层 stream：拿到未解码的原始字节，且不受响应是否已预读的影响
+            raw = b''.join(response.stream)
+        finally:
+            response.close()
+        self.cassette.record(request, response, raw)
+        return _buffered(self.http, request, response, raw)
+
+    def close(self):
+        if self.inner is not None:
+            self.inner.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AsyncCassetteTransport:
+    def __init__(self, cassette: Cassette, inner: Optional[httpx.AsyncBaseTransport] = None, http=httpx):
+        self.cassette = cassette
+        self.inner = inner
+        self.http = http
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        if self.cassette.mode == MODE_REPLAY:
+            return self.cassette.play(request, self.http)
+
+        response = await self.inner.handle_async_request(request)
+        try:
+            raw = b''.join([chunk async for chunk in response.stream])
+        finally:
+            await response.aclose()
+        self.cassette.record(request, response, raw)
+        return _buffered(self.http, request, response, raw)
+
+    async def aclose(self):
+        if self.inner is not None:
+            await self.inner.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+_cassette: Optional[Cassette] = None
+_cassette_lock = threading.Lock()
+
+
+def active_cassette() -> Optional[Cassette]:
+    """按 Config.CASSETTE_MODE 返回进程内共享的 Cassette；未启用时返回 None"""
+    global _cassette
+    if Config.CASSETTE_MODE not in (MODE_RECORD, MODE_REPLAY):
+        return None
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette(Config.CASSETTE_DIR, Config.CASSETTE_MODE)
+            logger.info(f"HTTP cassette {_cassette.mode} mode: {_cassette.path}")
+        return _cassette
+
+
+def cassette_transport(limits: Optional[httpx.Limits] = None, http=httpx) -> Optional[CassetteTransport]:
+    """
+    供 httpx.Client(transport=...) 使用；未启用时返回 None（即 httpx 默认 transport）
+
+    传入 transport 后 Client 的 limits 参数不再生效，需要在这里传入
+    """
+    cassette = active_cassette()
+    if cassette is None:
+        return None
+    inner = None
+    if cassette.mode == MODE_RECORD:
+        inner = http.HTTPTransport(limits=limits) if limits else http.HTTPTransport()
+    return CassetteTransport(cassette, inner, http)
+
+
+def async_cassette_transport(limits: Optional[httpx.Limits] = None, http=httpx) -> Optional[AsyncCassetteTransport]:
+    """cassette_transport 的 httpx.AsyncClient 版本"""
+    cassette = active_cassette()
+    if cassette is None:
+        return None
+    inner = None
+    if cassette.mode == MODE_RECORD:
+        inner = http.AsyncHTTPTransport(limits=limits) if limits else http.AsyncHTTPTransport()
+    return AsyncCassetteTransport(cassette, inner, http)
+
+
+def _sdk_http_module(client_class):
+    """SDK 默认客户端所基于的 httpx 模块（httpx 或 httpx2）"""
+    base = next(c for c in client_class.__mro__ if c.__name__ in ('Client', 'AsyncClient'))
+    return sys.modules[base.__module__.split('.')[0]]
+
+
+def sdk_http_client(sdk):
+    """
+    AI SDK (anthropic / openai 模块) 的 http_client 参数；未启用时返回 None，由 SDK 创建默认客户端
+
+    优先使用 SDK 的 DefaultHttpxClient，保留其默认超时、连接池等设置
+    """
+    client_class = getattr(sdk, 'DefaultHttpxClient', None)
+    if client_class is None:
+        transport = cassette_transport()
+        return httpx.Client(transport=transport, follow_redirects=True) if transport else None
+    transport = cassette_transport(http=_sdk_http_module(client_class))
+    return client_class(transport=transport) if transport else None
+
+
+def sdk_async_http_client(sdk):
+    client_class = getattr(sdk, 'DefaultAsyncHttpxClient', None)
+    if client_class is None:
+        transport = async_cassette_transport()
+        return httpx.AsyncClient(transport=transport, follow_redirects=True) if transport else None
+    transport = async_cassette_transport(http=_sdk_http_module(client_class))
+    return client_class(transport=transport) if transport else None
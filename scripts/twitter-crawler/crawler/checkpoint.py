@@ -0,0 +1,98 @@
+import json
+import logging
+import threading
+import time
+from typing import Optional, Tuple
+
+import sys
+sys.path.append('..')
+from config import Config
+from .cache_db import open_cache_db
+
+logger = logging.getLogger(__name__)
+
+
+class BackfillCheckpoint:
+    """
+    backfill 断点 (SQLite)
+
+    记录本次运行的参数、已完成的创作者，以及进行中创作者的下一页游标和已翻页数。
+    游标只在一页推文全部处理完后才写入（见 pipeline.Marker），每次写入立即提交，
+    进程被取消或崩溃后 --resume 从断点继续；已处理的推文由台账跳过。
+    整次运行正常结束后清空。
+    """
+
+    def __init__(self, path: str = Config.CHECKPOINT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        self._conn = open_cache_db(path)
+        self._conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS creators ('
+            ' username TEXT PRIMARY KEY,'
+            ' done INTEGER NOT NULL DEFAULT 0,'
+            ' cursor TEXT,'
+            ' pages INTEGER NOT NULL DEFAULT 0,'
+            ' updated_at REAL NOT NULL)'
+        )
+        self._conn.commit()
+
+    @property
+    def params(self) -> Optional[dict]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'params'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def start(self, params: dict, resume: bool) -> dict:
+        """resume 且存在未完成的断点时返回当时的运行参数，否则清空断点并以 params 开始新的运行"""
+        saved = self.params
+        if resume and saved:
+            done = self._conn.execute('SELECT COUNT(*) FROM creators WHERE done = 1').fetchone()[0]
+            logger.info(f"Resuming backfill from checkpoint ({done} creators already done)")
+            return saved
+        if resume:
+            logger.info("No checkpoint found, starting a new backfill")
+
+        with self._lock:
+            self._conn.execute('DELETE FROM creators')
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('params', ?)", (json.dumps(params),)
+            )
+            self._conn.commit()
+        return params
+
+    def is_done(self, username: str) -> bool:
+        row = self._conn.execute('SELECT done FROM creators WHERE username = ?', (username,)).fetchone()
+        return bool(row and row[0])
+
+    def position(self, username: str) -> Tuple[Optional[str], int]:
+        """返回 (下一页游标, 已翻页数)；未开始的创作者为 (None, 0)"""
+        row = self._conn.execute('SELECT cursor, pages FROM creators WHERE username = ?', (username,)).fetchone()
+        return (row[0], row[1]) if row else (None, 0)
+
+    def save_page(self, username: str, cursor: Optional[str], pages: int):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO creators (username, done, cursor, pages, updated_at) VALUES (?, 0, ?, ?, ?)',
+                (username, cursor, pages, time.time())
+            )
+            self._conn.commit()
+
+    def mark_done(self, username: str):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO creators (username, done, cursor, pages, updated_at) VALUES (?, 1, NULL, 0, ?)',
+                (username, time.time())
+            )
+            self._conn.commit()
+
+    def finish(self):
+        """整次运行完成，清空断点"""
+        with self._lock:
+            self._conn.execute('DELETE FROM creators')
+            self._conn.execute("DELETE FROM meta WHERE key = 'params'")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
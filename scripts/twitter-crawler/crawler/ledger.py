@@ -0,0 +1,144 @@
+import logging
+import threading
+import time
+from typing import Optional, Set
+
+import sys
+sys.path.append('..')
+from config import Config
+from .cache_db import open_cache_db
+
+logger = logging.getLogger(__name__)
+
+# 处理阶段
+STAGE_PARSE = 'parse'
+STAGE_ANALYSIS = 'analysis'
+STAGE_INGEST = 'ingest'
+
+# 处理结果
+OUTCOME_NO_IMAGES = 'no_images'
+OUTCOME_RELEVANT = 'relevant'
+OUTCOME_IRRELEVANT = 'irrelevant'
+OUTCOME_AMBIGUOUS = 'ambiguous'
+OUTCOME_ANALYSIS_FAILED = 'analysis_failed'
+OUTCOME_CREATED = 'created'
+OUTCOME_DUPLICATE = 'duplicate'
+OUTCOME_IMAGES_FAILED = 'images_failed'
+OUTCOME_ERROR = 'error'
+
+# 已有最终结论的推文，后续运行直接跳过；失败/出错的推文下次仍会重试
+SETTLED_OUTCOMES = {
+    OUTCOME_NO_IMAGES,
+    OUTCOME_IRRELEVANT,
+    OUTCOME_AMBIGUOUS,
+    OUTCOME_CREATED,
+    OUTCOME_DUPLICATE,
+    OUTCOME_IMAGES_FAILED,
+    'previously_failed',
+}
+
+
+def analysis_outcome(analysis, relevant: bool) -> str:
+    """根据 PromptAnalysis 推导分析阶段结果"""
+    if relevant:
+        return OUTCOME_RELEVANT
+    if analysis.reason.startswith('分析失败'):
+        return OUTCOME_ANALYSIS_FAILED
+    return OUTCOME_IRRELEVANT
+
+
+def ingest_outcome(result) -> str:
+    """根据 CreatePromptResult 推导入库阶段结果"""
+    if result.success:
+        return OUTCOME_CREATED
+    if result.skipped:
+        return result.reason or OUTCOME_DUPLICATE
+    return OUTCOME_IMAGES_FAILED
+
+
+class CrawlLedger:
+    """
+    本地推文处理台账 (SQLite)，按 tweet_id 记录解析/分析/入库结果
+
+    启动时把已有结论的 tweet_id 全部载入内存 set，`tweet_id in ledger` 为 O(1)，
+    在抓取后、AI 分析和入库之前就能跳过已处理过的推文。
+    写入先缓冲在内存中，定期批量提交。
+    """
+
+    def __init__(self, path: str = Config.LEDGER_PATH, flush_every: int = 200):
+        self.path = path
+        self.flush_every = flush_every
+        self.skipped = 0  # 本次运行因已处理而跳过的推文数
+        self._pending: list = []
+        self._lock = threading.Lock()
+
+        self._conn = open_cache_db(path)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS tweets ('
+            ' tweet_id TEXT PRIMARY KEY,'
+            ' username TEXT,'
+            ' stage TEXT NOT NULL,'
+            ' outcome TEXT NOT NULL,'
+            ' detail TEXT,'
+            ' updated_at REAL NOT NULL)'
+        )
+        self._conn.commit()
+
+        placeholders = ','.join('?' * len(SETTLED_OUTCOMES))
+        self._settled: Set[str] = {
+            row[0] for row in self._conn.execute(
+                f'SELECT tweet_id FROM tweets WHERE outcome IN ({placeholders})',
+                tuple(SETTLED_OUTCOMES)
+            )
+        }
+        logger.debug(f"Crawl ledger loaded: {len(self._settled)} settled tweets")
+
+    def __contains__(self, tweet_id: str) -> bool:
+        return tweet_id in self._settled
+
+    def __len__(self) -> int:
+        return len(self._settled)
+
+    def should_skip(self, tweet_id: str) -> bool:
+        """已处理过的推文返回 True，并计入 skipped"""
+        if tweet_id in self._settled:
+            self.skipped += 1
+            return True
+        return False
+
+    def record(
+        self,
+        tweet_id: str,
+        stage: str,
+        outcome: str,
+        username: Optional[str] = None,
+        detail: Optional[str] = None
+    ):
+        with self._lock:
+            if outcome in SETTLED_OUTCOMES:
+                self._settled.add(tweet_id)
+            else:
+                self._settled.discard(tweet_id)
+            self._pending.append((tweet_id, username, stage, outcome, detail, time.time()))
+            if len(self._pending) >= self.flush_every:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO tweets (tweet_id, username, stage, outcome, detail, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            self._pending
+        )
+        self._conn.commit()
+        self._pending.clear()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self._conn.close()
@@ -0,0 +1,242 @@
+import asyncio
+import dataclasses
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+import sys
+sys.path.append('..')
+from config import Config
+from .timeline import Tweet
+from .cache_db import open_cache_db
+from .cassette import cassette_transport, async_cassette_transport
+
+logger = logging.getLogger(__name__)
+
+# 与服务端下载图片时使用的 UA 保持一致
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# 媒体已被删除/不可访问，可以放心丢弃
+_DEAD_STATUS = {401, 403, 404, 410}
+# 不支持 HEAD 时改用 Range GET
+_HEAD_UNSUPPORTED = {405, 501}
+
+
+@dataclass
+class MediaCheck:
+    url: str
+    ok: bool
+    reason: str = 'ok'
+    size: Optional[int] = None
+    # 超时/限流/5xx 等临时错误：按可用处理且不缓存，交给服务端下载时再判断
+    transient: bool = False
+
+
+def _content_size(response: httpx.Response) -> Optional[int]:
+    """HEAD 取 Content-Length；Range 请求取 Content-Range 中的总长度"""
+    content_range = response.headers.get('content-range', '')
+    if '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        if total.isdigit():
+            return int(total)
+    length = response.headers.get('content-length')
+    if length and length.isdigit() and response.status_code != 206:
+        return int(length)
+    return None
+
+
+def classify_response(url: str, response: httpx.Response) -> MediaCheck:
+    """根据状态码、Content-Type 和大小判断图片是否可用（与 /api/bot/prompts 的下载校验一致）"""
+    status = response.status_code
+    if status in _DEAD_STATUS:
+        return MediaCheck(url, False, f'http_{status}')
+    if status not in (200, 206):
+        return MediaCheck(url, True, f'http_{status}', transient=True)
+
+    content_type = response.headers.get('content-type', '')
+    if not content_type.startswith('image/'):
+        return MediaCheck(url, False, f'content_type:{content_type or "missing"}')
+
+    size = _content_size(response)
+    if size == 0:
+        return MediaCheck(url, False, 'empty', size)
+    if size is not None and size > Config.MEDIA_MAX_BYTES:
+        return MediaCheck(url, False, 'too_large', size)
+    return MediaCheck(url, True, 'ok', size)
+
+
+class MediaValidator:
+    """
+    图片 URL 预检
+
+    在 AI 分析前并发发送 HEAD 请求（不支持时用 Range GET 只取 1 字节），
+    丢弃已删除、非图片或过大的媒体。全部图片失效的推文不再分析和入库，
+    避免 LLM 调用后才由 /api/bot/prompts 返回 "All images failed"。
+    确定性结果按 URL 缓存在 SQLite 中，临时错误不缓存。
+    """
+
+    def __init__(
+        self,
+        path: str = Config.MEDIA_CACHE_PATH,
+        concurrency: int = Config.MEDIA_CHECK_CONCURRENCY,
+        ttl: int = Config.MEDIA_CACHE_TTL
+    ):
+        self.path = path
+        self.concurrency = max(1, concurrency)
+        self.ttl = ttl
+        self.checked = 0
+        self.cache_hits = 0
+        self.dead_urls = 0
+        self.tweets_dropped = 0
+        self.urls_dropped = 0
+        self._lock = threading.Lock()
+        self._client: Optional[httpx.Client] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+
+        self._conn = open_cache_db(path)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS media_checks ('
+            ' url TEXT PRIMARY KEY,'
+            ' ok INTEGER NOT NULL,'
+            ' reason TEXT NOT NULL,'
+            ' size INTEGER,'
+            ' checked_at REAL NOT NULL)'
+        )
+        self._conn.commit()
+
+    def _cached(self, urls: Iterable[str]) -> Dict[str, MediaCheck]:
+        found = {}
+        expires = time.time() - self.ttl
+        with self._lock:
+            for url in urls:
+                row = self._conn.execute(
+                    'SELECT ok, reason, size FROM media_checks WHERE url = ? AND checked_at > ?',
+                    (url, expires)
+                ).fetchone()
+                if row:
+                    found[url] = MediaCheck(url, bool(row[0]), row[1], row[2])
+            self.cache_hits += len(found)
+        return found
+
+    def _store(self, checks: List[MediaCheck]):
+        rows = [(c.url, int(c.ok), c.reason, c.size, time.time()) for c in checks if not c.transient]
+        with self._lock:
+            self.checked += len(checks)
+            self.dead_urls += sum(1 for c in checks if not c.ok)
+            if rows:
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO media_checks (url, ok, reason, size, checked_at) VALUES (?, ?, ?, ?, ?)',
+                    rows
+                )
+                self._conn.commit()
+
+    def _probe(self, url: str) -> MediaCheck:
+        try:
+            response = self._client.head(url)
+            if response.status_code in _HEAD_UNSUPPORTED:
+                # 只读响应头，服务端忽略 Range 时也不会下载整张图
+                with self._client.stream('GET', url, headers={'Range': 'bytes=0-0'}) as response:
+                    return classify_response(url, response)
+            return classify_response(url, response)
+        except httpx.HTTPError as e:
+            return MediaCheck(url, True, f'error:{type(e).__name__}', transient=True)
+
+    async def _probe_async(self, url: str, semaphore: asyncio.Semaphore) -> MediaCheck:
+        async with semaphore:
+            try:
+                response = await self._async_client.head(url)
+                if response.status_code in _HEAD_UNSUPPORTED:
+                    async with self._async_client.stream('GET', url, headers={'Range': 'bytes=0-0'}) as response:
+                        return classify_response(url, response)
+                return classify_response(url, response)
+            except httpx.HTTPError as e:
+                return MediaCheck(url, True, f'error:{type(e).__name__}', transient=True)
+
+    def check_urls(self, urls: Iterable[str]) -> Dict[str, MediaCheck]:
+        """并发检查一组 URL（先查缓存）"""
+        urls = list(dict.fromkeys(urls))
+        results = self._cached(urls)
+        missing = [url for url in urls if url not in results]
+        if missing:
+            with self._lock:
+                if self._client is None:
+                    limits = httpx.Limits(max_connections=self.concurrency)
+                    self._client = httpx.Client(
+                        timeout=Config.MEDIA_CHECK_TIMEOUT,
+                        headers={'User-Agent': USER_AGENT},
+                        follow_redirects=True,
+                        limits=limits,
+                        transport=cassette_transport(limits)
+                    )
+                    self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='media-check')
+            checks = list(self._executor.map(self._probe, missing))
+            self._store(checks)
+            results.update((c.url, c) for c in checks)
+        return results
+
+    async def check_urls_async(self, urls: Iterable[str]) -> Dict[str, MediaCheck]:
+        """check_urls 的异步版本（asyncio 引擎使用）"""
+        urls = list(dict.fromkeys(urls))
+        results = self._cached(urls)
+        missing = [url for url in urls if url not in results]
+        if missing:
+            if self._async_client is None:
+                limits = httpx.Limits(max_connections=self.concurrency)
+                self._async_client = httpx.AsyncClient(
+                    timeout=Config.MEDIA_CHECK_TIMEOUT,
+                    headers={'User-Agent': USER_AGENT},
+                    follow_redirects=True,
+                    limits=limits,
+                    transport=async_cassette_transport(limits)
+                )
+            semaphore = asyncio.Semaphore(self.concurrency)
+            checks = await asyncio.gather(*(self._probe_async(url, semaphore) for url in missing))
+            self._store(checks)
+            results.update((c.url, c) for c in checks)
+        return results
+
+    def _apply(self, tweets: List[Tweet], results: Dict[str, MediaCheck]) -> Tuple[List[Tweet], List[Tweet]]:
+        live, dead = [], []
+        for tweet in tweets:
+            urls = [url for url in tweet.image_urls if results[url].ok]
+            if not urls:
+                dead.append(tweet)
+                continue
+            if len(urls) < len(tweet.image_urls):
+                tweet = dataclasses.replace(tweet, image_urls=urls)
+            live.append(tweet)
+
+        with self._lock:
+            self.tweets_dropped += len(dead)
+            self.urls_dropped += sum(
+                sum(1 for url in tweet.image_urls if not results[url].ok) for tweet in tweets
+            )
+        return live, dead
+
+    def filter_tweets(self, tweets: List[Tweet]) -> Tuple[List[Tweet], List[Tweet]]:
+        """返回 (仍有可用图片的推文, 图片全部失效的推文)；前者只保留可用的图片 URL"""
+        results = self.check_urls(url for tweet in tweets for url in tweet.image_urls)
+        return self._apply(tweets, results)
+
+    async def filter_tweets_async(self, tweets: List[Tweet]) -> Tuple[List[Tweet], List[Tweet]]:
+        results = await self.check_urls_async(url for tweet in tweets for url in tweet.image_urls)
+        return self._apply(tweets, results)
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=False)
+        if self._client:
+            self._client.close()
+        with self._lock:
+            self._conn.close()
+
+    async def aclose(self):
+        if self._async_client:
+            await self._async_client.aclose()
+        self.close()
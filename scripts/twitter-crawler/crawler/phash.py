@@ -0,0 +1,299 @@
+"""
+图片感知哈希去重
+
+同一张图被不同创作者配上不同文案转发时，prompt_text 去重拦不住，
+服务端会再次下载、压缩并上传到 R2。这里对每张推文图片计算 64 位 dHash，
+在已入库图片的本地索引（BK 树，按汉明距离查最近邻）中查找近似图片，
+在 AI 分析和上传之前就丢弃。
+
+需要 Pillow（可选依赖），未安装时该阶段自动关闭。
+"""
+
+import asyncio
+import dataclasses
+import io
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+import sys
+sys.path.append('..')
+from config import Config
+from .timeline import Tweet
+from .cache_db import open_cache_db
+from .media import USER_AGENT
+from .cassette import cassette_transport, async_cassette_transport
+
+try:
+    from PIL import Image
+except ImportError:  # 可选依赖
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+_SIGN_BIT = 1 << (HASH_BITS - 1)
+
+
+def phash_available() -> bool:
+    return Image is not None
+
+
+def dhash(image_bytes: bytes) -> int:
+    """64 位差异哈希：缩放到 9x8 灰度图，逐行比较相邻像素的亮度"""
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        image.draft('L', (36, 32))  # JPEG 解码时直接降采样，省去全尺寸解码
+        pixels = list(image.convert('L').resize((9, 8), Image.LANCZOS).getdata())
+
+    value = 0
+    for row in range(8):
+        offset = row * 9
+        for col in range(8):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def thumbnail_url(image_url: str) -> str:
+    """pbs.twimg.com 的小尺寸版本足够算哈希，下载量约为 large 的 1/20"""
+    if 'pbs.twimg.com' in image_url and 'name=' in image_url:
+        base, _, query = image_url.partition('?')
+        params = [p for p in query.split('&') if not p.startswith('name=')]
+        return f"{base}?{'&'.join(params + ['name=small'])}"
+    return image_url
+
+
+def _to_sqlite(value: int) -> int:
+    return value - (1 << HASH_BITS) if value & _SIGN_BIT else value
+
+
+def _from_sqlite(value: int) -> int:
+    return value + (1 << HASH_BITS) if value < 0 else value
+
+
+class BKTree:
+    """
+    按汉明距离组织的 BK 树
+
+    每个子节点以与父节点的距离为 key，查询半径 r 内的邻居时
+    只需进入距离在 [d - r, d + r] 内的子树。
+    """
+
+    def __init__(self):
+        self._root: Optional[list] = None  # [hash, tweet_id, {distance: child}]
+        self._size = 0
+
+    def add(self, value: int, tweet_id: str):
+        if self._root is None:
+            self._root = [value, tweet_id, {}]
+            self._size = 1
+            return
+        node = self._root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, tweet_id, {}]
+                self._size += 1
+                return
+            node = child
+
+    def nearest(self, value: int, max_distance: int) -> Optional[Tuple[int, str]]:
+        """返回距离不超过 max_distance 的最近邻 (distance, tweet_id)"""
+        if self._root is None:
+            return None
+        best = None
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance and (best is None or distance < best[0]):
+                best = (distance, node[1])
+                if distance == 0:
+                    break
+            low, high = distance - max_distance, distance + max_distance
+            stack.extend(child for d, child in node[2].items() if low <= d <= high)
+        return best
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class ImageHashIndex:
+    """
+    已入库图片的感知哈希索引 (SQLite 持久化，内存中为 BK 树)
+
+    filter_tweets 下载每张图片的小图并计算 dHash：与索引中已有图片
+    汉明距离 <= max_distance 的视为同一张图，从推文中剔除；
+    全部图片都已存在的推文直接丢弃。算出的哈希先暂存，
+    推文入库成功（或服务端判定重复）后由 add 写入索引。
+    """
+
+    def __init__(
+        self,
+        path: str = Config.IMAGE_HASH_PATH,
+        max_distance: int = Config.IMAGE_HASH_MAX_DISTANCE,
+        concurrency: int = Config.MEDIA_CHECK_CONCURRENCY
+    ):
+        self.path = path
+        self.max_distance = max_distance
+        self.concurrency = max(1, concurrency)
+        self.downloads = 0
+        self.tweets_dropped = 0
+        self.images_dropped = 0
+        self._tree = BKTree()
+        self._pending: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+        self._client: Optional[httpx.Client] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+
+        self._conn = open_cache_db(path)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS image_hashes ('
+            ' hash INTEGER PRIMARY KEY,'
+            ' tweet_id TEXT NOT NULL,'
+            ' created_at REAL NOT NULL)'
+        )
+        self._conn.commit()
+        for value, tweet_id in self._conn.execute('SELECT hash, tweet_id FROM image_hashes'):
+            self._tree.add(_from_sqlite(value), tweet_id)
+        logger.debug(f"Image hash index loaded: {len(self._tree)} images")
+
+    def _hash_url(self, url: str) -> Optional[int]:
+        try:
+            response = self._client.get(thumbnail_url(url))
+            response.raise_for_status()
+            return dhash(response.content)
+        except Exception as e:
+            logger.debug("  Image hash failed for %s: %s", url, e)
+            return None
+
+    async def _hash_url_async(self, url: str, semaphore: asyncio.Semaphore) -> Optional[int]:
+        async with semaphore:
+            try:
+                response = await self._async_client.get(thumbnail_url(url))
+                response.raise_for_status()
+                content = response.content
+            except Exception as e:
+                logger.debug("  Image hash failed for %s: %s", url, e)
+                return None
+        try:
+            return await asyncio.to_thread(dhash, content)
+        except Exception as e:
+            logger.debug("  Image hash failed for %s: %s", url, e)
+            return None
+
+    def _http_options(self) -> dict:
+        return {
+            'timeout': Config.MEDIA_CHECK_TIMEOUT,
+            'headers': {'User-Agent': USER_AGENT},
+            'follow_redirects': True,
+            'limits': self._limits(),
+        }
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(max_connections=self.concurrency)
+
+    def _apply(self, tweets: List[Tweet], hashes: Dict[str, Optional[int]]) -> Tuple[List[Tweet], List[Tuple[Tweet, str]]]:
+        live, dropped = [], []
+        with self._lock:
+            self.downloads += len(hashes)
+            for tweet in tweets:
+                kept_urls, kept_hashes, match = [], [], None
+                for url in tweet.image_urls:
+                    value = hashes.get(url)
+                    # 下载或解码失败的图片保留，交给服务端处理
+                    found = self._tree.nearest(value, self.max_distance) if value is not None else None
+                    if found:
+                        match = found[1]
+                        continue
+                    kept_urls.append(url)
+                    if value is not None:
+                        kept_hashes.append(value)
+
+                self.images_dropped += len(tweet.image_urls) - len(kept_urls)
+                if not kept_urls:
+                    self.tweets_dropped += 1
+                    dropped.append((tweet, match))
+                    continue
+                if len(kept_urls) < len(tweet.image_urls):
+                    tweet = dataclasses.replace(tweet, image_urls=kept_urls)
+                self._pending[tweet.id] = kept_hashes
+                live.append(tweet)
+        return live, dropped
+
+    def filter_tweets(self, tweets: List[Tweet]) -> Tuple[List[Tweet], List[Tuple[Tweet, str]]]:
+        """返回 (剔除已有图片后的推文, [(图片全部已存在的推文, 匹配到的已入库推文 ID)])"""
+        urls = list(dict.fromkeys(url for tweet in tweets for url in tweet.image_urls))
+        if not urls:
+            return tweets, []
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(**self._http_options(), transport=cassette_transport(self._limits()))
+                self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='image-hash')
+        hashes = dict(zip(urls, self._executor.map(self._hash_url, urls)))
+        return self._apply(tweets, hashes)
+
+    async def filter_tweets_async(self, tweets: List[Tweet]) -> Tuple[List[Tweet], List[Tuple[Tweet, str]]]:
+        urls = list(dict.fromkeys(url for tweet in tweets for url in tweet.image_urls))
+        if not urls:
+            return tweets, []
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                **self._http_options(), transport=async_cassette_transport(self._limits())
+            )
+        semaphore = asyncio.Semaphore(self.concurrency)
+        values = await asyncio.gather(*(self._hash_url_async(url, semaphore) for url in urls))
+        return self._apply(tweets, dict(zip(urls, values)))
+
+    def add(self, tweet_id: str):
+        """推文入库后，把暂存的图片哈希写入索引"""
+        with self._lock:
+            values = self._pending.pop(tweet_id, [])
+            for value in values:
+                self._tree.add(value, tweet_id)
+            if values:
+                now = time.time()
+                self._conn.executemany(
+                    'INSERT OR IGNORE INTO image_hashes (hash, tweet_id, created_at) VALUES (?, ?, ?)',
+                    [(_to_sqlite(value), tweet_id, now) for value in values]
+                )
+                self._conn.commit()
+
+    def discard(self, tweet_id: str):
+        """推文最终没有入库（无关、模糊、去重跳过、入库失败等）时丢弃暂存的图片哈希"""
+        with self._lock:
+            self._pending.pop(tweet_id, None)
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=False)
+        if self._client:
+            self._client.close()
+        with self._lock:
+            self._conn.close()
+
+    async def aclose(self):
+        if self._async_client:
+            await self._async_client.aclose()
+        self.close()
+
+
+def create_image_hash_index() -> Optional[ImageHashIndex]:
+    """按配置创建索引；未启用或未安装 Pillow 时返回 None"""
+    if not Config.IMAGE_HASH_ENABLED:
+        return None
+    if not phash_available():
+        logger.warning("Pillow is not installed, image hash dedupe disabled")
+        return None
+    return ImageHashIndex()
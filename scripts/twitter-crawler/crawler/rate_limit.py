@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Optional
+
+import sys
+sys.path.append('..')
+from config import Config
+from metrics import RATE_LIMIT_WAIT
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After（秒数或 HTTP 日期），返回需要等待的秒数"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class QuotaExhaustedError(Exception):
+    """配额已用完且要等到 RATE_LIMIT_PACING_WINDOW 之后才重置（如 RapidAPI 按月配额），本次运行无法继续抓取"""
+
+
+class RateLimiter:
+    """
+    令牌桶限流器，线程和 asyncio task 均可安全使用
+
+    取令牌时在锁内"预约"一个时间片并计算需要等待的时长，
+    锁外再用 time.sleep / asyncio.sleep 等待，因此不会阻塞事件循环里的其他任务。
+    速率根据 RapidAPI 返回的 x-ratelimit-* / Retry-After 头动态调整:
+    短窗口配额按 remaining / reset 均匀分配，429 时速率减半，正常响应时逐步回升到上限。
+    需要等待超过 RATE_LIMIT_PACING_WINDOW 的配额耗尽不再 sleep，之后的 acquire() 抛出 QuotaExhaustedError，
+    由入口脚本停止抓取。
+    """
+
+    def __init__(
+        self,
+        rate: float = Config.RATE_LIMIT_RPS,
+        burst: int = Config.RATE_LIMIT_BURST,
+        max_rate: float = Config.RATE_LIMIT_MAX_RPS,
+        min_rate: float = Config.RATE_LIMIT_MIN_RPS,
+    ):
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.rate = min(max(rate, min_rate), max_rate)
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        # 由短窗口配额推算出的速率上限
+        self._quota_rate: Optional[float] = None
+        # 长周期配额耗尽的原因，设置后不再发出请求
+        self._exhausted: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated_at
+        if elapsed > 0:
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+            self._updated_at = now
+
+    def _reserve(self) -> float:
+        """预约一个令牌，返回调用方需要等待的秒数"""
+        with self._lock:
+            if self._exhausted is not None:
+                raise QuotaExhaustedError(self._exhausted)
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._blocked_until - now)
+
+    def acquire(self):
+        """阻塞直到可以发出下一个请求（同步调用方使用）"""
+        wait = self._reserve()
+        RATE_LIMIT_WAIT.observe(wait)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """等待直到可以发出下一个请求（asyncio 调用方使用）"""
+        wait = self._reserve()
+        RATE_LIMIT_WAIT.observe(wait)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def _set_rate(self, rate: float):
+        ceiling = self.max_rate if self._quota_rate is None else min(self.max_rate, self._quota_rate)
+        self.rate = min(max(rate, self.min_rate), max(ceiling, self.min_rate))
+
+    def _block_for(self, now: float, seconds: float):
+        self._blocked_until = max(self._blocked_until, now + seconds)
+        self._tokens = min(self._tokens, 0.0)
+        self._updated_at = now
+
+    def update_from_response(self, status_code: int, headers: Mapping[str, str]):
+        """
+        根据响应状态码和限流头调整速率
+
+        需要等待超过 RATE_LIMIT_PACING_WINDOW 才能恢复时标记为配额耗尽：
+        本次响应为 429 时立即抛出 QuotaExhaustedError，否则（本次请求已成功）由下一次 acquire() 抛出。
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            exhausted = None
+
+            retry_after = _parse_retry_after(headers.get('retry-after'))
+            if retry_after is not None:
+                if retry_after > Config.RATE_LIMIT_PACING_WINDOW:
+                    exhausted = f"retry-after is {retry_after:.0f}s"
+                else:
+                    self._block_for(now, retry_after)
+
+            # RapidAPI 会为每个配额维度返回一组 x-ratelimit-<name>-remaining / -reset
+            quota_rate = None
+            for key, value in headers.items():
+                key = key.lower()
+                if not (key.startswith('x-ratelimit-') and key.endswith('-remaining')):
+                    continue
+                reset_value = headers.get(key[:-len('remaining')] + 'reset')
+                try:
+                    remaining = float(value)
+                    reset = float(reset_value) if reset_value is not None else None
+                except ValueError:
+                    continue
+
+                if remaining <= 0:
+                    wait = reset if reset is not None else 1.0 / self.rate
+                    if wait > Config.RATE_LIMIT_PACING_WINDOW:
+                        exhausted = f"{key} is 0, resets in {wait:.0f}s"
+                        continue
+                    logger.warning(f"Rate limit quota exhausted ({key}), pausing {wait:.1f}s")
+                    self._block_for(now, wait)
+                elif reset and reset <= Config.RATE_LIMIT_PACING_WINDOW:
+                    # 短窗口配额: 把剩余请求数均匀摊到窗口内
+                    window_rate = remaining / reset
+                    quota_rate = window_rate if quota_rate is None else min(quota_rate, window_rate)
+
+            self._quota_rate = quota_rate
+
+            if status_code == 429:
+                if retry_after is None:
+                    self._block_for(now, 1.0 / self.rate)
+                self._set_rate(self.rate / 2)
+                logger.warning(f"Rate limited (429), lowering rate to {self.rate:.2f} req/s")
+            else:
+                # 加性回升，直到配额允许的最高速率
+                self._set_rate(self.rate + Config.RATE_LIMIT_RECOVERY_STEP)
+
+            if exhausted is not None:
+                if self._exhausted is None:
+                    logger.error(f"Rate limit quota exhausted until after this run ({exhausted}), stopping requests")
+                self._exhausted = exhausted
+                if status_code == 429:
+                    raise QuotaExhaustedError(exhausted)
+
+
+# 所有 twitter241 请求共享同一个限流器（同步爬虫、异步引擎和多线程调用方共用）
+twitter241_limiter = RateLimiter()
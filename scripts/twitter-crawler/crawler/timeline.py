@@ -0,0 +1,229 @@
+"""
+twitter241 timeline 响应的单遍解析
+
+只遍历一次 instructions，同时得到 tweet entries、bottom cursor、解析好的 Tweet 和 timeline 作者，
+结果与 TwitterTimelineParser 的 _extract_entries / _extract_cursor / _parse_tweet 一致。
+安装了 orjson 时用它解码响应，否则回退到标准库 json。
+"""
+
+import json
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # 可选依赖
+    orjson = None
+    _loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+_MONTHS = {
+    'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
+    'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12,
+}
+_ENTRY_LOOKUP_ERRORS = (KeyError, TypeError, AttributeError)
+
+
+@dataclass
+class Tweet:
+    id: str
+    username: str
+    text: str
+    image_urls: List[str]
+    created_at: datetime
+    url: str
+
+
+@dataclass
+class TimelinePage:
+    entries: List[dict] = field(default_factory=list)  # 原始 tweet entry（history.py 保存用）
+    cursor: Optional[str] = None
+    tweets: List[Tweet] = field(default_factory=list)  # 与 entries 同序，跳过无法解析的和转推
+    owner: Optional[str] = None  # 第一条推文的作者 screen_name
+
+
+def loads(content):
+    """解码 JSON 响应体（bytes 或 str）"""
+    return _loads(content)
+
+
+def parse_twitter_date(value: str) -> datetime:
+    """解析 'Wed Oct 10 20:19:24 +0000 2018' 格式的时间，比 strptime 快一个数量级"""
+    try:
+        _, month, day, clock, offset, year = value.split(' ')
+        hour, minute, second = clock.split(':')
+        if offset == '+0000':
+            tz = timezone.utc
+        else:
+            minutes = int(offset[1:3]) * 60 + int(offset[3:5])
+            tz = timezone(timedelta(minutes=-minutes if offset[0] == '-' else minutes))
+        return datetime(int(year), _MONTHS[month], int(day), int(hour), int(minute), int(second), tzinfo=tz)
+    except (ValueError, KeyError, IndexError):
+        return datetime.strptime(value, '%a %b %d %H:%M:%S %z %Y')
+
+
+def _tweet_result(entry: dict) -> Optional[dict]:
+    """按 entry > content > itemContent / entry / entry > item 三种结构取 tweet_results.result"""
+    try:
+        result = entry['content']['itemContent']['tweet_results']['result']
+    except _ENTRY_LOOKUP_ERRORS:
+        result = None
+    if result:
+        if result.get('__typename') == 'TweetWithVisibilityResults':
+            result = result.get('tweet', {})
+        return result if result.get('legacy') else None
+
+    for path in (('tweet_results',), ('item', 'itemContent', 'tweet_results')):
+        try:
+            node = entry
+            for key in path:
+                node = node[key]
+            result = node['result']
+        except _ENTRY_LOOKUP_ERRORS:
+            continue
+        if result:
+            return result if result.get('legacy') else None
+    return None
+
+
+def _screen_name(tweet_result: dict) -> Optional[str]:
+    try:
+        return tweet_result['core']['user_results']['result']['legacy'].get('screen_name')
+    except _ENTRY_LOOKUP_ERRORS:
+        return None
+
+
+def _build_tweet(tweet_result: dict, screen_name: Optional[str], username: str) -> Optional[Tweet]:
+    legacy = tweet_result.get('legacy')
+    if not legacy:
+        return None
+
+    tweet_id = legacy.get('id_str') or str(tweet_result.get('rest_id', ''))
+    if not tweet_id:
+        return None
+
+    # 跳过转推
+    if legacy.get('retweeted_status_result'):
+        return None
+
+    # 优先使用 note_tweet（长推文完整内容）
+    text = ''
+    note = tweet_result.get('note_tweet')
+    if note:
+        try:
+            text = note['note_tweet_results']['result']['text'] or ''
+        except _ENTRY_LOOKUP_ERRORS:
+            text = ''
+        if not text and isinstance(note, dict):
+            text = note.get('text') or ''
+    if not text:
+        text = legacy.get('full_text', '') or legacy.get('text', '')
+
+    image_urls = []
+    entities = legacy.get('extended_entities') or legacy.get('entities') or {}
+    for media in entities.get('media', ()):
+        if media.get('type') == 'photo':
+            media_url = media.get('media_url_https')
+            if media_url:
+                image_urls.append(f"{media_url}?format=jpg&name=large")
+
+    created_at = None
+    creation_date = legacy.get('created_at')
+    if creation_date:
+        try:
+            created_at = parse_twitter_date(creation_date)
+        except Exception:
+            pass
+
+    if screen_name is None:
+        screen_name = username
+
+    return Tweet(
+        id=tweet_id,
+        username=screen_name,
+        text=text,
+        image_urls=image_urls,
+        created_at=created_at or datetime.now(),
+        url=f"https://twitter.com/{screen_name}/status/{tweet_id}"
+    )
+
+
+def parse_entry(entry: dict, username: str) -> Optional[Tweet]:
+    """解析单条 entry（如 history.py 保存的原始数据）"""
+    try:
+        tweet_result = _tweet_result(entry)
+        if not tweet_result:
+            return None
+        return _build_tweet(tweet_result, _screen_name(tweet_result), username)
+    except Exception as e:
+        logger.debug("Error parsing tweet: %s", e)
+        return None
+
+
+def entry_tweet_id(entry: dict) -> Optional[str]:
+    """从 entryId（如 'tweet-1850000000000000000'）取推文 ID，不解析整条 entry"""
+    tail = entry.get('entryId', '').rpartition('-')[2]
+    return tail if tail.isdigit() else None
+
+
+def _is_tweet_entry(entry: dict) -> bool:
+    entry_id = entry.get('entryId', '').lower()
+    return 'tweet' in entry_id or 'pin' in entry_id
+
+
+def parse_timeline(data: dict, username: str) -> TimelinePage:
+    """单遍解析 timeline 响应"""
+    page = TimelinePage()
+    cursor_entry = None
+
+    try:
+        timeline = data.get('result', {}).get('timeline', {})
+        page.cursor = timeline.get('cursor', {}).get('bottom')
+
+        for instruction in timeline.get('instructions', []):
+            if instruction.get('type') != 'TimelineAddEntries':
+                continue
+            for entry in instruction.get('entries', []):
+                if _is_tweet_entry(entry):
+                    page.entries.append(entry)
+                elif cursor_entry is None and 'cursor-bottom' in entry.get('entryId', ''):
+                    cursor_entry = entry
+
+        # 备选路径: data > timeline > instructions
+        fallback = data.get('timeline', {})
+        if not page.entries:
+            for instruction in fallback.get('instructions', []):
+                for entry in instruction.get('entries', []):
+                    if _is_tweet_entry(entry):
+                        page.entries.append(entry)
+
+        if not page.cursor:
+            if cursor_entry is not None:
+                content = cursor_entry.get('content', {})
+                page.cursor = content.get('value') or content.get('itemContent', {}).get('value')
+            else:
+                page.cursor = fallback.get('cursor', {}).get('bottom')
+    except Exception as e:
+        logger.debug("Error extracting timeline: %s", e)
+
+    for entry in page.entries:
+        try:
+            tweet_result = _tweet_result(entry)
+            if not tweet_result:
+                continue
+            screen_name = _screen_name(tweet_result)
+            if page.owner is None and screen_name:
+                page.owner = screen_name
+            tweet = _build_tweet(tweet_result, screen_name, username)
+        except Exception as e:
+            logger.debug("Error parsing tweet: %s", e)
+            continue
+        if tweet:
+            page.tweets.append(tweet)
+
+    logger.debug("  Extracted %d tweet entries", len(page.entries))
+    return page
@@ -1,28 +1,29 @@
 import httpx
-import json
 import logging
 from typing import List, Optional
-from dataclasses import dataclass
 from datetime import datetime
-import time
 
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import retry, retry_if_not_exception_type, stop_after_attempt, wait_exponential
 
 import sys
 sys.path.append('..')
 from config import Config
+from metrics import stage_timer
+from logsetup import LazyJson
+from .rate_limit import QuotaExhaustedError, RateLimiter, twitter241_limiter
+from .user_cache import UserIdCache
+from .timeline import Tweet, TimelinePage, loads, parse_timeline
+from .watermark import TweetWatermark
+from .cassette import cassette_transport
 
 logger = logging.getLogger(__name__)
 
-
-@dataclass
-class Tweet:
-    id: str
-    username: str
-    text: str
-    image_urls: List[str]
-    created_at: datetime
-    url: str
+# twitter241 请求的重试策略（同步和异步爬虫共用）；配额耗尽时重试没有意义，直接抛给调用方
+api_retry = retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=1, min=2, max=10),
+    retry=retry_if_not_exception_type(QuotaExhaustedError)
+)
 
 
 def _find_rest_id(data, depth: int = 0) -> Optional[str]:
@@ -47,38 +48,47 @@ def _find_rest_id(data, depth: int = 0) -> Optional[str]:
     return None
 
 
-class TwitterCrawler:
-    """使用 RapidAPI Twttr API (twitter241) 抓取推文"""
+class TwitterTimelineParser:
+    """
+    twitter241 响应解析逻辑（同步/异步爬虫共用）
 
-    def __init__(self):
-        self.client = httpx.Client(
-            timeout=Config.REQUEST_TIMEOUT,
-            headers={
-                'x-rapidapi-key': Config.RAPIDAPI_KEY,
-                'x-rapidapi-host': 'twitter241.p.rapidapi.com'
-            }
-        )
-        self.base_url = 'https://twitter241.p.rapidapi.com'
-        # 缓存 username -> user_id 映射，减少 API 调用
-        self._user_id_cache: dict[str, str] = {}
+    抓取路径使用 timeline.parse_timeline 单遍解析；_extract_entries / _extract_cursor /
+    _parse_tweet 为逐字段查找的参考实现，保留用于兼容和基准对照（benchmarks/bench_timeline.py）。
+    """
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
-    def _get_user_id(self, username: str) -> Optional[str]:
-        """通过 username 获取 Twitter 数字 user ID"""
-        # 先查缓存
-        if username in self._user_id_cache:
-            return self._user_id_cache[username]
+    base_url = Config.TWITTER_API_URL.rstrip('/')
 
-        response = self.client.get(
-            f"{self.base_url}/user",
-            params={'username': username}
-        )
-        response.raise_for_status()
-        data = response.json()
+    @staticmethod
+    def _request_headers() -> dict:
+        return {
+            'x-rapidapi-key': Config.RAPIDAPI_KEY,
+            'x-rapidapi-host': 'twitter241.p.rapidapi.com'
+        }
 
-        # 打印返回数据前 800 字符，帮助调试 JSON 结构
-        raw = json.dumps(data, ensure_ascii=False)[:800]
-        logger.info(f"  /user response for @{username}: {raw}")
+    @staticmethod
+    def _timeline_params(user_id: str, cursor: Optional[str] = None) -> dict:
+        params = {
+            'user': user_id,
+            'count': 20
+        }
+        if cursor:
+            params['cursor'] = cursor
+        return params
+
+    def warmup_user_ids(self, usernames: List[str]) -> List[str]:
+        """批量预热 user_id 缓存，返回仍需通过 /user 解析的用户名"""
+        return self.user_id_cache.warmup(usernames)
+
+    def _timeline_owner_mismatch(self, page: TimelinePage, username: str) -> bool:
+        """timeline 作者与请求的用户名不一致时返回 True（缓存的 user_id 已属于改名后的账号）"""
+        if not page.owner:
+            return False
+        return page.owner.lower() != username.lstrip('@').lower()
+
+    def _extract_rest_id(self, data: dict, username: str) -> Optional[str]:
+        """从 /user 响应中提取 rest_id"""
+        # 返回数据前 800 字符，帮助调试 JSON 结构（只在写出时才序列化）
+        logger.debug("  /user response for @%s: %.800s", username, LazyJson(data))
 
         # 尝试多种可能的 JSON 路径提取 rest_id
         rest_id = None
@@ -117,81 +127,12 @@ class TwitterCrawler:
 
         if rest_id:
             rest_id = str(rest_id)
-            self._user_id_cache[username] = rest_id
             logger.info(f"  Resolved @{username} -> user_id: {rest_id}")
             return rest_id
 
         logger.warning(f"  Could not resolve user_id for @{username}")
         return None
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
-    def fetch_user_tweets(
-        self,
-        username: str,
-        since_id: Optional[str] = None,
-        max_count: int = Config.MAX_TWEETS_PER_USER
-    ) -> List[Tweet]:
-        """抓取用户的推文（仅带图片的）"""
-
-        user_id = self._get_user_id(username)
-        if not user_id:
-            return []
-
-        response = self.client.get(
-            f"{self.base_url}/user-tweets",
-            params={
-                'user': user_id,
-                'count': max_count
-            }
-        )
-        response.raise_for_status()
-        data = response.json()
-
-        tweets = []
-        entries = self._extract_entries(data)
-
-        for entry in entries:
-            tweet = self._parse_tweet(entry, username)
-            if tweet:
-                if since_id and tweet.id <= since_id:
-                    continue
-                if tweet.image_urls:
-                    tweets.append(tweet)
-
-        time.sleep(Config.REQUEST_DELAY)
-        return tweets
-
-    def fetch_timeline_page(
-        self,
-        username: str,
-        cursor: Optional[str] = None
-    ) -> tuple[List[dict], Optional[str]]:
-        """获取单页 timeline，返回 (原始 entry 列表, next_cursor)"""
-
-        user_id = self._get_user_id(username)
-        if not user_id:
-            return [], None
-
-        params = {
-            'user': user_id,
-            'count': 20
-        }
-        if cursor:
-            params['cursor'] = cursor
-
-        response = self.client.get(
-            f"{self.base_url}/user-tweets",
-            params=params
-        )
-        response.raise_for_status()
-        data = response.json()
-
-        entries = self._extract_entries(data)
-        next_cursor = self._extract_cursor(data)
-
-        time.sleep(Config.REQUEST_DELAY)
-        return entries, next_cursor
-
     def _extract_entries(self, data: dict) -> List[dict]:
         """从 GraphQL 响应中提取 tweet entries"""
         entries = []
@@ -220,9 +161,9 @@ class TwitterCrawler:
                             entries.append(entry)
 
         except Exception as e:
-            logger.debug(f"Error extracting entries: {e}")
+            logger.debug("Error extracting entries: %s", e)
 
-        logger.debug(f"  Extracted {len(entries)} tweet entries")
+        logger.debug("  Extracted %d tweet entries", len(entries))
         return entries
 
     def _extract_cursor(self, data: dict) -> Optional[str]:
@@ -257,7 +198,7 @@ class TwitterCrawler:
             return cursors2.get('bottom')
 
         except Exception as e:
-            logger.debug(f"Error extracting cursor: {e}")
+            logger.debug("Error extracting cursor: %s", e)
         return None
 
     def _parse_tweet(self, entry: dict, username: str) -> Optional[Tweet]:
@@ -335,7 +276,7 @@ class TwitterCrawler:
             )
         except Exception as e:
             if Config.DEBUG:
-                logger.debug(f"Error parsing tweet: {e}")
+                logger.debug("Error parsing tweet: %s", e)
             return None
 
     def _get_tweet_result(self, entry: dict) -> Optional[dict]:
@@ -369,5 +310,112 @@ class TwitterCrawler:
             pass
         return None
 
+
+class TwitterCrawler(TwitterTimelineParser):
+    """使用 RapidAPI Twttr API (twitter241) 抓取推文"""
+
+    def __init__(
+        self,
+        rate_limiter: RateLimiter = twitter241_limiter,
+        user_id_cache: Optional[UserIdCache] = None
+    ):
+        self.client = httpx.Client(
+            timeout=Config.REQUEST_TIMEOUT,
+            headers=self._request_headers(),
+            transport=cassette_transport()
+        )
+        self.rate_limiter = rate_limiter
+        # 持久化缓存 username -> user_id 映射，减少 API 调用
+        self.user_id_cache = user_id_cache or UserIdCache()
+
+    def _get(self, path: str, params: dict) -> httpx.Response:
+        """经过共享限流器发出 twitter241 请求"""
+        self.rate_limiter.acquire()
+        response = self.client.get(f"{self.base_url}{path}", params=params)
+        self.rate_limiter.update_from_response(response.status_code, response.headers)
+        response.raise_for_status()
+        return response
+
+    @api_retry
+    def _get_user_id(self, username: str) -> Optional[str]:
+        """通过 username 获取 Twitter 数字 user ID"""
+        # 先查缓存
+        cached = self.user_id_cache.get(username)
+        if cached:
+            return cached
+
+        response = self._get('/user', {'username': username})
+
+        rest_id = self._extract_rest_id(response.json(), username)
+        if rest_id:
+            self.user_id_cache.set(username, rest_id)
+        return rest_id
+
+    @api_retry
+    def fetch_user_tweets(
+        self,
+        username: str,
+        since_id: Optional[str] = None,
+        max_count: int = Config.MAX_TWEETS_PER_USER
+    ) -> List[Tweet]:
+        """抓取用户的推文（仅带图片的）"""
+
+        user_id = self._get_user_id(username)
+        if not user_id:
+            return []
+
+        response = self._get('/user-tweets', {
+            'user': user_id,
+            'count': max_count
+        })
+        page = parse_timeline(loads(response.content), username)
+
+        watermark = TweetWatermark(since_id)
+        tweets = []
+        for tweet in page.tweets:
+            if watermark.reached(tweet.id):
+                continue
+            if tweet.image_urls:
+                tweets.append(tweet)
+
+        return tweets
+
+    @api_retry
+    def fetch_timeline(self, username: str, cursor: Optional[str] = None) -> TimelinePage:
+        """获取单页 timeline，一次解析出 entries、next_cursor 和 Tweet 列表"""
+
+        user_id = self._get_user_id(username)
+        if not user_id:
+            return TimelinePage()
+
+        with stage_timer(stage='fetch', creator=username):
+            response = self._get('/user-tweets', self._timeline_params(user_id, cursor))
+        with stage_timer(stage='parse', creator=username):
+            page = parse_timeline(loads(response.content), username)
+
+        if not cursor and self._timeline_owner_mismatch(page, username):
+            # 缓存的 user_id 已不属于该用户名（账号改名），作废后重新解析
+            logger.warning(f"  Cached user_id for @{username} belongs to another account, re-resolving")
+            self.user_id_cache.invalidate(username)
+            user_id = self._get_user_id(username)
+            if not user_id:
+                return TimelinePage()
+            with stage_timer(stage='fetch', creator=username):
+                response = self._get('/user-tweets', self._timeline_params(user_id, cursor))
+            with stage_timer(stage='parse', creator=username):
+                page = parse_timeline(loads(response.content), username)
+
+        return page
+
+    def fetch_timeline_page(
+        self,
+        username: str,
+        cursor: Optional[str] = None
+    ) -> tuple[List[dict], Optional[str]]:
+        """获取单页 timeline，返回 (原始 entry 列表, next_cursor)"""
+        page = self.fetch_timeline(username, cursor)
+        return page.entries, page.cursor
+
     def close(self):
-        self.client.close()
\ No newline at end of file
+        self.client.close()
+        self.user_id_cache.close()
\ No newline at end of file
@@ -0,0 +1,113 @@
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import sys
+sys.path.append('..')
+from config import Config
+from .cache_db import open_cache_db
+
+logger = logging.getLogger(__name__)
+
+
+class UserIdCache:
+    """
+    username -> user_id (rest_id) 持久化缓存 (SQLite)
+
+    rest_id 几乎不会变化，缓存文件放在 Config.CACHE_DIR 下，
+    GitHub Actions 通过 actions/cache 在多次运行之间保留该目录。
+    内存中再保留一层 dict，同一次运行内只读一次磁盘。
+    """
+
+    def __init__(self, path: str = Config.USER_ID_CACHE_PATH, ttl: float = Config.USER_ID_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._memory: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+        self._conn = open_cache_db(path)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS user_ids ('
+            ' username TEXT PRIMARY KEY,'
+            ' user_id TEXT NOT NULL,'
+            ' resolved_at REAL NOT NULL)'
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _key(username: str) -> str:
+        # Twitter 用户名不区分大小写
+        return username.lstrip('@').lower()
+
+    def get(self, username: str) -> Optional[str]:
+        key = self._key(username)
+        with self._lock:
+            if key in self._memory:
+                return self._memory[key]
+            row = self._conn.execute(
+                'SELECT user_id FROM user_ids WHERE username = ? AND resolved_at >= ?',
+                (key, time.time() - self.ttl)
+            ).fetchone()
+            if row:
+                self._memory[key] = row[0]
+                return row[0]
+        return None
+
+    def set(self, username: str, user_id: str):
+        self.set_many({username: user_id})
+
+    def set_many(self, mapping: Dict[str, str]):
+        now = time.time()
+        rows = [(self._key(u), str(uid), now) for u, uid in mapping.items()]
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO user_ids (username, user_id, resolved_at) VALUES (?, ?, ?)',
+                rows
+            )
+            self._conn.commit()
+            for key, uid, _ in rows:
+                self._memory[key] = uid
+
+    def warmup(self, usernames: Iterable[str]) -> List[str]:
+        """批量把未过期的映射加载到内存，返回缓存中没有的用户名"""
+        keys = {self._key(u): u for u in usernames}
+        found = {}
+        with self._lock:
+            items = list(keys)
+            # SQLite 默认最多 999 个绑定参数
+            for i in range(0, len(items), 500):
+                chunk = items[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f'SELECT username, user_id FROM user_ids '
+                    f'WHERE username IN ({placeholders}) AND resolved_at >= ?',
+                    (*chunk, time.time() - self.ttl)
+                ).fetchall()
+                found.update(rows)
+            self._memory.update(found)
+
+        missing = [original for key, original in keys.items() if key not in found]
+        logger.info(f"User ID cache warmup: {len(found)} cached, {len(missing)} to resolve")
+        return missing
+
+    def invalidate(self, username: str):
+        """删除某个用户名的映射（例如创作者改名后）"""
+        key = self._key(username)
+        with self._lock:
+            self._memory.pop(key, None)
+            self._conn.execute('DELETE FROM user_ids WHERE username = ?', (key,))
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                'DELETE FROM user_ids WHERE resolved_at < ?',
+                (time.time() - self.ttl,)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
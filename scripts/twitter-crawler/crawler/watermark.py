@@ -0,0 +1,110 @@
+"""
+基于 Snowflake 的推文 ID 水位线
+
+推文 ID 是 64 位 Snowflake：高 41 位为自 Twitter epoch 起的毫秒数，
+因此 ID 的数值大小即时间先后，也能直接换算出发帖时间，不需要解析 created_at。
+ID 必须按整数比较：字符串比较在位数不同时（如 '999' > '1000'）会出错。
+"""
+
+import threading
+from datetime import datetime, timezone
+from typing import Optional, Union
+
+TWITTER_EPOCH_MS = 1288834974657
+TIMESTAMP_SHIFT = 22
+# 2010-11-04 之前的推文 ID 是顺序号，不含时间戳
+FIRST_SNOWFLAKE_ID = 29700859247
+
+TweetId = Union[str, int]
+
+
+def tweet_id_int(tweet_id: Optional[TweetId]) -> int:
+    """推文 ID 转整数，无效 ID 返回 0"""
+    if tweet_id is None:
+        return 0
+    try:
+        return int(tweet_id)
+    except (TypeError, ValueError):
+        return 0
+
+
+def is_snowflake(tweet_id: TweetId) -> bool:
+    return tweet_id_int(tweet_id) >= FIRST_SNOWFLAKE_ID
+
+
+def snowflake_time(tweet_id: TweetId) -> Optional[datetime]:
+    """从 Snowflake ID 解出发帖时间 (UTC)，非 Snowflake ID 返回 None"""
+    value = tweet_id_int(tweet_id)
+    if value < FIRST_SNOWFLAKE_ID:
+        return None
+    ms = (value >> TIMESTAMP_SHIFT) + TWITTER_EPOCH_MS
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+
+
+def snowflake_floor(moment: datetime) -> int:
+    """给定时刻之后发出的推文 ID 的下界（该毫秒内最小的 Snowflake ID）"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    ms = int(moment.timestamp() * 1000) - TWITTER_EPOCH_MS
+    return max(ms, 0) << TIMESTAMP_SHIFT
+
+
+def tweet_time(tweet) -> datetime:
+    """推文发帖时间：优先从 ID 解码，非 Snowflake ID 回退到 created_at"""
+    decoded = snowflake_time(tweet.id)
+    if decoded is not None:
+        return decoded
+    created_at = tweet.created_at
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at
+
+
+class DateCutoff:
+    """日期下限：把截止时间预先换算成 ID 下界，之后每条推文只需一次整数比较"""
+
+    def __init__(self, since: datetime):
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        self.since = since
+        self.floor_id = snowflake_floor(since)
+
+    def is_before(self, tweet) -> bool:
+        """推文早于截止时间时返回 True"""
+        value = tweet_id_int(tweet.id)
+        if value >= FIRST_SNOWFLAKE_ID:
+            return value < self.floor_id
+        return tweet_time(tweet) < self.since
+
+    def id_is_before(self, tweet_id: TweetId) -> bool:
+        """只有 ID 时的判断（如 history.py 的原始 entry），非 Snowflake ID 视为更早"""
+        return tweet_id_int(tweet_id) < self.floor_id
+
+
+class TweetWatermark:
+    """
+    单个创作者的增量水位线
+
+    since_id 为上次运行保存的 last_tweet_id；本次看到的每一条推文（含纯文本、已在台账中的）
+    都会推进水位线，下次运行即可在这些推文处停止翻页。
+    """
+
+    def __init__(self, since_id: Optional[TweetId] = None):
+        self.since = tweet_id_int(since_id)
+        self.high = self.since
+        self._lock = threading.Lock()
+
+    def reached(self, tweet_id: TweetId) -> bool:
+        """推文已在上次水位线之内（<= since_id）时返回 True"""
+        return bool(self.since) and tweet_id_int(tweet_id) <= self.since
+
+    def advance(self, tweet_id: TweetId):
+        value = tweet_id_int(tweet_id)
+        with self._lock:
+            if value > self.high:
+                self.high = value
+
+    @property
+    def value(self) -> Optional[str]:
+        """需要保存的新 last_tweet_id，水位线没有前进时返回 None"""
+        return str(self.high) if self.high > self.since else None
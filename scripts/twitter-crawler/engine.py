@@ -0,0 +1,281 @@
+"""
+asyncio 并发抓取引擎
+与 main.py 的顺序流程逻辑一致，但同时处理多个创作者
+各阶段的耗时按创作者记入 metrics.STAGE_SECONDS（包含等待事件循环中其他创作者的时间）
+"""
+
+import asyncio
+import logging
+from typing import List, Optional
+
+from config import Config
+from crawler import AsyncTwitterCrawler, Tweet, CrawlLedger, MediaValidator, ImageHashIndex, QuotaExhaustedError
+from crawler.watermark import TweetWatermark
+from crawler.ledger import (
+    STAGE_PARSE, STAGE_ANALYSIS, STAGE_INGEST,
+    OUTCOME_NO_IMAGES, OUTCOME_AMBIGUOUS, OUTCOME_DUPLICATE, OUTCOME_IMAGES_FAILED, OUTCOME_ERROR,
+    analysis_outcome, ingest_outcome,
+)
+from ai import create_async_analyzer, AsyncAnalyzerPool, PromptPreFilter, is_ambiguous
+from api import AsyncBotApiClient, DuplicateFilter
+from api.client import Creator
+from components import CrawlComponents
+from metrics import STAGE_ITEMS, stage_timer
+
+logger = logging.getLogger(__name__)
+
+# 每个用户最多翻页数（与 main.py 保持一致）
+MAX_PAGES_PER_USER = 5
+
+
+async def fetch_all_new_tweets(
+    crawler: AsyncTwitterCrawler,
+    username: str,
+    watermark: TweetWatermark,
+    ledger: Optional[CrawlLedger] = None
+) -> List[Tweet]:
+    """获取用户所有新推文（支持分页），直到遇到水位线 (since_id) 或达到上限"""
+    all_tweets = []
+    cursor = None
+
+    for page in range(MAX_PAGES_PER_USER):
+        logger.debug("  [@%s] Fetching page %d...", username, page + 1)
+
+        try:
+            timeline = await crawler.fetch_timeline(username, cursor)
+        except QuotaExhaustedError:
+            raise
+        except Exception as e:
+            logger.error(f"  [@{username}] Failed to fetch page {page + 1}: {e}")
+            break
+
+        if not timeline.entries:
+            break
+
+        reached_since_id = False
+        for tweet in timeline.tweets:
+            # 增量检查：遇到已处理的推文就停止
+            if watermark.reached(tweet.id):
+                reached_since_id = True
+                break
+            watermark.advance(tweet.id)
+
+            # 台账中已有结论的推文直接跳过
+            if ledger is not None and ledger.should_skip(tweet.id):
+                continue
+
+            # 只保留有图片的
+            if tweet.image_urls:
+                all_tweets.append(tweet)
+            elif ledger is not None:
+                ledger.record(tweet.id, STAGE_PARSE, OUTCOME_NO_IMAGES, username)
+
+        if reached_since_id:
+            logger.debug("  [@%s] Reached since_id at page %d", username, page + 1)
+            break
+
+        cursor = timeline.cursor
+        if not cursor:
+            break
+
+    return all_tweets
+
+
+async def process_creator(
+    creator: Creator,
+    crawler: AsyncTwitterCrawler,
+    analyzer,
+    api: AsyncBotApiClient,
+    ledger: CrawlLedger,
+    prefilter: Optional[PromptPreFilter],
+    stats: dict,
+    dedupe: Optional[DuplicateFilter] = None,
+    media: Optional[MediaValidator] = None,
+    image_index: Optional[ImageHashIndex] = None
+):
+    """处理单个创作者：抓取、分析、入库、更新状态"""
+    logger.info(f"Processing @{creator.username}")
+    stats['creators_processed'] += 1
+
+    try:
+        watermark = TweetWatermark(creator.last_tweet_id)
+        tweets = await fetch_all_new_tweets(
+            crawler,
+            username=creator.username,
+            watermark=watermark,
+            ledger=ledger
+        )
+        stats['tweets_found'] += len(tweets)
+        logger.info(f"  [@{creator.username}] Found {len(tweets)} new tweets with images")
+
+        labels = {'creator': creator.username}
+        candidates = []
+        STAGE_ITEMS.inc(len(tweets), stage='filter', **labels)
+        with stage_timer(stage='filter', **labels):
+            for tweet in tweets:
+                # 来源推文或原文已入库，不再分析
+                if dedupe and dedupe.is_known_tweet(tweet):
+                    logger.debug("  [@%s] Known duplicate tweet: %s", creator.username, tweet.id)
+                    ledger.record(tweet.id, STAGE_INGEST, OUTCOME_DUPLICATE, creator.username, 'known before analysis')
+                    continue
+
+                # 启发式预筛，明显无关的推文不调用 LLM
+                if prefilter and not prefilter.should_analyze(tweet):
+                    logger.debug("  [@%s] Pre-filter rejected tweet: %s", creator.username, tweet.id)
+                    continue
+
+                candidates.append(tweet)
+
+        # 并发预检图片 URL，图片全部失效的推文不再分析和入库
+        if media and candidates:
+            STAGE_ITEMS.inc(len(candidates), stage='media', **labels)
+            with stage_timer(stage='media', **labels):
+                candidates, dead = await media.filter_tweets_async(candidates)
+            for tweet in dead:
+                logger.debug("  [@%s] Dropped tweet with dead media: %s", creator.username, tweet.id)
+                ledger.record(tweet.id, STAGE_PARSE, OUTCOME_IMAGES_FAILED, creator.username, 'dead media')
+
+        # 图片感知哈希：图片全部入库过的推文（换了文案的转发）不再分析和入库
+        if image_index and candidates:
+            STAGE_ITEMS.inc(len(candidates), stage='image_hash', **labels)
+            with stage_timer(stage='image_hash', **labels):
+                candidates, dropped = await image_index.filter_tweets_async(candidates)
+            for tweet, match in dropped:
+                logger.debug("  [@%s] Dropped tweet with known images: %s (similar to %s)", creator.username, tweet.id, match)
+                ledger.record(tweet.id, STAGE_INGEST, OUTCOME_DUPLICATE, creator.username, f'similar image to {match}')
+
+        try:
+            # AI 分析（多条推文合并为一次请求）
+            stats['tweets_analyzed'] += len(candidates)
+            STAGE_ITEMS.inc(len(candidates), stage='analyze', provider=analyzer.provider, **labels)
+            with stage_timer(stage='analyze', provider=analyzer.provider, **labels):
+                analyses = await analyzer.analyze_tweets(candidates)
+
+            for tweet, analysis in zip(candidates, analyses):
+                if analysis.is_relevant and analysis.confidence >= Config.RELEVANCE_THRESHOLD:
+                    # 额外检查：如果没有提取到 prompt，且原文也不像 prompt，则跳过
+                    if is_ambiguous(analysis, tweet):
+                        logger.info("  [@%s] Skipped ambiguous tweet: %s", creator.username, tweet.id)
+                        ledger.record(tweet.id, STAGE_ANALYSIS, OUTCOME_AMBIGUOUS, creator.username)
+                        continue
+
+                    stats['tweets_relevant'] += 1
+                    logger.debug("  [@%s] Relevant tweet found: %s", creator.username, tweet.id)
+
+                    prompt_text = analysis.extracted_prompt or tweet.text
+                    if dedupe and dedupe.is_known_prompt(prompt_text):
+                        logger.info("  [@%s] Skipped known duplicate: %s", creator.username, tweet.id)
+                        ledger.record(tweet.id, STAGE_INGEST, OUTCOME_DUPLICATE, creator.username, 'known before ingest')
+                        continue
+
+                    try:
+                        STAGE_ITEMS.inc(stage='ingest', **labels)
+                        with stage_timer(stage='ingest', **labels):
+                            result = await api.create_prompt(
+                                title=analysis.suggested_title or f"@{creator.username} 的提示词",
+                                prompt_text=prompt_text,
+                                image_urls=tweet.image_urls,
+                                author_name=creator.username,
+                                negative_prompt=analysis.extracted_negative_prompt,
+                                model=analysis.suggested_model,
+                                description=f"来源: {tweet.url}"
+                            )
+                        ledger.record(tweet.id, STAGE_INGEST, ingest_outcome(result), creator.username)
+                        if dedupe and result.stored:
+                            dedupe.add(prompt_text, tweet.id)
+                        if image_index and result.stored:
+                            image_index.add(tweet.id)
+
+                        if result.success:
+                            stats['prompts_created'] += 1
+                            logger.info("  [@%s] Created prompt: %s", creator.username, result.prompt_id)
+
+                            await api.update_creator_status(
+                                creator_id=creator.id,
+                                increment_success=True
+                            )
+                        elif result.skipped:
+                            stats['duplicates_skipped'] += 1
+                            logger.info("  [@%s] Skipped duplicate: %s", creator.username, tweet.id)
+                        else:
+                            stats['images_failed'] += 1
+                            logger.warning("  [@%s] Failed to create prompt: %s", creator.username, result.error)
+                            if result.failed_urls:
+                                logger.warning("    Failed URLs: %s", result.failed_urls)
+
+                    except Exception as e:
+                        logger.error("  [@%s] Failed to create prompt: %s", creator.username, e)
+                        stats['errors'] += 1
+                        ledger.record(tweet.id, STAGE_INGEST, OUTCOME_ERROR, creator.username, str(e))
+                else:
+                    logger.debug("  [@%s] Skipped tweet %s: %s", creator.username, tweet.id, analysis.reason)
+                    ledger.record(
+                        tweet.id, STAGE_ANALYSIS, analysis_outcome(analysis, False),
+                        creator.username, analysis.reason
+                    )
+        finally:
+            # 已入库的图片哈希已由 add() 写入索引，其余情况丢弃暂存的哈希
+            if image_index:
+                for tweet in candidates:
+                    image_index.discard(tweet.id)
+
+        await api.update_creator_status(
+            creator_id=creator.id,
+            last_tweet_id=watermark.value,
+            increment_fetch=True
+        )
+
+    except QuotaExhaustedError:
+        # 交给 crawl_creators 停止其余创作者
+        raise
+    except Exception as e:
+        logger.error(f"Error processing @{creator.username}: {e}")
+        stats['errors'] += 1
+    finally:
+        # 状态更新已在内存中合并，每个创作者只发一次 PATCH（STATUS_FLUSH=run 时在 api.aclose() 统一发送）
+        if Config.STATUS_FLUSH == 'creator':
+            try:
+                await api.flush_creator_status(creator.id)
+            except Exception as e:
+                logger.error(f"  [@{creator.username}] Failed to update status: {e}")
+
+
+async def crawl_creators(stats: dict, concurrency: int = Config.CRAWL_CONCURRENCY):
+    """并发处理所有活跃创作者，统计结果累加到 stats（单事件循环内无需加锁）"""
+    crawler = AsyncTwitterCrawler()
+    analyzer = AsyncAnalyzerPool(create_async_analyzer())
+    api = AsyncBotApiClient()
+    components = CrawlComponents.create()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    quota_exhausted = asyncio.Event()
+
+    async def run(creator: Creator):
+        async with semaphore:
+            # 配额耗尽后尚未开始的创作者直接跳过
+            if quota_exhausted.is_set():
+                return
+            try:
+                await process_creator(creator, crawler, analyzer, api, stats=stats, **components.kwargs())
+            except QuotaExhaustedError as e:
+                if not quota_exhausted.is_set():
+                    quota_exhausted.set()
+                    logger.error(f"Twitter API quota exhausted, stopping crawl: {e}")
+                    stats['errors'] += 1
+
+    try:
+        creators = await api.get_active_creators()
+        logger.info(f"Found {len(creators)} active creators (concurrency: {concurrency})")
+        crawler.warmup_user_ids([c.username for c in creators])
+        if components.dedupe:
+            try:
+                await components.dedupe.refresh_async(api)
+            except Exception as e:
+                logger.warning(f"Duplicate filter refresh failed, using local data: {e}")
+
+        await asyncio.gather(*(run(creator) for creator in creators))
+    finally:
+        components.collect_stats(stats, analyzer)
+        await crawler.aclose()
+        await api.aclose()
+        await components.aclose()
+        await analyzer.aclose()
@@ -6,26 +6,31 @@
 
 import argparse
 import logging
-import json
 import traceback
 from datetime import datetime, timedelta, timezone
-from pathlib import Path
 
 from config import Config
-from crawler import TwitterCrawler
-from ai import create_analyzer
-from api import BotApiClient
-
-logging.basicConfig(
-    level=logging.DEBUG if Config.DEBUG else logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
+from crawler import TwitterCrawler, CrawlLedger, MediaValidator, QuotaExhaustedError, create_image_hash_index
+from crawler.archive import RawArchiveWriter, read_raw_archive
+from crawler.timeline import parse_entry, entry_tweet_id
+from crawler.watermark import DateCutoff
+from crawler.ledger import (
+    STAGE_PARSE, STAGE_ANALYSIS, STAGE_INGEST,
+    OUTCOME_NO_IMAGES, OUTCOME_DUPLICATE, OUTCOME_IMAGES_FAILED, OUTCOME_ERROR,
+    analysis_outcome, ingest_outcome,
 )
+from ai import create_analyzer, PromptPreFilter
+from api import BotApiClient, DuplicateFilter
+from logsetup import setup_logging
+from metrics import export_run, stage_timer
+from profiling import profile_run
+
 logger = logging.getLogger(__name__)
 
 
-def fetch_tweets_from_api(crawler, username, start_page, max_pages):
-    """从 API 抓取推文，返回原始数据列表"""
-    all_raw_tweets = []
+def fetch_tweets_from_api(crawler, username, start_page, max_pages, cutoff=None):
+    """从 API 逐页抓取推文，产出每页的原始 entry 列表；一页的最后一条推文早于 cutoff 时停止翻页"""
+    total = 0
     cursor = None
 
     # 跳过前面的页
@@ -36,11 +41,14 @@ def fetch_tweets_from_api(crawler, username, start_page, max_pages):
                 _, cursor = crawler.fetch_timeline_page(username, cursor)
                 if not cursor:
                     logger.error("没有更多页可跳过")
-                    return all_raw_tweets
+                    return
+            except QuotaExhaustedError as e:
+                logger.error(f"Twitter API 配额已用完，停止抓取: {e}")
+                return
             except Exception as e:
                 logger.error(f"跳页失败: {e}")
                 logger.error(traceback.format_exc())
-                return all_raw_tweets
+                return
 
     for page in range(max_pages):
         actual_page = start_page + page
@@ -48,6 +56,9 @@ def fetch_tweets_from_api(crawler, username, start_page, max_pages):
 
         try:
             results, next_cursor = crawler.fetch_timeline_page(username, cursor)
+        except QuotaExhaustedError as e:
+            logger.error(f"Twitter API 配额已用完，停止抓取: {e}")
+            break
         except Exception as e:
             logger.error(f"获取失败: {e}")
             logger.error(traceback.format_exc())
@@ -57,79 +68,175 @@ def fetch_tweets_from_api(crawler, username, start_page, max_pages):
             logger.info("没有更多推文")
             break
 
-        all_raw_tweets.extend(results)
-        logger.info(f"  获取到 {len(results)} 条推文，累计 {len(all_raw_tweets)} 条")
+        total += len(results)
+        logger.info(f"  获取到 {len(results)} 条推文，累计 {total} 条")
+        yield results
+
+        # 按 entryId 中的 Snowflake ID 判断，用每页最后（最早）一条，避免被置顶推文误触发
+        if cutoff is not None:
+            oldest_id = next(filter(None, map(entry_tweet_id, reversed(results))), None)
+            if oldest_id and cutoff.id_is_before(oldest_id):
+                logger.info("已翻到截止时间之前的推文，停止翻页")
+                break
 
         cursor = next_cursor
         if not cursor:
             logger.info("没有更多页")
             break
 
-    return all_raw_tweets
+
+def archive_pages(pages, archive=None):
+    """把逐页抓取的 entry 展开为单条；指定 archive 时每页先追加写入归档"""
+    for page in pages:
+        if archive is not None:
+            archive.append(page)
+        yield from page
 
 
-def process_tweets(raw_tweets, crawler, analyzer, api, username, cutoff_date, dry_run):
+def process_tweets(raw_tweets, crawler, analyzer, api, username, cutoff_date, dry_run, ledger=None,
+                   prefilter=None, dedupe=None, media=None, image_index=None):
     """处理推文：解析、AI 分析、入库"""
+    cutoff = DateCutoff(cutoff_date)
     stats = {
         'tweets_found': 0,
+        'known_tweets_skipped': 0,
         'tweets_with_images': 0,
+        'prefilter_rejected': 0,
+        'known_duplicates_skipped': 0,
+        'dead_media_tweets_dropped': 0,
+        'similar_image_tweets_dropped': 0,
         'tweets_relevant': 0,
         'prompts_created': 0,
         'errors': 0
     }
 
     for item in raw_tweets:
-        tweet = crawler._parse_tweet(item, username)
+        tweet = parse_entry(item, username)
         if not tweet:
             continue
 
         stats['tweets_found'] += 1
 
-        # 检查时间
-        tweet_time = tweet.created_at
-        if tweet_time.tzinfo is None:
-            tweet_time = tweet_time.replace(tzinfo=timezone.utc)
-        if tweet_time < cutoff_date:
+        # 检查时间（从推文 ID 解码，不依赖 created_at）
+        if cutoff.is_before(tweet):
+            continue
+
+        # 台账中已有结论的推文直接跳过
+        if ledger is not None and ledger.should_skip(tweet.id):
+            stats['known_tweets_skipped'] += 1
             continue
 
         # 只处理有图片的
         if not tweet.image_urls:
+            if ledger is not None:
+                ledger.record(tweet.id, STAGE_PARSE, OUTCOME_NO_IMAGES, username)
             continue
 
         stats['tweets_with_images'] += 1
-        logger.info(f"  [{tweet.created_at.strftime('%m-%d %H:%M')}] {tweet.text[:50]}...")
-
-        # AI 分析
-        analysis = analyzer.analyze_tweet(tweet)
-        if not (analysis.is_relevant and analysis.confidence >= Config.RELEVANCE_THRESHOLD):
-            logger.debug(f"    跳过: {analysis.reason}")
+        logger.info("  [%s] %.50s...", tweet.created_at.strftime('%m-%d %H:%M'), tweet.text)
+
+        # 来源推文或原文已入库，不再分析
+        if dedupe and dedupe.is_known_tweet(tweet):
+            stats['known_duplicates_skipped'] += 1
+            logger.debug("    已入库，跳过")
+            if ledger is not None:
+                ledger.record(tweet.id, STAGE_INGEST, OUTCOME_DUPLICATE, username, 'known before analysis')
             continue
 
-        stats['tweets_relevant'] += 1
-        logger.info(f"    -> 相关! 置信度: {analysis.confidence:.2f}")
-        logger.info(f"    提取的 Prompt: {(analysis.extracted_prompt or '')[:100]}...")
-
-        if dry_run:
-            logger.info(f"    [DRY-RUN] 标题: {analysis.suggested_title}")
+        # 启发式预筛，明显无关的推文不调用 LLM
+        if prefilter and not prefilter.should_analyze(tweet):
+            stats['prefilter_rejected'] += 1
+            logger.debug("    预筛跳过")
             continue
 
-        # 入库
+        # 预检图片 URL（同一推文的多张图并发检查），全部失效的不再分析
+        if media:
+            with stage_timer(stage='media', creator=username):
+                live, _ = media.filter_tweets([tweet])
+            if not live:
+                stats['dead_media_tweets_dropped'] += 1
+                logger.info("    图片已失效，跳过")
+                if ledger is not None:
+                    ledger.record(tweet.id, STAGE_PARSE, OUTCOME_IMAGES_FAILED, username, 'dead media')
+                continue
+            tweet = live[0]
+
+        # 图片感知哈希：图片全部入库过的（换了文案的转发）不再分析
+        if image_index:
+            with stage_timer(stage='image_hash', creator=username):
+                live, dropped = image_index.filter_tweets([tweet])
+            if not live:
+                stats['similar_image_tweets_dropped'] += 1
+                logger.info("    图片已入库 (与 %s 相似)，跳过", dropped[0][1])
+                if ledger is not None:
+                    ledger.record(tweet.id, STAGE_INGEST, OUTCOME_DUPLICATE, username, f'similar image to {dropped[0][1]}')
+                continue
+            tweet = live[0]
+
         try:
-            result = api.create_prompt(
-                title=analysis.suggested_title or f"@{username} 的提示词",
-                prompt_text=analysis.extracted_prompt or tweet.text,
-                image_urls=tweet.image_urls,
-                author_name=username,
-                negative_prompt=analysis.extracted_negative_prompt,
-                model=analysis.suggested_model,
-                description=f"来源: {tweet.url}"
-            )
-            stats['prompts_created'] += 1
-            logger.info(f"    已创建: {result.get('prompt', {}).get('id')}")
-        except Exception as e:
-            logger.error(f"    入库失败: {e}")
-            logger.error(f"    详细错误:\n{traceback.format_exc()}")
-            stats['errors'] += 1
+            # AI 分析
+            with stage_timer(stage='analyze', creator=username, provider=analyzer.provider):
+                analysis = analyzer.analyze_tweet(tweet)
+            if not (analysis.is_relevant and analysis.confidence >= Config.RELEVANCE_THRESHOLD):
+                logger.debug("    跳过: %s", analysis.reason)
+                if ledger is not None:
+                    ledger.record(
+                        tweet.id, STAGE_ANALYSIS, analysis_outcome(analysis, False),
+                        username, analysis.reason
+                    )
+                continue
+
+            stats['tweets_relevant'] += 1
+            logger.info("    -> 相关! 置信度: %.2f", analysis.confidence)
+            logger.info("    提取的 Prompt: %.100s...", analysis.extracted_prompt or '')
+
+            prompt_text = analysis.extracted_prompt or tweet.text
+            if dedupe and dedupe.is_known_prompt(prompt_text):
+                stats['known_duplicates_skipped'] += 1
+                logger.info("    已入库，跳过")
+                if ledger is not None:
+                    ledger.record(tweet.id, STAGE_INGEST, OUTCOME_DUPLICATE, username, 'known before ingest')
+                continue
+
+            if dry_run:
+                logger.info("    [DRY-RUN] 标题: %s", analysis.suggested_title)
+                continue
+
+            # 入库
+            try:
+                with stage_timer(stage='ingest', creator=username):
+                    result = api.create_prompt(
+                        title=analysis.suggested_title or f"@{username} 的提示词",
+                        prompt_text=prompt_text,
+                        image_urls=tweet.image_urls,
+                        author_name=username,
+                        negative_prompt=analysis.extracted_negative_prompt,
+                        model=analysis.suggested_model,
+                        description=f"来源: {tweet.url}"
+                    )
+                if ledger is not None:
+                    ledger.record(tweet.id, STAGE_INGEST, ingest_outcome(result), username)
+                if dedupe and result.stored:
+                    dedupe.add(prompt_text, tweet.id)
+                if image_index and result.stored:
+                    image_index.add(tweet.id)
+                if result.success:
+                    stats['prompts_created'] += 1
+                    logger.info("    已创建: %s", result.prompt_id)
+                elif result.skipped:
+                    logger.info("    已存在，跳过 (%s)", result.reason)
+                else:
+                    logger.warning("    入库失败: %s", result.error)
+            except Exception as e:
+                logger.error(f"    入库失败: {e}")
+                logger.error(f"    详细错误:\n{traceback.format_exc()}")
+                stats['errors'] += 1
+                if ledger is not None:
+                    ledger.record(tweet.id, STAGE_INGEST, OUTCOME_ERROR, username, str(e))
+        finally:
+            # 已入库的图片哈希已由 add() 写入索引，其余情况（含 dry-run）丢弃暂存的哈希
+            if image_index:
+                image_index.discard(tweet.id)
 
     return stats
 
@@ -141,10 +248,15 @@ def main():
     parser.add_argument('--start-page', type=int, default=1, help='从第几页开始 (默认 1)')
     parser.add_argument('--max-pages', type=int, default=10, help='最多翻页数 (默认 10)')
     parser.add_argument('--dry-run', action='store_true', help='只分析不入库')
-    parser.add_argument('--save-raw', type=str, help='保存原始推文到 JSON 文件')
-    parser.add_argument('--load-raw', type=str, help='从本地 JSON 文件加载推文（跳过 API 抓取）')
+    parser.add_argument('--save-raw', type=str, help='边抓取边保存原始推文到归档 (.jsonl.gz，.jsonl 为不压缩)')
+    parser.add_argument('--load-raw', type=str, help='从本地归档加载推文（跳过 API 抓取，兼容旧版 JSON 文件）')
+    parser.add_argument('--max-id', type=str, help='配合 --load-raw：从该推文 ID 开始读取（跳过更新的推文）')
     parser.add_argument('--fetch-only', action='store_true', help='只抓取不分析（配合 --save-raw 使用）')
+    parser.add_argument('--ignore-ledger', action='store_true', help='不跳过台账中已处理的推文')
+    parser.add_argument('--profile', action='store_true', default=Config.PROFILE_ENABLED,
+                        help='采集 CPU / 墙钟剖析和内存峰值，写入 logs/')
     args = parser.parse_args()
+    setup_logging('history')
 
     username = args.username.lstrip('@')
     cutoff_date = datetime.now(timezone.utc) - timedelta(days=args.days)
@@ -154,57 +266,89 @@ def main():
 
     crawler = TwitterCrawler()
 
-    try:
-        # 获取原始推文数据
-        if args.load_raw:
-            # 从本地文件加载
-            logger.info(f"从本地加载: {args.load_raw}")
-            with open(args.load_raw, 'r', encoding='utf-8') as f:
-                raw_tweets = json.load(f)
-            logger.info(f"加载了 {len(raw_tweets)} 条推文")
-        else:
-            # 从 API 抓取
-            raw_tweets = fetch_tweets_from_api(
-                crawler, username, args.start_page, args.max_pages
-            )
-
-        # 保存原始数据
-        if args.save_raw:
-            output_path = Path(args.save_raw)
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(raw_tweets, f, ensure_ascii=False, indent=2)
-            logger.info(f"已保存 {len(raw_tweets)} 条原始推文到: {args.save_raw}")
-
-        # 如果只抓取不分析，到这里就结束
-        if args.fetch_only:
-            logger.info("仅抓取模式，跳过分析")
-            return
-
-        # 处理推文
-        analyzer = create_analyzer()
-        api = BotApiClient() if not args.dry_run else None
-
+    with profile_run('history', args.profile):
         try:
-            stats = process_tweets(
-                raw_tweets, crawler, analyzer, api,
-                username, cutoff_date, args.dry_run
-            )
+            # 原始推文以生成器逐条流过后续处理，不整体载入内存
+            archive = RawArchiveWriter(args.save_raw) if args.save_raw else None
+            if args.load_raw:
+                # 从本地归档读取，按截止时间 / --max-id 定位
+                logger.info(f"从本地加载: {args.load_raw}")
+                raw_tweets = read_raw_archive(args.load_raw, max_id=args.max_id, since=cutoff_date)
+                if archive is not None:
+                    raw_tweets = archive.tee(raw_tweets)
+            else:
+                # 从 API 抓取，每页先追加写入归档
+                raw_tweets = archive_pages(
+                    fetch_tweets_from_api(crawler, username, args.start_page, args.max_pages, DateCutoff(cutoff_date)),
+                    archive
+                )
+
+            # 如果只抓取不分析，到这里就结束
+            if args.fetch_only:
+                count = sum(1 for _ in raw_tweets)
+                if archive is not None:
+                    logger.info(f"已保存 {archive.count} 条原始推文到: {args.save_raw}")
+                logger.info(f"仅抓取模式，跳过分析（共 {count} 条）")
+                export_run('history', {'tweets_fetched': count})
+                return
+
+            # 处理推文
+            analyzer = create_analyzer()
+            api = BotApiClient() if not args.dry_run else None
+            ledger = CrawlLedger() if not args.ignore_ledger else None
+            prefilter = PromptPreFilter() if Config.PREFILTER_ENABLED else None
+            # dry-run 时不请求 Bot API，只使用本地已同步的指纹
+            dedupe = DuplicateFilter() if Config.DEDUPE_FILTER_ENABLED else None
+            media = MediaValidator() if Config.MEDIA_CHECK_ENABLED else None
+            image_index = create_image_hash_index()
+
+            try:
+                if dedupe and api:
+                    try:
+                        dedupe.refresh(api)
+                    except Exception as e:
+                        logger.warning(f"同步已入库指纹失败，使用本地数据: {e}")
+
+                stats = process_tweets(
+                    raw_tweets, crawler, analyzer, api,
+                    username, cutoff_date, args.dry_run, ledger, prefilter, dedupe, media, image_index
+                )
+            finally:
+                if api:
+                    api.close()
+                if ledger:
+                    ledger.close()
+                if dedupe:
+                    dedupe.close()
+                if media:
+                    media.close()
+                if image_index:
+                    image_index.close()
+                analyzer.close()
+
+            # 输出统计
+            logger.info("=" * 50)
+            logger.info("处理完成!")
+            logger.info(f"  推文总数: {stats['tweets_found']}")
+            logger.info(f"  已处理跳过: {stats['known_tweets_skipped']}")
+            logger.info(f"  带图片: {stats['tweets_with_images']}")
+            logger.info(f"  预筛跳过 (节省 LLM 调用): {stats['prefilter_rejected']}")
+            logger.info(f"  已入库去重跳过: {stats['known_duplicates_skipped']}")
+            logger.info(f"  图片失效跳过: {stats['dead_media_tweets_dropped']}")
+            logger.info(f"  相似图片跳过: {stats['similar_image_tweets_dropped']}")
+            if media:
+                logger.info(f"  图片预检请求/缓存命中: {media.checked}/{media.cache_hits}")
+            logger.info(f"  相关推文: {stats['tweets_relevant']}")
+            logger.info(f"  已入库: {stats['prompts_created']}")
+            logger.info(f"  错误: {stats['errors']}")
+            if hasattr(analyzer, 'cache'):
+                logger.info(f"  分析缓存命中/未命中: {analyzer.cache.hits}/{analyzer.cache.misses}")
+            if archive is not None:
+                logger.info(f"  原始推文已保存: {archive.count} 条 -> {args.save_raw}")
+            export_run('history', stats)
+
         finally:
-            if api:
-                api.close()
-
-        # 输出统计
-        logger.info("=" * 50)
-        logger.info("处理完成!")
-        logger.info(f"  推文总数: {stats['tweets_found']}")
-        logger.info(f"  带图片: {stats['tweets_with_images']}")
-        logger.info(f"  相关推文: {stats['tweets_relevant']}")
-        logger.info(f"  已入库: {stats['prompts_created']}")
-        logger.info(f"  错误: {stats['errors']}")
-
-    finally:
-        crawler.close()
+            crawler.close()
 
 
 if __name__ == '__main__':
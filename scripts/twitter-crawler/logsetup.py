@@ -0,0 +1,182 @@
+"""
+运行日志
+
+setup_logging() 之后，所有 logger 只把 LogRecord 放进有界队列（QueueHandler），
+由后台线程（QueueListener）格式化并写出：
+- 控制台：与原来相同的文本格式（GitHub Actions 日志）
+- 文件：Config.LOG_DIR/<job>.jsonl，每行一个 JSON 对象，按大小轮转
+
+消息在后台线程中才格式化，调用方应使用 logger.debug("... %s", value) 的惰性写法，
+传入的参数在写出前不应再被修改。队列满（磁盘写入跟不上）时直接丢弃并计数，
+日志永远不会阻塞抓取。
+
+DEBUG 日志按调用位置（文件 + 行号）采样：同一位置的前 LOG_SAMPLE_FIRST 条全部保留，
+之后每 LOG_SAMPLE_EVERY 条保留 1 条，避免逐条推文的调试日志刷屏。
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from config import Config
+
+CONSOLE_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# LogRecord 的标准属性；其余属性（logger.info(..., extra={...}) 传入的）作为结构化字段写出
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'sampled'}
+
+
+class LazyJson:
+    """写出日志时才序列化的 JSON，配合 %s / %.800s 使用"""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self) -> str:
+        return json.dumps(self.value, ensure_ascii=False, default=str)
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'msg': record.getMessage(),
+        }
+        sampled = getattr(record, 'sampled', None)
+        if sampled:
+            entry['sampled'] = sampled
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DebugSampler(logging.Filter):
+    """
+    DEBUG 日志按调用位置采样；保留的记录带 sampled=N（代表约 N 条）
+
+    以 (pathname, lineno) 而不是消息文本为 key：即使调用方用 f-string 拼接了变量，
+    计数表的大小也只取决于代码中 logger.debug 调用的个数。
+    """
+
+    def __init__(self, first: int = 20, every: int = 10):
+        super().__init__()
+        self.first = first
+        self.every = max(1, every)
+        self._seen: Dict[Tuple[str, int], int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            seen = self._seen.get(key, 0) + 1
+            self._seen[key] = seen
+        if seen <= self.first:
+            return True
+        if (seen - self.first) % self.every:
+            return False
+        record.sampled = self.every
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """不在调用线程格式化、队列满时丢弃的 QueueHandler"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 默认实现会在调用线程里格式化消息；这里原样交给后台线程
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # 停止时队列可能是满的，等后台线程腾出位置
+        self.queue.put(self._sentinel)
+
+
+_listener: Optional[_Listener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+
+
+def setup_logging(job: str, level: Optional[int] = None):
+    """配置根 logger：控制台 + logs/<job>.jsonl，均经由后台线程写出；重复调用无效"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+    level = level if level is not None else (logging.DEBUG if Config.DEBUG else logging.INFO)
+
+    console = logging.StreamHandler(sys.stderr)
+    console.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+    handlers = [console]
+    try:
+        os.makedirs(Config.LOG_DIR, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            os.path.join(Config.LOG_DIR, f"{job}.jsonl"),
+            maxBytes=Config.LOG_MAX_BYTES, backupCount=Config.LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+        file_handler.setFormatter(JsonFormatter())
+        # 每次运行从新文件开始，保留最近 LOG_BACKUP_COUNT 份（<job>.jsonl.1 为上一次）
+        if os.path.getsize(file_handler.baseFilename):
+            file_handler.doRollover()
+        handlers.append(file_handler)
+    except OSError as e:
+        console.handle(logging.makeLogRecord({
+            'levelno': logging.WARNING, 'levelname': 'WARNING', 'msg': f"File logging disabled: {e}"
+        }))
+
+    _queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=Config.LOG_QUEUE_SIZE))
+    _queue_handler.addFilter(DebugSampler(Config.LOG_SAMPLE_FIRST, Config.LOG_SAMPLE_EVERY))
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+    _listener = _Listener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """写出队列中剩余的日志并关闭文件（进程退出时自动调用）"""
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    if _queue_handler.dropped:
+        _queue_handler.queue.put(logging.makeLogRecord({
+            'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+            'msg': f"{_queue_handler.dropped} log records dropped (queue full)",
+        }))
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
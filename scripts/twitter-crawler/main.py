@@ -4,195 +4,267 @@ Twitter Prompt Crawler
 从 Twitter 创作者获取 AI 图像提示词并入库
 """
 
+import argparse
+import asyncio
 import logging
-from typing import List, Optional
+import threading
+from typing import List
 from config import Config
-from crawler import TwitterCrawler, Tweet
-from ai import create_analyzer
+from crawler import TwitterCrawler, Tweet, QuotaExhaustedError
+from crawler.watermark import TweetWatermark
+from crawler.ledger import (
+    STAGE_PARSE, STAGE_ANALYSIS, STAGE_INGEST,
+    OUTCOME_NO_IMAGES, OUTCOME_AMBIGUOUS, OUTCOME_DUPLICATE, OUTCOME_ERROR,
+    analysis_outcome, ingest_outcome,
+)
+from ai import create_analyzer, AnalyzerPool, is_ambiguous
 from api import BotApiClient
+from api.client import Creator
+from components import CrawlComponents, new_stats, log_summary
+from engine import crawl_creators
+from logsetup import setup_logging
+from metrics import export_run
+from profiling import profile_run
+from pipeline import Stage, StagePipeline, timeline_pages, boundary_stage, media_stage, image_hash_stage
 
-# 配置日志
-logging.basicConfig(
-    level=logging.DEBUG if Config.DEBUG else logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 # 每个用户最多翻页数（防止无限循环）
 MAX_PAGES_PER_USER = 5
 
 
-def fetch_all_new_tweets(
-    crawler: TwitterCrawler,
-    username: str,
-    since_id: Optional[str] = None
-) -> List[Tweet]:
-    """获取用户所有新推文（支持分页），直到遇到 since_id 或达到上限"""
-    all_tweets = []
-    cursor = None
+def process_creator(creator: Creator, crawler, analyzer, api, ledger, prefilter, stats: dict, dedupe=None,
+                    media=None, image_index=None):
+    """流式处理单个创作者：抓取 → 解析 → 过滤 → 分析 → 入库，各阶段并行"""
+    watermark = TweetWatermark(creator.last_tweet_id)
+    state = {'found': 0}
+    stop = threading.Event()
+
+    def filter_tweet(tweet: Tweet):
+        # 台账中已有结论的推文直接跳过
+        if ledger.should_skip(tweet.id):
+            return
+        # 只保留有图片的
+        if not tweet.image_urls:
+            ledger.record(tweet.id, STAGE_PARSE, OUTCOME_NO_IMAGES, creator.username)
+            return
+
+        stats['tweets_found'] += 1
+        state['found'] += 1
+
+        # 来源推文或原文已入库，不再分析
+        if dedupe and dedupe.is_known_tweet(tweet):
+            logger.debug("  Known duplicate tweet: %s", tweet.id)
+            ledger.record(tweet.id, STAGE_INGEST, OUTCOME_DUPLICATE, creator.username, 'known before analysis')
+            return
+
+        # 启发式预筛，明显无关的推文不调用 LLM
+        if prefilter and not prefilter.should_analyze(tweet):
+            logger.debug("  Pre-filter rejected tweet: %s", tweet.id)
+            return
+
+        yield tweet
+
+    def analyze(batch: List[Tweet]):
+        # AI 分析（多条推文合并为一次请求）
+        stats['tweets_analyzed'] += len(batch)
+        yield from zip(batch, analyzer.analyze_tweets(batch))
+
+    def store(tweet: Tweet, analysis):
+        if analysis.is_relevant and analysis.confidence >= Config.RELEVANCE_THRESHOLD:
+            # 额外检查：如果没有提取到 prompt，且原文也不像 prompt，则跳过
+            if is_ambiguous(analysis, tweet):
+                logger.info("  Skipped ambiguous tweet: %s", tweet.id)
+                ledger.record(tweet.id, STAGE_ANALYSIS, OUTCOME_AMBIGUOUS, creator.username)
+                return
+
+            stats['tweets_relevant'] += 1
+            logger.debug("  Relevant tweet found: %s", tweet.id)
+
+            prompt_text = analysis.extracted_prompt or tweet.text
+            if dedupe and dedupe.is_known_prompt(prompt_text):
+                logger.info("  Skipped known duplicate: %s", tweet.id)
+                ledger.record(tweet.id, STAGE_INGEST, OUTCOME_DUPLICATE, creator.username, 'known before ingest')
+                return
 
-    for page in range(MAX_PAGES_PER_USER):
-        logger.debug(f"  Fetching page {page + 1}...")
+            try:
+                # 调用 Bot API 入库
+                result = api.create_prompt(
+                    title=analysis.suggested_title or f"@{creator.username} 的提示词",
+                    prompt_text=prompt_text,
+                    image_urls=tweet.image_urls,
+                    author_name=creator.username,
+                    negative_prompt=analysis.extracted_negative_prompt,
+                    model=analysis.suggested_model,
+                    description=f"来源: {tweet.url}"
+                )
+                ledger.record(tweet.id, STAGE_INGEST, ingest_outcome(result), creator.username)
+                if dedupe and result.stored:
+                    dedupe.add(prompt_text, tweet.id)
+                if image_index and result.stored:
+                    image_index.add(tweet.id)
+
+                if result.success:
+                    stats['prompts_created'] += 1
+                    logger.info("  Created prompt: %s", result.prompt_id)
+
+                    # 更新成功计数
+                    api.update_creator_status(
+                        creator_id=creator.id,
+                        increment_success=True
+                    )
+                elif result.skipped:
+                    stats['duplicates_skipped'] += 1
+                    logger.info("  Skipped duplicate: %s", tweet.id)
+                else:
+                    # 图片处理失败等情况
+                    stats['images_failed'] += 1
+                    logger.warning("  Failed to create prompt: %s", result.error)
+                    if result.failed_urls:
+                        logger.warning("    Failed URLs: %s", result.failed_urls)
 
+            except Exception as e:
+                logger.error("  Failed to create prompt: %s", e)
+                stats['errors'] += 1
+                ledger.record(tweet.id, STAGE_INGEST, OUTCOME_ERROR, creator.username, str(e))
+        else:
+            logger.debug("  Skipped tweet %s: %s", tweet.id, analysis.reason)
+            ledger.record(
+                tweet.id, STAGE_ANALYSIS, analysis_outcome(analysis, False),
+                creator.username, analysis.reason
+            )
+
+    def ingest(item):
+        tweet, analysis = item
         try:
-            results, next_cursor = crawler.fetch_timeline_page(username, cursor)
-        except Exception as e:
-            logger.error(f"  Failed to fetch page {page + 1}: {e}")
-            break
-
-        if not results:
-            break
-
-        reached_since_id = False
-        for item in results:
-            tweet = crawler._parse_tweet(item, username)
-            if not tweet:
-                continue
-
-            # 增量检查：遇到已处理的推文就停止
-            if since_id and tweet.id <= since_id:
-                reached_since_id = True
-                break
-
-            # 只保留有图片的
-            if tweet.image_urls:
-                all_tweets.append(tweet)
-
-        if reached_since_id:
-            logger.debug(f"  Reached since_id at page {page + 1}")
-            break
-
-        cursor = next_cursor
-        if not cursor:
-            break
-
-    return all_tweets
-
-
-def main():
-    logger.info("Starting Twitter Prompt Crawler")
-    logger.info(f"Debug mode: {Config.DEBUG}")
-    logger.info(f"AI Provider: {Config.AI_PROVIDER}")
-
+            store(tweet, analysis)
+        finally:
+            # 已入库的图片哈希已由 add() 写入索引，其余情况丢弃暂存的哈希
+            if image_index:
+                image_index.discard(tweet.id)
+
+    # 增量检查：遇到已处理的推文（<= since_id）就停止翻页
+    reached_since_id = lambda tweet: watermark.reached(tweet.id)
+    analyze_batch = Config.ANALYZE_BATCH_SIZE * Config.ANALYZER_CONCURRENCY.get(analyzer.provider, 1)
+
+    stages = [
+        Stage('boundary', boundary_stage(stop, reached_since_id, watermark)),
+        Stage('filter', filter_tweet),
+    ]
+    if media:
+        stages.append(Stage(
+            'media', media_stage(media, ledger, creator.username),
+            batch_size=Config.MEDIA_CHECK_CONCURRENCY
+        ))
+    if image_index:
+        stages.append(Stage(
+            'image_hash', image_hash_stage(image_index, ledger, creator.username),
+            batch_size=Config.MEDIA_CHECK_CONCURRENCY
+        ))
+    stages += [
+        Stage('analyze', analyze, batch_size=analyze_batch, provider=analyzer.provider),
+        Stage('ingest', ingest),
+    ]
+
+    StagePipeline(
+        timeline_pages(crawler, creator.username, MAX_PAGES_PER_USER),
+        stages,
+        sync_source=True,
+        stop=stop,
+        creator=creator.username
+    ).run()
+    logger.info(f"  Found {state['found']} new tweets with images")
+
+    # 更新创作者状态
+    api.update_creator_status(
+        creator_id=creator.id,
+        last_tweet_id=watermark.value,
+        increment_fetch=True
+    )
+
+
+def crawl_sequential(stats: dict):
+    """逐个处理创作者（默认模式）"""
     # 初始化组件
     crawler = TwitterCrawler()
-    analyzer = create_analyzer()
+    analyzer = AnalyzerPool(create_analyzer())
     api = BotApiClient()
-
-    stats = {
-        'creators_processed': 0,
-        'tweets_found': 0,
-        'tweets_analyzed': 0,
-        'tweets_relevant': 0,
-        'prompts_created': 0,
-        'duplicates_skipped': 0,
-        'images_failed': 0,
-        'errors': 0
-    }
+    components = CrawlComponents.create()
 
     try:
         # 获取活跃创作者列表
         creators = api.get_active_creators()
         logger.info(f"Found {len(creators)} active creators")
+        crawler.warmup_user_ids([c.username for c in creators])
+        if components.dedupe:
+            try:
+                components.dedupe.refresh(api)
+            except Exception as e:
+                logger.warning(f"Duplicate filter refresh failed, using local data: {e}")
 
         for creator in creators:
             logger.info(f"Processing @{creator.username}")
             stats['creators_processed'] += 1
 
+            quota_exhausted = False
             try:
-                # 抓取所有新推文（分页）
-                tweets = fetch_all_new_tweets(
-                    crawler,
-                    username=creator.username,
-                    since_id=creator.last_tweet_id
-                )
-                stats['tweets_found'] += len(tweets)
-                logger.info(f"  Found {len(tweets)} new tweets with images")
-
-                latest_tweet_id = None
-
-                for tweet in tweets:
-                    stats['tweets_analyzed'] += 1
-
-                    # AI 分析
-                    analysis = analyzer.analyze_tweet(tweet)
-
-                    if analysis.is_relevant and analysis.confidence >= Config.RELEVANCE_THRESHOLD:
-                        # 额外检查：如果没有提取到 prompt，且原文也不像 prompt，则跳过
-                        if not analysis.extracted_prompt and not any(kw in tweet.text.lower() for kw in ['--', 'prompt', 'negative', 'artstation', 'detailed']):
-                            logger.info(f"  Skipped ambiguous tweet: {tweet.id}")
-                            continue
-
-                        stats['tweets_relevant'] += 1
-                        logger.info(f"  Relevant tweet found: {tweet.id}")
-
-                        try:
-                            # 调用 Bot API 入库
-                            result = api.create_prompt(
-                                title=analysis.suggested_title or f"@{creator.username} 的提示词",
-                                prompt_text=analysis.extracted_prompt or tweet.text,
-                                image_urls=tweet.image_urls,
-                                author_name=creator.username,
-                                negative_prompt=analysis.extracted_negative_prompt,
-                                model=analysis.suggested_model,
-                                description=f"来源: {tweet.url}"
-                            )
-                            
-                            if result.success:
-                                stats['prompts_created'] += 1
-                                logger.info(f"  Created prompt: {result.prompt_id}")
-                                
-                                # 更新成功计数
-                                api.update_creator_status(
-                                    creator_id=creator.id,
-                                    increment_success=True
-                                )
-                            elif result.skipped:
-                                stats['duplicates_skipped'] += 1
-                                logger.info(f"  Skipped duplicate: {tweet.id}")
-                            else:
-                                # 图片处理失败等情况
-                                stats['images_failed'] += 1
-                                logger.warning(f"  Failed to create prompt: {result.error}")
-                                if result.failed_urls:
-                                    logger.warning(f"    Failed URLs: {result.failed_urls}")
-                                    
-                        except Exception as e:
-                            logger.error(f"  Failed to create prompt: {e}")
-                            stats['errors'] += 1
-                    else:
-                        logger.debug(f"  Skipped tweet {tweet.id}: {analysis.reason}")
-
-                    # 记录最新推文 ID
-                    if not latest_tweet_id or tweet.id > latest_tweet_id:
-                        latest_tweet_id = tweet.id
-
-                # 更新创作者状态
-                api.update_creator_status(
-                    creator_id=creator.id,
-                    last_tweet_id=latest_tweet_id,
-                    increment_fetch=True
-                )
-
+                process_creator(creator, crawler, analyzer, api, stats=stats, **components.kwargs())
+            except QuotaExhaustedError as e:
+                logger.error(f"Twitter API quota exhausted, stopping crawl: {e}")
+                stats['errors'] += 1
+                quota_exhausted = True
             except Exception as e:
                 logger.error(f"Error processing @{creator.username}: {e}")
                 stats['errors'] += 1
 
+            # 状态更新已在内存中合并，每个创作者只发一次 PATCH（STATUS_FLUSH=run 时在 api.close() 统一发送）
+            if Config.STATUS_FLUSH == 'creator':
+                try:
+                    api.flush_creator_status(creator.id)
+                except Exception as e:
+                    logger.error(f"Failed to update status for @{creator.username}: {e}")
+
+            if quota_exhausted:
+                break
+
     finally:
+        components.collect_stats(stats, analyzer)
         crawler.close()
         api.close()
+        components.close()
+        analyzer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Twitter Prompt Crawler')
+    parser.add_argument(
+        '--concurrency', type=int, default=Config.CRAWL_CONCURRENCY,
+        help=f'同时处理的创作者数，>1 时使用 asyncio 引擎 (default: {Config.CRAWL_CONCURRENCY})'
+    )
+    parser.add_argument(
+        '--profile', action='store_true', default=Config.PROFILE_ENABLED,
+        help='采集 CPU / 墙钟剖析和各阶段、各创作者的内存峰值，写入 logs/'
+    )
+    args = parser.parse_args()
+    setup_logging('main')
+
+    logger.info("Starting Twitter Prompt Crawler")
+    logger.info(f"Debug mode: {Config.DEBUG}")
+    logger.info(f"AI Provider: {Config.AI_PROVIDER}")
+
+    stats = new_stats()
+
+    with profile_run('main', args.profile):
+        if args.concurrency > 1:
+            asyncio.run(crawl_creators(stats, args.concurrency))
+        else:
+            crawl_sequential(stats)
 
     # 输出统计
-    logger.info("=" * 50)
-    logger.info("Crawl completed!")
-    logger.info(f"  Creators processed: {stats['creators_processed']}")
-    logger.info(f"  Tweets found: {stats['tweets_found']}")
-    logger.info(f"  Tweets analyzed: {stats['tweets_analyzed']}")
-    logger.info(f"  Relevant tweets: {stats['tweets_relevant']}")
-    logger.info(f"  Prompts created: {stats['prompts_created']}")
-    logger.info(f"  Duplicates skipped: {stats['duplicates_skipped']}")
-    logger.info(f"  Images failed: {stats['images_failed']}")
-    logger.info(f"  Errors: {stats['errors']}")
+    log_summary(stats, "Crawl completed!")
+
+    # 各阶段耗时 / 统计写出到 logs/main.prom 和 logs/main.json
+    export_run('main', stats)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,337 @@
+"""
+运行指标：计数器、仪表和延迟直方图
+
+各阶段（fetch、parse、filter、图片预检、analyze、ingest 等）的耗时按 stage / creator / provider
+标签记入直方图，运行结束时 export() 写出 Prometheus textfile (<job>.prom，可由 node_exporter
+textfile collector 采集) 和 JSON 摘要 (<job>.json，含各阶段 p50/p95/p99 和按创作者汇总的耗时)。
+
+所有指标线程安全，流水线各阶段线程和 asyncio 引擎可直接共用模块级的 REGISTRY。
+"""
+
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Sequence, Tuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 延迟直方图的桶上界（秒），覆盖从本地解析到 LLM 批量分析
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, object] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        unknown = set(labels) - set(self.labelnames)
+        if unknown:
+            raise ValueError(f"Unknown labels for {self.name}: {sorted(unknown)}")
+        return tuple(str(labels.get(name) or '') for name in self.labelnames)
+
+    def samples(self) -> Dict[tuple, object]:
+        with self._lock:
+            return dict(self._values)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class _Series:
+    __slots__ = ('buckets', 'count', 'sum', 'max')
+
+    def __init__(self, size: int):
+        self.buckets = [0] * size  # 非累计，最后一个为 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.bounds = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = _Series(len(self.bounds) + 1)
+            series.buckets[index] += 1
+            series.count += 1
+            series.sum += value
+            series.max = max(series.max, value)
+
+    @contextmanager
+    def time(self, **labels):
+        """统计 with 块的耗时（出现异常时同样记录）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def merged(self, series_list) -> Optional[_Series]:
+        """把多个标签组合的数据合并成一个（用于按单个标签汇总）"""
+        merged = None
+        for series in series_list:
+            if merged is None:
+                merged = _Series(len(self.bounds) + 1)
+            merged.buckets = [a + b for a, b in zip(merged.buckets, series.buckets)]
+            merged.count += series.count
+            merged.sum += series.sum
+            merged.max = max(merged.max, series.max)
+        return merged
+
+    def quantile(self, series: _Series, q: float) -> float:
+        """按桶内线性插值估算分位数（与 Prometheus histogram_quantile 相同的做法）"""
+        if not series.count:
+            return 0.0
+        rank = q * series.count
+        seen = 0
+        for index, count in enumerate(series.buckets):
+            if count and seen + count >= rank:
+                lower = self.bounds[index - 1] if index > 0 else 0.0
+                # 落在 +Inf 桶或超出实际最大值时以最大值为上界
+                upper = self.bounds[index] if index < len(self.bounds) else series.max
+                upper = min(upper, series.max)
+                lower = min(lower, upper)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return series.max
+
+    def describe(self, series: _Series) -> dict:
+        return {
+            'count': series.count,
+            'sum': round(series.sum, 6),
+            'mean': round(series.sum / series.count, 6) if series.count else 0.0,
+            'p50': round(self.quantile(series, 0.5), 6),
+            'p95': round(self.quantile(series, 0.95), 6),
+            'p99': round(self.quantile(series, 0.99), 6),
+            'max': round(series.max, 6),
+        }
+
+
+class MetricsRegistry:
+    """指标注册表；counter / gauge / histogram 按名称取已有指标，不存在时创建"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self.started_at = time.time()
+
+    def _get(self, cls, name: str, help: str, labelnames: Sequence[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} already registered with a different type or labels")
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get(Gauge, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, labelnames, buckets=buckets)
+
+    def metrics(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    def to_prometheus(self, const_labels: Optional[dict] = None) -> str:
+        """Prometheus 文本格式；const_labels 附加到每个样本（如 script="main"）"""
+        const = tuple((const_labels or {}).items())
+        lines = []
+        for metric in self.metrics():
+            samples = metric.samples()
+            if not samples:
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for key, value in sorted(samples.items()):
+                pairs = const + tuple(zip(metric.labelnames, key))
+                if metric.kind != 'histogram':
+                    lines.append(f"{metric.name}{_format_labels(pairs)} {_format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.bounds + (float('inf'),), value.buckets):
+                    cumulative += count
+                    le = pairs + (('le', _format_value(bound)),)
+                    lines.append(f"{metric.name}_bucket{_format_labels(le)} {cumulative}")
+                lines.append(f"{metric.name}_sum{_format_labels(pairs)} {_format_value(round(value.sum, 6))}")
+                lines.append(f"{metric.name}_count{_format_labels(pairs)} {value.count}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> dict:
+        """
+        JSON 摘要：无标签的计数器 / 仪表直接给值，有标签的给出总计和按各标签的汇总；
+        直方图给出总体和按各标签汇总的 count / sum / p50 / p95 / p99 / max
+        """
+        result = {'counters': {}, 'gauges': {}, 'histograms': {}}
+        for metric in self.metrics():
+            samples = metric.samples()
+            if not samples:
+                continue
+            if metric.kind == 'histogram':
+                entry = {'total': metric.describe(metric.merged(samples.values()))}
+                for position, label in enumerate(metric.labelnames):
+                    groups: Dict[str, list] = {}
+                    for key, series in samples.items():
+                        groups.setdefault(key[position], []).append(series)
+                    entry[f'by_{label}'] = {
+                        value: metric.describe(metric.merged(group))
+                        for value, group in sorted(groups.items()) if value
+                    }
+                result['histograms'][metric.name] = entry
+                continue
+
+            section = result['counters' if metric.kind == 'counter' else 'gauges']
+            if not metric.labelnames:
+                section[metric.name] = samples.get((), 0)
+                continue
+            entry = {'total': sum(samples.values())}
+            for position, label in enumerate(metric.labelnames):
+                totals: Dict[str, float] = {}
+                for key, value in samples.items():
+                    if key[position]:
+                        totals[key[position]] = totals.get(key[position], 0) + value
+                entry[f'by_{label}'] = dict(sorted(totals.items()))
+            section[metric.name] = entry
+        return result
+
+    def export(self, job: str, directory: str = None) -> Tuple[str, str]:
+        """写出 <directory>/<job>.prom 和 <job>.json（先写临时文件再替换，采集方不会读到半个文件）"""
+        directory = directory or Config.METRICS_DIR
+        os.makedirs(directory, exist_ok=True)
+        finished_at = time.time()
+        RUN_DURATION.set(finished_at - self.started_at)
+        RUN_FINISHED.set(finished_at)
+
+        prom_path = os.path.join(directory, f"{job}.prom")
+        json_path = os.path.join(directory, f"{job}.json")
+        summary = {
+            'job': job,
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(self.started_at)),
+            'duration_seconds': round(finished_at - self.started_at, 3),
+            **self.summary(),
+        }
+        for path, content in (
+            (prom_path, self.to_prometheus({'script': job})),
+            (json_path, json.dumps(summary, ensure_ascii=False, indent=2)),
+        ):
+            tmp = f"{path}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp, path)
+        return prom_path, json_path
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'crawler_stage_seconds', 'Time spent in each processing stage',
+    ('stage', 'creator', 'provider')
+)
+STAGE_ITEMS = REGISTRY.counter(
+    'crawler_stage_items_total', 'Items handed to each processing stage',
+    ('stage', 'creator', 'provider')
+)
+STAGE_ERRORS = REGISTRY.counter(
+    'crawler_stage_errors_total', 'Processing stage failures',
+    ('stage', 'creator', 'provider')
+)
+RATE_LIMIT_WAIT = REGISTRY.histogram(
+    'crawler_rate_limit_wait_seconds', 'Time requests waited on the twitter241 rate limiter'
+)
+# 正在执行的阶段数；不导出（运行结束时恒为 0），供 profiling 按阶段 / 创作者采样内存峰值
+ACTIVE_STAGES = Gauge('crawler_stage_in_progress', 'Stages currently running', ('stage', 'creator'))
+RUN_DURATION = REGISTRY.gauge('crawler_run_duration_seconds', 'Wall-clock duration of the run')
+RUN_FINISHED = REGISTRY.gauge('crawler_run_finished_timestamp_seconds', 'Unix time the run finished')
+
+
+@contextmanager
+def stage_timer(stage: str, creator: str = '', provider: str = ''):
+    """统计一个阶段的耗时，执行期间计入 ACTIVE_STAGES"""
+    ACTIVE_STAGES.inc(stage=stage, creator=creator)
+    try:
+        with STAGE_SECONDS.time(stage=stage, creator=creator, provider=provider):
+            yield
+    finally:
+        ACTIVE_STAGES.inc(-1, stage=stage, creator=creator)
+
+
+def record_stats(stats: dict):
+    """把运行结束时的统计字典记为计数器 crawler_<key>_total"""
+    for key, value in stats.items():
+        if isinstance(value, (int, float)):
+            REGISTRY.counter(f"crawler_{key}_total", key.replace('_', ' ').capitalize()).inc(value)
+
+
+def export_run(job: str, stats: Optional[dict] = None):
+    """运行结束时导出指标；写文件失败只记日志，不影响运行结果"""
+    if stats:
+        record_stats(stats)
+    try:
+        prom_path, json_path = REGISTRY.export(job)
+        logger.info(f"Metrics written to {prom_path} and {json_path}")
+    except OSError as e:
+        logger.warning(f"Failed to write metrics: {e}")
@@ -0,0 +1,300 @@
+"""
+流式处理流水线
+page fetch → 边界检查 → filter → analyze → create_prompt 各阶段运行在独立线程中，
+阶段之间用有界队列连接：下游处理慢时上游 put 阻塞（背压），
+因此第 N 页在分析时第 N+1 页已经在下载，内存占用与翻页数无关。
+各阶段的处理耗时（不含等待上下游队列的时间）记入 metrics.STAGE_SECONDS。
+"""
+
+import functools
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional
+
+from config import Config
+from crawler import TwitterCrawler, Tweet, CrawlLedger, MediaValidator, ImageHashIndex, QuotaExhaustedError
+from crawler.ledger import STAGE_PARSE, STAGE_INGEST, OUTCOME_IMAGES_FAILED, OUTCOME_DUPLICATE
+from crawler.watermark import TweetWatermark
+from metrics import STAGE_SECONDS, STAGE_ITEMS, STAGE_ERRORS, ACTIVE_STAGES
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    name: str
+    # 处理函数：输入一个元素（batch_size > 1 时为列表），返回/产出 0..n 个下游元素
+    fn: Callable[..., Optional[Iterable]]
+    # >1 时把队列中已就绪的元素攒成一批（最多 batch_size 个）再调用 fn
+    batch_size: int = 1
+    # 指标标签：调用 LLM 的阶段填写 analyzer.provider
+    provider: str = ''
+
+
+@dataclass
+class Marker:
+    """
+    随数据流传递的标记，各阶段原样转发而不交给 fn 处理
+
+    各阶段都是单线程 FIFO，标记流出最后一个阶段时，它之前的元素一定已全部处理完，
+    此时调用 callback（流水线出错停止后不再调用）。用于记录 backfill 断点。
+    """
+    callback: Callable[[], None]
+
+
+class StagePipeline:
+    """
+    由一个数据源和若干 Stage 组成的线程流水线
+
+    source(stop) 是生成器函数，stop 为 threading.Event，任何阶段都可以 set 它来提前结束抓取。
+    creator 为该流水线处理的创作者，作为各阶段指标的标签。
+    sync_source=True 时，数据源每产出一个元素都会等第一个阶段处理完再继续，
+    这样翻页前能先看到上一页是否已经触及 since_id / 日期边界，不会多抓一页。
+    任一阶段抛出异常时流水线停止，run() 在所有线程结束后重新抛出该异常。
+    """
+
+    def __init__(
+        self,
+        source: Callable[[threading.Event], Iterable],
+        stages: List[Stage],
+        queue_size: int = Config.PIPELINE_QUEUE_SIZE,
+        sync_source: bool = False,
+        stop: Optional[threading.Event] = None,
+        creator: str = ''
+    ):
+        self.source = source
+        self.stages = stages
+        self.queue_size = queue_size
+        self.sync_source = sync_source
+        self.stop = stop or threading.Event()
+        self.creator = creator
+        self._error: Optional[BaseException] = None
+        self._error_lock = threading.Lock()
+
+    def _fail(self, e: BaseException):
+        with self._error_lock:
+            if self._error is None:
+                self._error = e
+        self.stop.set()
+
+    def _run_source(self, out: queue.Queue):
+        try:
+            for item in self.source(self.stop):
+                if self._error is not None:
+                    break
+                out.put(item)
+                if self.sync_source:
+                    out.join()
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            out.put(_DONE)
+
+    def _take_batch(self, inbox: queue.Queue, first, batch_size: int):
+        """取一个元素后，非阻塞地继续取已就绪的元素凑成一批；遇到结束标记或 Marker 时一并返回"""
+        batch = [first]
+        done = False
+        marker = None
+        while len(batch) < batch_size:
+            try:
+                item = inbox.get_nowait()
+            except queue.Empty:
+                break
+            if item is _DONE:
+                inbox.task_done()
+                done = True
+                break
+            if isinstance(item, Marker):
+                marker = item
+                break
+            batch.append(item)
+        return batch, done, marker
+
+    def _pass_marker(self, marker: Marker, inbox: queue.Queue, out: Optional[queue.Queue]):
+        try:
+            if out is not None:
+                out.put(marker)
+            elif self._error is None:
+                marker.callback()
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            inbox.task_done()
+
+    def _process(self, stage: Stage, item, count: int, out: Optional[queue.Queue]):
+        """调用 fn 并向下游转发结果；只统计 fn 自身的耗时，不含 out.put 因背压阻塞的时间"""
+        labels = {'stage': stage.name, 'creator': self.creator, 'provider': stage.provider}
+        STAGE_ITEMS.inc(count, **labels)
+        ACTIVE_STAGES.inc(stage=stage.name, creator=self.creator)
+        busy = 0.0
+        start = time.perf_counter()
+        try:
+            for result in stage.fn(item) or ():
+                busy += time.perf_counter() - start
+                if out is not None:
+                    out.put(result)
+                start = time.perf_counter()
+            busy += time.perf_counter() - start
+        except BaseException:
+            busy += time.perf_counter() - start
+            STAGE_ERRORS.inc(**labels)
+            raise
+        finally:
+            STAGE_SECONDS.observe(busy, **labels)
+            ACTIVE_STAGES.inc(-1, stage=stage.name, creator=self.creator)
+
+    def _run_stage(self, stage: Stage, inbox: queue.Queue, out: Optional[queue.Queue]):
+        done = False
+        while not done:
+            item = inbox.get()
+            if item is _DONE:
+                inbox.task_done()
+                break
+            if isinstance(item, Marker):
+                self._pass_marker(item, inbox, out)
+                continue
+
+            marker = None
+            if stage.batch_size > 1:
+                item, done, marker = self._take_batch(inbox, item, stage.batch_size)
+            count = len(item) if stage.batch_size > 1 else 1
+
+            try:
+                # 出错后继续消费输入（不处理），保证上游不会一直阻塞在 put 上
+                if self._error is None:
+                    self._process(stage, item, count, out)
+            except BaseException as e:
+                logger.error(f"  Pipeline stage '{stage.name}' failed: {e}")
+                self._fail(e)
+            finally:
+                for _ in range(count):
+                    inbox.task_done()
+            if marker is not None:
+                self._pass_marker(marker, inbox, out)
+
+        if out is not None:
+            out.put(_DONE)
+
+    def run(self):
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads = [threading.Thread(target=self._run_source, args=(queues[0],), name='pipeline-source')]
+        for index, stage in enumerate(self.stages):
+            out = queues[index + 1] if index + 1 < len(queues) else None
+            threads.append(threading.Thread(
+                target=self._run_stage,
+                args=(stage, queues[index], out),
+                name=f'pipeline-{stage.name}'
+            ))
+
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except BaseException as e:
+            # KeyboardInterrupt / SIGTERM：通知各阶段停止，等正在处理的元素结束后再退出
+            self._fail(e)
+            for thread in threads:
+                thread.join()
+
+        if self._error is not None:
+            raise self._error
+
+
+def timeline_pages(
+    crawler: TwitterCrawler,
+    username: str,
+    max_pages: int,
+    cursor: Optional[str] = None,
+    on_page: Optional[Callable[[Optional[str], int], None]] = None,
+    raise_on_error: bool = False
+):
+    """
+    数据源：逐页抓取 timeline，产出每页解析好的 Tweet 列表
+
+    cursor 为起始游标（断点续抓）。on_page(next_cursor, pages) 在一页的推文全部处理完后调用。
+    某页重试后仍失败时默认停止翻页、正常结束；raise_on_error=True 时抛出异常，
+    由调用方把该创作者记为失败（backfill 保留断点游标供 --resume 续抓）。
+    """
+
+    def source(stop: threading.Event):
+        nonlocal cursor
+        for page in range(max_pages):
+            if stop.is_set():
+                break
+            logger.debug("  Fetching page %d...", page + 1)
+
+            try:
+                timeline = crawler.fetch_timeline(username, cursor)
+            except QuotaExhaustedError:
+                # 交给入口脚本停止整个抓取
+                raise
+            except Exception as e:
+                logger.error(f"  Failed to fetch page {page + 1}: {e}")
+                if raise_on_error:
+                    raise
+                break
+
+            if not timeline.entries:
+                break
+
+            yield timeline.tweets
+
+            cursor = timeline.cursor
+            if on_page is not None:
+                yield Marker(functools.partial(on_page, cursor, page + 1))
+            if not cursor:
+                break
+
+    return source
+
+
+def boundary_stage(
+    stop: threading.Event,
+    reached_end: Callable[[Tweet], bool],
+    watermark: Optional[TweetWatermark] = None
+):
+    """逐条放行一页推文；遇到 reached_end 为真的推文（已处理过/超出日期范围）时停止翻页"""
+
+    def check(tweets: List[Tweet]):
+        for tweet in tweets:
+            if reached_end(tweet):
+                stop.set()
+                return
+            # 水位线推进到每一条看到的推文，而不只是进入分析的
+            if watermark is not None:
+                watermark.advance(tweet.id)
+            yield tweet
+
+    return check
+
+
+def media_stage(media: MediaValidator, ledger: CrawlLedger, username: str):
+    """批量并发预检图片 URL；图片全部失效的推文记入台账，不再进入分析和入库"""
+
+    def check(batch: List[Tweet]):
+        live, dead = media.filter_tweets(batch)
+        for tweet in dead:
+            logger.debug("  Dropped tweet with dead media: %s", tweet.id)
+            ledger.record(tweet.id, STAGE_PARSE, OUTCOME_IMAGES_FAILED, username, 'dead media')
+        yield from live
+
+    return check
+
+
+def image_hash_stage(index: ImageHashIndex, ledger: CrawlLedger, username: str):
+    """批量计算图片感知哈希；图片全部已入库过的推文记为重复，不再进入分析和入库"""
+
+    def check(batch: List[Tweet]):
+        live, dropped = index.filter_tweets(batch)
+        for tweet, match in dropped:
+            logger.debug("  Dropped tweet with known images: %s (similar to %s)", tweet.id, match)
+            ledger.record(tweet.id, STAGE_INGEST, OUTCOME_DUPLICATE, username, f'similar image to {match}')
+        yield from live
+
+    return check
@@ -0,0 +1,263 @@
+"""
+运行剖析 (main.py / backfill.py / history.py --profile)
+
+开启后在运行期间同时采集：
+- CPU 剖析：每个线程各自的 cProfile，计时器为线程 CPU 时间 (time.thread_time)，
+  只反映真正消耗 CPU 的函数（JSON 解析、哈希计算等）。
+  Python 3.12+ 的 cProfile 基于 sys.monitoring，同一时刻只能启用一个且会采集所有线程，
+  因此改为只启用一个、以墙钟时间计时的 cProfile
+- 墙钟剖析：后台线程定时对所有线程采样调用栈，sleep / 网络等待 / 队列阻塞同样计入，
+  能看出时间花在 tenacity 重试等待、限流器 sleep 还是等 LLM 响应上
+- 内存峰值：tracemalloc 记录的 Python 分配量，随墙钟采样一起按正在执行的阶段
+  (metrics.ACTIVE_STAGES) 归入各阶段和各创作者；同时运行的阶段共享同一次采样
+
+结束时写出到 Config.LOG_DIR：
+  <job>-cpu.prof     所有线程合并的 pstats 文件（snakeviz / python -m pstats 查看）
+  <job>-cpu.txt      按自身耗时和累计耗时排序的前若干个函数
+  <job>-wall.folded  折叠调用栈（首帧为线程名），可直接用 flamegraph.pl / speedscope 打开
+  <job>-wall.txt     各线程采样占比和耗时最多的调用点
+  <job>-memory.json  整体 / 各阶段 / 各创作者的内存峰值，以及结束时占用最多的分配位置
+
+asyncio 引擎在单线程中运行，等待中的协程不在调用栈上，墙钟剖析里表现为事件循环的 select。
+剖析会明显拖慢运行（主要是 tracemalloc），只用于排查。
+"""
+
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # 可选依赖（Windows 没有）
+    resource = None
+
+from config import Config
+from metrics import ACTIVE_STAGES
+
+logger = logging.getLogger(__name__)
+
+_MB = 1024 * 1024
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Python 3.12 之前 cProfile 只采集启用它的线程，需要每个线程各启用一个
+_PER_THREAD_CPROFILE = sys.version_info < (3, 12)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class RunProfiler:
+    """一次运行的剖析会话；start() / stop() 之间的所有线程都会被采集"""
+
+    def __init__(self, job: str, directory: Optional[str] = None, interval: float = Config.PROFILE_INTERVAL):
+        self.job = job
+        self.directory = directory or Config.LOG_DIR
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.thread_samples: Counter = Counter()
+        self.leaves: Counter = Counter()  # (线程, 叶子帧 <- 最近的本项目帧) -> 采样数
+        self.stage_peaks: Dict[str, int] = {}
+        self.creator_peaks: Dict[str, int] = {}
+        self.samples = 0
+        self._profiles: List[cProfile.Profile] = []
+        self._profiles_lock = threading.Lock()
+        self._main_profile: Optional[cProfile.Profile] = None
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._started_at = 0.0
+        self._cpu_started_at = 0.0
+
+    def _thread_hook(self, frame, event, arg):
+        """threading.setprofile 钩子：新线程第一次调用时换成该线程自己的 cProfile"""
+        profile = cProfile.Profile(time.thread_time)
+        try:
+            profile.enable()
+        except ValueError:
+            # 已有其他剖析工具在运行：该线程只参与墙钟采样，不能让异常中断线程
+            sys.setprofile(None)
+            return
+        with self._profiles_lock:
+            self._profiles.append(profile)
+
+    def start(self):
+        tracemalloc.start()
+        self._started_at = time.perf_counter()
+        self._cpu_started_at = time.process_time()
+
+        # 采样线程先于钩子启动，不会被 cProfile 采集
+        self._sampler = threading.Thread(target=self._sample_loop, name='profiler-sampler', daemon=True)
+        self._sampler.start()
+        if _PER_THREAD_CPROFILE:
+            threading.setprofile(self._thread_hook)
+        profile = cProfile.Profile(time.thread_time if _PER_THREAD_CPROFILE else time.perf_counter)
+        try:
+            profile.enable()
+        except ValueError as e:
+            logger.warning(f"CPU profiling disabled: {e}")
+        else:
+            self._main_profile = profile
+            self._profiles.append(profile)
+        logger.info(f"Profiling enabled, artifacts will be written to {self.directory}")
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self._sample(own)
+
+    def _sample(self, own: int):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            caller = None
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                if caller is None and frame.f_code.co_filename.startswith(_PROJECT_DIR):
+                    caller = stack[-1]
+                frame = frame.f_back
+            thread = names.get(ident, f'thread-{ident}')
+            leaf = stack[0] if stack else '(idle)'
+            if caller is not None and caller != leaf:
+                leaf = f"{leaf} <- {caller}"
+            stack.append(thread)
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.thread_samples[thread] += 1
+            self.leaves[(thread, leaf)] += 1
+        self.samples += 1
+
+        current = tracemalloc.get_traced_memory()[0]
+        for (stage, creator), running in ACTIVE_STAGES.samples().items():
+            if running <= 0:
+                continue
+            self.stage_peaks[stage] = max(self.stage_peaks.get(stage, 0), current)
+            if creator:
+                self.creator_peaks[creator] = max(self.creator_peaks.get(creator, 0), current)
+
+    def stop(self):
+        """停止采集并写出结果；写文件失败只记日志"""
+        if self._main_profile is not None:
+            self._main_profile.disable()
+        threading.setprofile(None)
+        self._stop.set()
+        self._sampler.join()
+        wall = time.perf_counter() - self._started_at
+        cpu = time.process_time() - self._cpu_started_at
+
+        peak = tracemalloc.get_traced_memory()[1]
+        # 排除剖析自身的采样数据和模块导入
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+        ])
+        top_allocations = snapshot.statistics('lineno')[:20]
+        tracemalloc.stop()
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self._write_cpu()
+            self._write_wall(wall, cpu)
+            self._write_memory(peak, top_allocations)
+        except OSError as e:
+            logger.warning(f"Failed to write profile: {e}")
+            return
+        logger.info(
+            f"Profile written to {self.directory} ({self.job}-*): "
+            f"wall {wall:.1f}s, CPU {cpu:.1f}s, peak traced memory {peak / _MB:.1f} MB"
+        )
+
+    def _path(self, suffix: str) -> str:
+        return os.path.join(self.directory, f"{self.job}-{suffix}")
+
+    def _write_cpu(self):
+        with self._profiles_lock:
+            profiles = list(self._profiles)
+        # 其他线程的 cProfile 由各自线程启用，这里只取快照（create_stats 只会关闭当前线程的剖析）
+        out = io.StringIO()
+        stats = pstats.Stats(stream=out)
+        collected = 0
+        for profile in profiles:
+            try:
+                stats.add(profile)
+            except TypeError:
+                # 没有采集到任何调用
+                continue
+            collected += 1
+        stats.dump_stats(self._path('cpu.prof'))
+
+        if _PER_THREAD_CPROFILE:
+            out.write(f"CPU profile of {collected} threads (thread CPU time)\n\n")
+        else:
+            out.write("Profile of all threads (wall time; Python 3.12+ allows a single cProfile per process)\n\n")
+        stats.sort_stats('tottime').print_stats(40)
+        stats.sort_stats('cumulative').print_stats(40)
+        with open(self._path('cpu.txt'), 'w', encoding='utf-8') as f:
+            f.write(out.getvalue())
+
+    def _write_wall(self, wall: float, cpu: float):
+        with open(self._path('wall.folded'), 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+        # 按线程列出叶子帧（正在执行 / 阻塞的位置）及调用它的本项目代码
+        leaves: Dict[str, Counter] = {}
+        for (thread, leaf), count in self.leaves.items():
+            leaves.setdefault(thread, Counter())[leaf] = count
+
+        lines = [
+            f"Wall-clock profile: {wall:.2f}s wall, {cpu:.2f}s CPU, "
+            f"{self.samples} samples (every {self.interval * 1000:.0f}ms when the GIL allows)",
+            '',
+        ]
+        for thread, samples in self.thread_samples.most_common():
+            lines.append(f"[{thread}] {samples} samples ({samples / max(self.samples, 1):.0%} of the run)")
+            for leaf, count in leaves.get(thread, Counter()).most_common(10):
+                lines.append(f"  {count / samples:6.1%}  {leaf}")
+            lines.append('')
+        with open(self._path('wall.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines))
+
+    def _write_memory(self, peak: int, top_allocations):
+        rss = None
+        if resource is not None:
+            # Linux 上 ru_maxrss 单位为 KB
+            rss = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        report = {
+            'job': self.job,
+            'peak_traced_mb': round(peak / _MB, 2),
+            'max_rss_mb': rss,
+            'stages': {k: round(v / _MB, 2) for k, v in sorted(self.stage_peaks.items())},
+            'creators': {k: round(v / _MB, 2) for k, v in sorted(self.creator_peaks.items(), key=lambda i: -i[1])},
+            'top_allocations_at_exit': [
+                {'location': str(stat.traceback), 'size_kb': round(stat.size / 1024, 1), 'count': stat.count}
+                for stat in top_allocations
+            ],
+        }
+        with open(self._path('memory.json'), 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+@contextmanager
+def _profiling(job: str):
+    profiler = RunProfiler(job)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+
+
+def profile_run(job: str, enabled: bool):
+    """入口脚本使用：enabled 为 False 时什么也不做"""
+    return _profiling(job) if enabled else nullcontext()
@@ -29,7 +29,62 @@ export async function GET(request: NextRequest) {
   }
 }
 
+interface CreatorStatusUpdate {
+  creator_id: string
+  last_tweet_id?: string
+  increment_fetch?: boolean
+  increment_success?: boolean
+  fetch_count?: number  // 合并后的抓取次数增量，优先于 increment_fetch
+  success_count?: number  // 合并后的成功次数增量，优先于 increment_success
+}
+
+// 应用单个创作者的状态更新，返回错误信息
+async function applyCreatorUpdate(
+  supabase: Awaited<ReturnType<typeof createAdminClient>>,
+  update: CreatorStatusUpdate
+): Promise<string | null> {
+  const { creator_id, last_tweet_id, increment_fetch, increment_success } = update
+
+  // 构建更新对象
+  const updates: Record<string, unknown> = {
+    last_fetched_at: new Date().toISOString(),
+  }
+
+  if (last_tweet_id) {
+    updates.last_tweet_id = last_tweet_id
+  }
+
+  // 更新基本字段
+  const { error: updateError } = await supabase
+    .from('twitter_creators')
+    .update(updates)
+    .eq('id', creator_id)
+
+  if (updateError) {
+    return updateError.message
+  }
+
+  // 使用 RPC 函数增加计数
+  const fetchCount = update.fetch_count ?? (increment_fetch ? 1 : 0)
+  const successCount = update.success_count ?? (increment_success ? 1 : 0)
+  if (fetchCount || successCount) {
+    const { error: rpcError } = await supabase.rpc('increment_creator_counts', {
+      p_creator_id: creator_id,
+      p_fetch_count: fetchCount,
+      p_success_count: successCount,
+    })
+
+    if (rpcError) {
+      console.error('RPC error:', rpcError)
+      // 不中断，计数失败不影响主流程
+    }
+  }
+
+  return null
+}
+
 // PATCH - 更新创作者抓取状态 (供爬虫使用)
+// 支持单条 { creator_id, ... } 或批量 { updates: [{ creator_id, ... }] }
 export async function PATCH(request: NextRequest) {
   try {
     const apiKey = request.headers.get('x-api-key')
@@ -38,48 +93,32 @@ export async function PATCH(request: NextRequest) {
     }
 
     const body = await request.json()
-    const { creator_id, last_tweet_id, increment_fetch, increment_success } = body
+    const isBatch = Array.isArray(body.updates)
+    const updates: CreatorStatusUpdate[] = isBatch ? body.updates : [body]
 
-    if (!creator_id) {
+    if (!updates.length || updates.some((u) => !u?.creator_id)) {
       return NextResponse.json({ error: 'creator_id is required' }, { status: 400 })
     }
 
     const supabase = await createAdminClient()
+    const errors = await Promise.all(updates.map((update) => applyCreatorUpdate(supabase, update)))
 
-    // 构建更新对象
-    const updates: Record<string, unknown> = {
-      last_fetched_at: new Date().toISOString(),
-    }
-
-    if (last_tweet_id) {
-      updates.last_tweet_id = last_tweet_id
-    }
-
-    // 更新基本字段
-    const { error: updateError } = await supabase
-      .from('twitter_creators')
-      .update(updates)
-      .eq('id', creator_id)
-
-    if (updateError) {
-      return NextResponse.json({ error: updateError.message }, { status: 500 })
-    }
-
-    // 使用 RPC 函数增加计数
-    if (increment_fetch || increment_success) {
-      const { error: rpcError } = await supabase.rpc('increment_creator_counts', {
-        p_creator_id: creator_id,
-        p_fetch_count: increment_fetch ? 1 : 0,
-        p_success_count: increment_success ? 1 : 0,
-      })
-
-      if (rpcError) {
-        console.error('RPC error:', rpcError)
-        // 不中断，计数失败不影响主流程
+    if (!isBatch) {
+      if (errors[0]) {
+        return NextResponse.json({ error: errors[0] }, { status: 500 })
       }
+      return NextResponse.json({ success: true })
     }
 
-    return NextResponse.json({ success: true })
+    const failed = updates
+      .map((update, index) => ({ creator_id: update.creator_id, error: errors[index] }))
+      .filter((r) => r.error)
+
+    return NextResponse.json({
+      success: failed.length === 0,
+      updated: updates.length - failed.length,
+      failed: failed.length > 0 ? failed : undefined,
+    }, { status: failed.length === updates.length ? 500 : 200 })
   } catch (error) {
     console.error('Bot update creator error:', error)
     return NextResponse.json({ error: 'Failed to update creator' }, { status: 500 })
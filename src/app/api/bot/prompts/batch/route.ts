@@ -0,0 +1,149 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { createAdminClient } from '@/lib/supabase/server'
+import { verifyBotApiKey } from '@/lib/utils/auth'
+import {
+  type BotPromptRequest,
+  type BotPromptResult,
+  validateBotPrompt,
+  isPromptExists,
+  isFailedRecordExists,
+  getTweetUrl,
+  duplicateResult,
+  previouslyFailedResult,
+  mapWithConcurrency,
+  processPromptImages,
+  getNextSortOrder,
+  savePrompt,
+  IMAGE_CONCURRENCY,
+} from '@/lib/utils/bot-prompt'
+
+// 单次请求最多提示词数
+const MAX_BATCH_SIZE = 50
+// 同时处理图片的提示词数（每条提示词内部再按 IMAGE_CONCURRENCY 并发）
+const PROMPT_CONCURRENCY = 4
+// 去重查询并发数
+const LOOKUP_CONCURRENCY = 8
+
+// 图片处理可能较慢，放宽函数执行时长
+export const maxDuration = 300
+
+// POST - 机器人批量创建提示词
+// 请求体: { prompts: BotPromptRequest[] }
+// 响应: { results: [{ index, status, ...单条接口的响应体 }], summary }
+export async function POST(request: NextRequest) {
+  try {
+    // 验证 API Key
+    const apiKey = request.headers.get('x-api-key')
+    if (!verifyBotApiKey(apiKey)) {
+      return NextResponse.json({ error: 'Invalid API key' }, { status: 401 })
+    }
+
+    const { prompts } = await request.json() as { prompts?: BotPromptRequest[] }
+
+    if (!Array.isArray(prompts) || prompts.length === 0) {
+      return NextResponse.json({ error: 'prompts is required (at least one)' }, { status: 400 })
+    }
+
+    if (prompts.length > MAX_BATCH_SIZE) {
+      return NextResponse.json({ error: `prompts cannot exceed ${MAX_BATCH_SIZE} items` }, { status: 400 })
+    }
+
+    const supabase = await createAdminClient()
+    const results: Array<BotPromptResult | null> = prompts.map(() => null)
+
+    // 校验必填字段
+    prompts.forEach((prompt, index) => {
+      const validationError = validateBotPrompt(prompt)
+      if (validationError) {
+        results[index] = { status: 400, body: { error: validationError } }
+      }
+    })
+
+    // 去重：库中已存在（并发查询）+ 本批次内重复
+    const pendingIndexes = () => prompts.map((_, i) => i).filter((i) => !results[i])
+    const candidates = pendingIndexes()
+    const exists = await mapWithConcurrency(candidates, LOOKUP_CONCURRENCY, (index) =>
+      isPromptExists(supabase, prompts[index].prompt_text)
+    )
+    const seen = new Set<string>()
+    candidates.forEach((index, i) => {
+      const text = prompts[index].prompt_text.trim()
+      if (exists[i] || seen.has(text)) {
+        results[index] = duplicateResult()
+      }
+      seen.add(text)
+    })
+
+    // 一次查询所有相关创作者的备注，检查推文是否已记录为失败
+    const twitterIndexes = pendingIndexes().filter((i) => {
+      const { source = 'wechat', author_name } = prompts[i]
+      return source === 'twitter' && author_name && getTweetUrl(prompts[i])
+    })
+    const authorNames = [...new Set(twitterIndexes.map((i) => prompts[i].author_name as string))]
+    if (authorNames.length) {
+      const { data: creators } = await supabase
+        .from('twitter_creators')
+        .select('username, description')
+        .in('username', authorNames)
+
+      const descriptions = new Map(
+        (creators || []).map((c: { username: string; description: string | null }) => [c.username, c.description])
+      )
+      for (const index of twitterIndexes) {
+        const description = descriptions.get(prompts[index].author_name as string) ?? null
+        if (isFailedRecordExists(description, getTweetUrl(prompts[index]))) {
+          results[index] = previouslyFailedResult()
+        }
+      }
+    }
+
+    // 并发处理图片
+    const toProcess = pendingIndexes()
+    const processed = await mapWithConcurrency(toProcess, PROMPT_CONCURRENCY, (index) =>
+      processPromptImages(prompts[index].image_urls, IMAGE_CONCURRENCY)
+    )
+
+    // 顺序入库，sort_order 依次递增；图片全部失败的记录到创作者备注
+    let sortOrder = processed.some((p) => p.processedImages.length) ? await getNextSortOrder(supabase) : 0
+    for (let i = 0; i < toProcess.length; i++) {
+      const index = toProcess[i]
+      const { processedImages, failedUrls } = processed[i]
+      try {
+        results[index] = await savePrompt(supabase, prompts[index], processedImages, failedUrls, sortOrder)
+        if (results[index]?.status === 201) sortOrder++
+      } catch (error) {
+        console.error(`Bot batch prompt ${index} error:`, error)
+        results[index] = {
+          status: 500,
+          body: {
+            error: 'Failed to create prompt',
+            detail: error instanceof Error ? error.message : String(error),
+          },
+        }
+      }
+    }
+
+    const items = results.map((result, index) => ({
+      index,
+      status: result!.status,
+      ...result!.body,
+    }))
+
+    return NextResponse.json({
+      results: items,
+      summary: {
+        total: items.length,
+        created: items.filter((r) => r.status === 201).length,
+        skipped: items.filter((r) => r.skipped).length,
+        failed: items.filter((r) => r.status >= 400).length,
+      },
+    })
+
+  } catch (error) {
+    console.error('Bot batch create prompts error:', error)
+    return NextResponse.json({
+      error: 'Failed to create prompts',
+      detail: error instanceof Error ? error.message : String(error),
+    }, { status: 500 })
+  }
+}
@@ -0,0 +1,89 @@
+import { NextRequest, NextResponse } from 'next/server'
+import { createHash } from 'crypto'
+import { createAdminClient } from '@/lib/supabase/server'
+import { verifyBotApiKey } from '@/lib/utils/auth'
+
+// Supabase 单次查询最多返回 1000 行
+const PAGE_SIZE = 1000
+const DEFAULT_LIMIT = 20000
+const MAX_LIMIT = 50000
+
+// prompt_text 指纹：去除首尾空白后 SHA-256 的前 8 字节（与爬虫端一致）
+function promptFingerprint(promptText: string): string {
+  return createHash('sha256').update(promptText.trim()).digest('hex').slice(0, 16)
+}
+
+// 从 description（"来源: https://twitter.com/x/status/<id>"）中提取推文 ID
+function sourceTweetId(description: string | null): string | null {
+  const match = description?.match(/status\/(\d+)/)
+  return match ? match[1] : null
+}
+
+// GET - 已有提示词的指纹，供爬虫在分析和入库前去重
+// 参数: since (ISO 时间，只返回该时间及之后创建的), limit
+// 响应: { prompt_hashes, tweet_ids, next_since, has_more }
+export async function GET(request: NextRequest) {
+  try {
+    const apiKey = request.headers.get('x-api-key')
+    if (!verifyBotApiKey(apiKey)) {
+      return NextResponse.json({ error: 'Invalid API key' }, { status: 401 })
+    }
+
+    const { searchParams } = new URL(request.url)
+    const since = searchParams.get('since')
+    const limit = Math.min(Number(searchParams.get('limit')) || DEFAULT_LIMIT, MAX_LIMIT)
+
+    const supabase = await createAdminClient()
+    const promptHashes: string[] = []
+    const tweetIds: string[] = []
+    let nextSince = since
+    let fetched = 0
+
+    while (fetched < limit) {
+      let query = supabase
+        .from('prompts')
+        .select('prompt_text, description, created_at')
+        .order('created_at', { ascending: true })
+        // created_at 相同的记录按 id 排序，保证分页之间顺序稳定、不漏不重
+        .order('id', { ascending: true })
+        .range(fetched, fetched + PAGE_SIZE - 1)
+
+      // 使用 >=：边界上同一时间的记录可能重复返回，客户端按集合去重
+      if (since) {
+        query = query.gte('created_at', since)
+      }
+
+      const { data, error } = await query
+      if (error) {
+        return NextResponse.json({ error: error.message }, { status: 500 })
+      }
+
+      for (const row of data || []) {
+        if (row.prompt_text) promptHashes.push(promptFingerprint(row.prompt_text))
+        const tweetId = sourceTweetId(row.description)
+        if (tweetId) tweetIds.push(tweetId)
+        nextSince = row.created_at
+      }
+
+      fetched += data?.length || 0
+      if (!data || data.length < PAGE_SIZE) {
+        return NextResponse.json({
+          prompt_hashes: promptHashes,
+          tweet_ids: tweetIds,
+          next_since: nextSince,
+          has_more: false,
+        })
+      }
+    }
+
+    return NextResponse.json({
+      prompt_hashes: promptHashes,
+      tweet_ids: tweetIds,
+      next_since: nextSince,
+      has_more: true,
+    })
+  } catch (error) {
+    console.error('Bot get prompt fingerprints error:', error)
+    return NextResponse.json({ error: 'Failed to fetch fingerprints' }, { status: 500 })
+  }
+}
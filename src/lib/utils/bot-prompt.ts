@@ -0,0 +1,366 @@
+import { randomUUID } from 'crypto'
+import { createAdminClient } from '@/lib/supabase/server'
+import { processImage } from '@/lib/utils/image'
+import { uploadToR2 } from '@/lib/r2/client'
+import type { PromptSource } from '@/types/database'
+
+type AdminClient = Awaited<ReturnType<typeof createAdminClient>>
+
+export interface BotPromptRequest {
+  title: string
+  description?: string
+  prompt_text: string
+  negative_prompt?: string
+  image_urls: string[]  // 图片 URL 数组，第一张作为封面
+  author_name?: string
+  source?: PromptSource
+  model?: string
+  is_featured?: boolean
+  is_published?: boolean
+  tag_ids?: string[]
+  creator_id?: string  // 可选的创作者ID，用于记录失败信息
+}
+
+// 单条提示词的处理结果：status 为对应的 HTTP 状态码，body 为响应体
+export interface BotPromptResult {
+  status: number
+  body: Record<string, unknown>
+}
+
+export interface ProcessedImage {
+  image_url: string
+  thumbnail_url: string
+}
+
+// 单个请求内同时处理的图片数
+export const IMAGE_CONCURRENCY = 6
+
+const USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+// 从 URL 下载图片（支持代理，失败时自动回退直连）
+async function downloadImage(url: string): Promise<Buffer> {
+  const controller = new AbortController()
+  const timeoutId = setTimeout(() => controller.abort(), 30000) // 30秒超时
+
+  try {
+    const proxyUrl = process.env.HTTPS_PROXY || process.env.HTTP_PROXY || process.env.ALL_PROXY
+
+    // 优先尝试使用代理
+    if (proxyUrl) {
+      try {
+        const { HttpsProxyAgent } = await import('https-proxy-agent')
+        const nodeFetch = (await import('node-fetch')).default
+        const agent = new HttpsProxyAgent(proxyUrl)
+
+        const res = await nodeFetch(url, {
+          headers: {
+            'User-Agent': USER_AGENT,
+          },
+          signal: controller.signal,
+          agent,
+        })
+
+        if (!res.ok) {
+          throw new Error(`Failed to download image: ${res.status}`)
+        }
+
+        const contentType = res.headers.get('content-type')
+        if (!contentType?.startsWith('image/')) {
+          throw new Error(`Invalid content type: ${contentType}`)
+        }
+
+        const arrayBuffer = await res.arrayBuffer()
+        return Buffer.from(arrayBuffer)
+      } catch (proxyError) {
+        console.warn(`Proxy failed, falling back to direct connection: ${proxyError}`)
+        // 代理失败，继续使用直连
+      }
+    }
+
+    // 直连请求
+    const response = await fetch(url, {
+      headers: {
+        'User-Agent': USER_AGENT,
+      },
+      signal: controller.signal,
+    })
+
+    if (!response.ok) {
+      throw new Error(`Failed to download image: ${response.status}`)
+    }
+
+    const contentType = response.headers.get('content-type')
+    if (!contentType?.startsWith('image/')) {
+      throw new Error(`Invalid content type: ${contentType}`)
+    }
+
+    const arrayBuffer = await response.arrayBuffer()
+    return Buffer.from(arrayBuffer)
+  } finally {
+    clearTimeout(timeoutId)
+  }
+}
+
+// 处理并上传单张图片
+async function processAndUploadImage(imageUrl: string): Promise<ProcessedImage> {
+  const buffer = await downloadImage(imageUrl)
+  const id = randomUUID()
+  const ext = 'png'
+
+  const { main, thumbnail } = await processImage(buffer)
+
+  const [uploadedImageUrl, uploadedThumbnailUrl] = await Promise.all([
+    uploadToR2(`images/${id}.${ext}`, main, 'image/png'),
+    uploadToR2(`thumbnails/${id}.${ext}`, thumbnail, 'image/png'),
+  ])
+
+  return {
+    image_url: uploadedImageUrl,
+    thumbnail_url: uploadedThumbnailUrl,
+  }
+}
+
+// 以固定并发数执行任务，结果顺序与输入一致
+export async function mapWithConcurrency<T, R>(
+  items: T[],
+  limit: number,
+  fn: (item: T, index: number) => Promise<R>
+): Promise<R[]> {
+  const results = new Array<R>(items.length)
+  let next = 0
+
+  async function worker() {
+    while (next < items.length) {
+      const index = next++
+      results[index] = await fn(items[index], index)
+    }
+  }
+
+  await Promise.all(Array.from({ length: Math.min(limit, items.length) }, worker))
+  return results
+}
+
+// 并发下载、处理并上传一组图片，保持原有顺序（第一张成功的作为封面）
+export async function processPromptImages(
+  imageUrls: string[],
+  concurrency = IMAGE_CONCURRENCY
+): Promise<{ processedImages: ProcessedImage[]; failedUrls: string[] }> {
+  const outcomes = await mapWithConcurrency(imageUrls, concurrency, async (url) => {
+    try {
+      return await processAndUploadImage(url)
+    } catch (error) {
+      console.error(`Failed to process image ${url}:`, error)
+      return null
+    }
+  })
+
+  const processedImages: ProcessedImage[] = []
+  const failedUrls: string[] = []
+  outcomes.forEach((outcome, index) => {
+    if (outcome) {
+      processedImages.push(outcome)
+    } else {
+      failedUrls.push(imageUrls[index])
+    }
+  })
+  return { processedImages, failedUrls }
+}
+
+// 校验必填字段，返回错误信息
+export function validateBotPrompt(body: BotPromptRequest): string | null {
+  if (!body?.title?.trim()) return 'title is required'
+  if (!body.prompt_text?.trim()) return 'prompt_text is required'
+  if (!body.image_urls?.length) return 'image_urls is required (at least one)'
+  return null
+}
+
+// 检查 prompt 是否已存在（通过 prompt_text 去重）
+export async function isPromptExists(supabase: AdminClient, promptText: string): Promise<boolean> {
+  const { data } = await supabase
+    .from('prompts')
+    .select('id')
+    .eq('prompt_text', promptText.trim())
+    .limit(1)
+    .single()
+
+  return !!data
+}
+
+// 检查失败记录是否已存在于备注中
+export function isFailedRecordExists(description: string | null, tweetUrl: string): boolean {
+  if (!description) return false
+  return description.includes(tweetUrl)
+}
+
+// 从 description 中提取推文 URL
+export function getTweetUrl(body: BotPromptRequest): string {
+  return body.description?.replace('来源: ', '') || ''
+}
+
+// 记录失败的图片到创作者备注（去重）
+export async function appendToCreatorDescription(
+  supabase: AdminClient,
+  authorName: string,
+  tweetUrl: string
+) {
+  // 通过 author_name (username) 查找创作者
+  const { data: creator } = await supabase
+    .from('twitter_creators')
+    .select('id, description')
+    .eq('username', authorName)
+    .single()
+
+  if (!creator) return
+
+  const currentDesc = creator.description || ''
+
+  // 检查是否已记录过该推文的失败
+  if (isFailedRecordExists(currentDesc, tweetUrl)) {
+    return // 已存在则不重复记录
+  }
+
+  const timestamp = new Date().toISOString().split('T')[0]
+  const newEntry = `[${timestamp}] 图片处理失败: ${tweetUrl}`
+
+  // 追加到描述中
+  const updatedDesc = currentDesc
+    ? `${currentDesc}\n${newEntry}`
+    : newEntry
+
+  await supabase
+    .from('twitter_creators')
+    .update({ description: updatedDesc })
+    .eq('id', creator.id)
+}
+
+export const duplicateResult = (): BotPromptResult => ({
+  status: 200,
+  body: {
+    success: false,
+    skipped: true,
+    reason: 'duplicate',
+    message: 'Prompt with same text already exists',
+  },
+})
+
+export const previouslyFailedResult = (): BotPromptResult => ({
+  status: 200,
+  body: {
+    success: false,
+    skipped: true,
+    reason: 'previously_failed',
+    message: 'This tweet was previously recorded as failed',
+  },
+})
+
+// 获取下一个 sort_order
+export async function getNextSortOrder(supabase: AdminClient): Promise<number> {
+  const { data: maxSort } = await supabase
+    .from('prompts')
+    .select('sort_order')
+    .order('sort_order', { ascending: false })
+    .limit(1)
+    .single()
+
+  return (maxSort?.sort_order || 0) + 1
+}
+
+// 图片处理完成后入库；图片全部失败时记录到创作者备注
+export async function savePrompt(
+  supabase: AdminClient,
+  body: BotPromptRequest,
+  processedImages: ProcessedImage[],
+  failedUrls: string[],
+  sortOrder: number
+): Promise<BotPromptResult> {
+  const {
+    title,
+    description,
+    prompt_text,
+    negative_prompt,
+    author_name,
+    source = 'wechat',
+    model,
+    is_featured = false,
+    is_published = true,
+    tag_ids,
+  } = body
+  const tweetUrl = getTweetUrl(body)
+
+  // 如果所有图片都失败，记录到创作者备注并返回
+  if (processedImages.length === 0) {
+    // 记录到创作者描述（如果是 twitter 来源）
+    if (source === 'twitter' && author_name && tweetUrl) {
+      await appendToCreatorDescription(supabase, author_name, tweetUrl)
+    }
+
+    return {
+      status: 400,
+      body: {
+        success: false,
+        error: 'All images failed to process',
+        failed_urls: failedUrls,
+        recorded: !!(source === 'twitter' && author_name),
+      },
+    }
+  }
+
+  // 第一张图作为封面
+  const coverImage = processedImages[0]
+
+  // 创建提示词
+  const { data: prompt, error: promptError } = await supabase
+    .from('prompts')
+    .insert({
+      title: title.trim(),
+      description: description?.trim(),
+      prompt_text: prompt_text.trim(),
+      negative_prompt: negative_prompt?.trim(),
+      image_url: coverImage.image_url,
+      thumbnail_url: coverImage.thumbnail_url,
+      author_name: author_name?.trim(),
+      source,
+      model: model?.trim(),
+      is_featured,
+      is_published,
+      sort_order: sortOrder,
+    })
+    .select()
+    .single()
+
+  if (promptError) {
+    return { status: 500, body: { error: promptError.message } }
+  }
+
+  // 插入标签关联
+  if (tag_ids?.length) {
+    const tagLinks = tag_ids.map((tagId: string) => ({
+      prompt_id: prompt.id,
+      tag_id: tagId,
+    }))
+    await supabase.from('prompt_tags').insert(tagLinks)
+  }
+
+  // 插入图片记录
+  const imageRecords = processedImages.map((img, index) => ({
+    prompt_id: prompt.id,
+    image_url: img.image_url,
+    thumbnail_url: img.thumbnail_url,
+    sort_order: index,
+  }))
+  await supabase.from('prompt_images').insert(imageRecords)
+
+  return {
+    status: 201,
+    body: {
+      success: true,
+      prompt: {
+        id: prompt.id,
+        title: prompt.title,
+        created_at: prompt.created_at,
+      },
+      images_count: processedImages.length,
+      failed_urls: failedUrls.length > 0 ? failedUrls : undefined,
+    },
+  }
+}